@@ -0,0 +1,252 @@
+import functools
+import heapq
+import sys
+import threading
+from array import array
+from collections import Counter
+from datetime import date
+from itertools import compress
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --- 1. CONFIGURATION ---
+
+REPORT_TOP_K = 20
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# --- 2. COLUMN HELPERS ---
+
+@functools.lru_cache(maxsize=None)
+def parse_day(text):
+    """'YYYY-MM-DD' -> day ordinal; empty stays 0."""
+    return date.fromisoformat(text).toordinal() if text else 0
+
+DAY_SLOTS = {'issue_date': 'issue_day', 'return_date': 'return_day'}
+
+def day_of(record, field):
+    """A date field as a day ordinal (0 if unset), from a record or a plain dict."""
+    if isinstance(record, dict):
+        return parse_day(record.get(field))
+    return getattr(record, DAY_SLOTS[field]) or 0
+
+def bincount(codes, size, weights=None):
+    """Per-code totals (counts, or sums of weights) as a list of length size."""
+    if numpy is not None:
+        return numpy.bincount(codes, weights, minlength=size).tolist()
+    totals = [0] * size
+    if weights is None:
+        for code, n in Counter(codes).items():
+            totals[code] = n
+    else:
+        for code, weight in zip(codes, weights):
+            totals[code] += weight
+    return totals
+
+def cached(query):
+    """Builds the projection on first use and memoizes query results until
+    the next change to loans."""
+    @functools.wraps(query)
+    def wrapper(self, *args):
+        key = (query.__name__,) + args
+        with self.lock:
+            if not self.built:
+                self.build()
+            if key not in self.cache:
+                self.cache[key] = query(self, *args)
+            return self.cache[key]
+    return wrapper
+
+# --- 3. ANALYTICS ENGINE ---
+
+class CirculationAnalytics:
+    """Columnar projection of the loan history, for the Reports tab.
+
+    Each loan is one row across parallel `array` columns: book code, member
+    code, issue day and return day (0 while open). Books, members and
+    authors are coded to small integers, with their labels in side tables,
+    so the join is an index lookup. Queries run on NumPy copies of the
+    columns when NumPy is installed and fall back to Counter and compress
+    over the arrays otherwise.
+
+    The projection is built on the first query and then kept current from
+    the service's change lists. Query results are cached until the next
+    change to loans. Queries and updates take a lock, so the listener may
+    run on a different thread from the queries.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.lock = threading.Lock()
+        self.built = False
+        self.cache = {}
+        service.subscribe(self.on_changes)
+
+    def build(self):
+        self.rows = {}
+        self.book_codes, self.book_ids, self.titles, self.book_author = {}, [], [], array('l')
+        self.author_codes, self.authors = {}, []
+        self.member_codes, self.member_ids, self.member_names = {}, [], []
+        self.book_col, self.member_col = array('l'), array('l')
+        self.issue_col, self.return_col = array('l'), array('l')
+
+        for book in self.service.get_all_books():
+            self.add_book(book)
+        for member in self.service.get_all_members():
+            self.add_member(member)
+        loans = getattr(self.service, 'iter_transactions', self.service.get_all_transactions)()
+        for loan in loans:
+            self.add_loan(loan)
+        self.built = True
+
+    def author_code(self, author):
+        code = self.author_codes.get(author)
+        if code is None:
+            code = self.author_codes[author] = len(self.authors)
+            self.authors.append(author)
+        return code
+
+    def add_book(self, book):
+        code = self.book_codes.get(book['id'])
+        if code is None:
+            code = self.book_codes[book['id']] = len(self.book_ids)
+            self.book_ids.append(book['id'])
+            self.titles.append(book['title'])
+            self.book_author.append(self.author_code(book['author']))
+        else:
+            self.titles[code] = book['title']
+            self.book_author[code] = self.author_code(book['author'])
+        return code
+
+    def add_member(self, member):
+        code = self.member_codes.get(member['id'])
+        if code is None:
+            code = self.member_codes[member['id']] = len(self.member_ids)
+            self.member_ids.append(member['id'])
+            self.member_names.append(member['name'])
+        else:
+            self.member_names[code] = member['name']
+        return code
+
+    def add_loan(self, loan):
+        # Loans outlive deleted books and members; they keep a placeholder label.
+        book = self.book_codes.get(loan['book_id'])
+        if book is None:
+            book = self.add_book({'id': loan['book_id'], 'title': "(deleted)", 'author': ""})
+        member = self.member_codes.get(loan['member_id'])
+        if member is None:
+            member = self.add_member({'id': loan['member_id'], 'name': "(deleted)"})
+        self.rows[loan['id']] = len(self.issue_col)
+        self.book_col.append(book)
+        self.member_col.append(member)
+        self.issue_col.append(day_of(loan, 'issue_date'))
+        self.return_col.append(day_of(loan, 'return_date'))
+
+    def on_changes(self, changes):
+        """Service listener: folds a committed change list into the columns."""
+        with self.lock:
+            if not self.built:
+                return
+            loans_changed = False
+            for change in changes:
+                kind, collection = change[0], change[1]
+                if collection == 'transactions':
+                    loans_changed = True
+                    if kind == 'put' and change[2]['id'] not in self.rows:
+                        self.add_loan(change[2])
+                    elif kind == 'put':
+                        self.return_col[self.rows[change[2]['id']]] = day_of(change[2], 'return_date')
+                    elif kind == 'set' and change[2] in self.rows and 'return_date' in change[3]:
+                        self.return_col[self.rows[change[2]]] = parse_day(change[3]['return_date'])
+                elif kind == 'put' and collection == 'books':
+                    self.add_book(change[2])
+                elif kind == 'put' and collection == 'members':
+                    self.add_member(change[2])
+            if loans_changed:
+                self.cache.clear()
+
+    # --- Queries ---
+    #
+    # Every query takes an optional inclusive range of issue days (ordinals)
+    # and returns a list of tuples ready for display.
+
+    def columns(self, start, end, *columns):
+        """The given columns, restricted to loans issued within [start, end]."""
+        if numpy is not None:
+            arrays = [numpy.array(c) for c in columns]
+            if start is None and end is None:
+                return arrays
+            issued = numpy.array(self.issue_col)
+            mask = (issued >= (start or 0)) & (issued <= (end or sys.maxsize))
+            return [a[mask] for a in arrays]
+        if start is None and end is None:
+            return columns
+        low, high = start or 0, end or sys.maxsize
+        mask = [low <= day <= high for day in self.issue_col]
+        return [list(compress(c, mask)) for c in columns]
+
+    def returned_durations(self, codes, issued, returned):
+        """(codes, loan lengths in days) for the loans that have come back."""
+        if numpy is not None:
+            done = returned > 0
+            return codes[done], returned[done] - issued[done]
+        done = [(code, back - out) for code, out, back in zip(codes, issued, returned) if back]
+        return [code for code, _ in done], [days for _, days in done]
+
+    @cached
+    def top_titles(self, start=None, end=None, k=REPORT_TOP_K):
+        """Most-borrowed titles: (book id, title, author, loans)."""
+        books, = self.columns(start, end, self.book_col)
+        counts = bincount(books, len(self.book_ids))
+        top = heapq.nlargest(k, (code for code, n in enumerate(counts) if n), key=counts.__getitem__)
+        return [(self.book_ids[c], self.titles[c], self.authors[self.book_author[c]], counts[c]) for c in top]
+
+    @cached
+    def author_demand(self, start=None, end=None, k=REPORT_TOP_K):
+        """Loans per author: (author, titles borrowed, loans)."""
+        books, = self.columns(start, end, self.book_col)
+        counts = bincount(books, len(self.book_ids))
+        borrowed = [code for code, n in enumerate(counts) if n]
+        authors = [self.book_author[code] for code in borrowed]
+        loans = bincount(authors, len(self.authors), [counts[code] for code in borrowed])
+        titles = bincount(authors, len(self.authors))
+        top = heapq.nlargest(k, (a for a, n in enumerate(loans) if n), key=loans.__getitem__)
+        return [(self.authors[a] or "(unknown)", titles[a], int(loans[a])) for a in top]
+
+    @cached
+    def busiest_weekdays(self, start=None, end=None):
+        """Loans issued per weekday, busiest first: (weekday, loans)."""
+        issued, = self.columns(start, end, self.issue_col)
+        if numpy is not None:
+            weekdays = numpy.bincount((issued - 1) % 7, minlength=7).tolist()
+        else:
+            # Few distinct days: count days first, then fold them onto weekdays.
+            weekdays = [0] * 7
+            for day, n in Counter(issued).items():
+                weekdays[(day - 1) % 7] += n
+        order = sorted(range(7), key=weekdays.__getitem__, reverse=True)
+        return [(WEEKDAYS[d], weekdays[d]) for d in order]
+
+    @cached
+    def average_loan_days(self, start=None, end=None):
+        """(average loan length in days, returned loans it is taken over)."""
+        books, issued, returned = self.columns(start, end, self.book_col, self.issue_col, self.return_col)
+        _, durations = self.returned_durations(books, issued, returned)
+        count = len(durations)
+        total = durations.sum() if numpy is not None else sum(durations)
+        return (round(float(total) / count, 1) if count else 0.0), count
+
+    @cached
+    def member_activity(self, start=None, end=None, k=REPORT_TOP_K):
+        """Most active members: (member id, name, loans, returned, average days)."""
+        members, issued, returned = self.columns(start, end, self.member_col, self.issue_col, self.return_col)
+        size = len(self.member_ids)
+        loans = bincount(members, size)
+        done_members, durations = self.returned_durations(members, issued, returned)
+        returned_counts = bincount(done_members, size)
+        days = bincount(done_members, size, durations)
+        top = heapq.nlargest(k, (m for m, n in enumerate(loans) if n), key=loans.__getitem__)
+        return [(self.member_ids[m], self.member_names[m], loans[m], returned_counts[m],
+                 round(days[m] / returned_counts[m], 1) if returned_counts[m] else None) for m in top]
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import lms
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# --- 1. CONFIGURATION ---
+
+DEFAULT_SIZES = (10000, 100000)
+DEFAULT_STORAGES = ('json', 'journal', 'sqlite')
+DEFAULT_OPS = 1000
+DEFAULT_MAX_SECONDS = 10.0
+
+ZIPF_EXPONENT = 1.1          # checkout popularity skew across titles
+MEMBERS_PER_BOOK = 0.2
+LOANS_PER_BOOK = 5           # length of the returned-loan history
+ACTIVE_LOAN_FRACTION = 0.1   # share of books currently on loan
+HISTORY_DAYS = 5 * 365
+WRITE_BATCH_ROWS = 100000    # records generated per write while building a library
+
+# --- 2. SYNTHETIC DATASET ---
+
+def zipf_cumulative_weights(n, exponent):
+    total, weights = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+def generate_library(books, rng, workdir, loans_per_book=LOANS_PER_BOOK):
+    """Writes a library with Zipf-distributed checkouts into workdir: a
+    data.txt with books, members and open loans, and the returned loans in
+    its history archive, the layout every storage mode opens (sqlite
+    imports it on first open).
+
+    Records are generated and written WRITE_BATCH_ROWS at a time; only IDs
+    and the open loans are held whole. Returns (counts, popular_ids,
+    cum_weights): book IDs ordered from most to least popular and the
+    matching cumulative weights, so workloads can keep drawing books with
+    the same skew.
+    """
+    today = date.today().toordinal()
+    first_day = today - HISTORY_DAYS
+    day_names = {d: date.fromordinal(d).isoformat() for d in range(first_day - 1, today + lms.DEFAULT_LOAN_DAYS + 60)}
+
+    popular_ids = [lms.format_id('B', i) for i in range(1, books + 1)]
+    rng.shuffle(popular_ids)
+    cum_weights = zipf_cumulative_weights(books, ZIPF_EXPONENT)
+    member_count = max(10, int(books * MEMBERS_PER_BOOK))
+    member_ids = [lms.format_id('M', i) for i in range(1, member_count + 1)]
+
+    # The history is written in issue-date order: count the loans per day,
+    # then draw each day's books and members as its turn comes.
+    issue_days = HISTORY_DAYS - 30
+    per_day = [0] * issue_days
+    for _ in range(books * loans_per_book):
+        per_day[rng.randrange(issue_days)] += 1
+    archive = lms.HistoryArchive(os.path.join(workdir, lms.HISTORY_DIR))
+    loan_count, batch = 0, []
+    for day, count in enumerate(per_day, first_day):
+        for book_id in rng.choices(popular_ids, cum_weights=cum_weights, k=count):
+            loan_count += 1
+            batch.append({
+                'id': lms.format_id('T', loan_count),
+                'book_id': book_id,
+                'member_id': rng.choice(member_ids),
+                'issue_date': day_names[day],
+                'due_date': day_names[day + lms.DEFAULT_LOAN_DAYS],
+                'return_date': day_names[day + rng.randrange(1, 30)],
+                'status': 'Returned',
+            })
+        if len(batch) >= WRITE_BATCH_ROWS:
+            archive.append(batch)
+            batch = []
+    archive.append(batch)
+
+    # Open loans go to distinct books, weighted by popularity; some are overdue.
+    on_loan = set()
+    target = int(books * ACTIVE_LOAN_FRACTION)
+    while len(on_loan) < target:
+        on_loan.update(rng.choices(popular_ids, cum_weights=cum_weights, k=target - len(on_loan)))
+    open_loans = []
+    for day, book_id in sorted((today - rng.randrange(28), book_id) for book_id in on_loan):
+        loan_count += 1
+        open_loans.append({
+            'id': lms.format_id('T', loan_count),
+            'book_id': book_id,
+            'member_id': rng.choice(member_ids),
+            'issue_date': day_names[day],
+            'due_date': day_names[day + lms.DEFAULT_LOAN_DAYS],
+            'return_date': None,
+            'status': 'Issued',
+        })
+
+    def book_records():
+        for i in range(1, books + 1):
+            book_id = lms.format_id('B', i)
+            yield {
+                'id': book_id,
+                'title': f"Title {i}",
+                'author': f"Author {rng.randrange(max(1, books // 20))}",
+                'isbn': f"978{i:010d}",
+                'status': 'Issued' if book_id in on_loan else 'Available',
+            }
+
+    member_records = ({
+        'id': member_id,
+        'name': f"Member {i}",
+        'email': f"member{i}@example.com",
+        'phone': f"555-{i:07d}",
+        'join_date': day_names[first_day + rng.randrange(HISTORY_DAYS // 2)],
+    } for i, member_id in enumerate(member_ids, 1))
+    sequences = [
+        {'id': 'B', 'last': books},
+        {'id': 'M', 'last': member_count},
+        {'id': 'T', 'last': loan_count},
+    ]
+    position = archive.position()
+    write_snapshot(os.path.join(workdir, lms.DATA_FILE), {
+        'books': book_records(), 'members': member_records, 'transactions': open_loans, 'sequences': sequences,
+    }, position)
+    archive.commit(position)
+    archive.close()
+    return {'members': member_count, 'transactions': loan_count}, popular_ids, cum_weights
+
+def write_snapshot(path, collections, history):
+    """Writes a data.txt from iterables of records, one record at a time."""
+    with open(path, 'w') as f:
+        f.write('{')
+        for i, (collection, records) in enumerate(collections.items()):
+            f.write(f'{", " if i else ""}"{collection}": [')
+            for j, record in enumerate(records):
+                f.write((", " if j else "") + json.dumps(record))
+            f.write(']')
+        f.write(f', "history": {json.dumps(history)}}}')
+
+# --- 3. MEASUREMENT ---
+
+def summarize(latencies_ns):
+    """Throughput and latency percentiles for a list of per-call timings."""
+    if not latencies_ns:
+        return {'ops': 0}
+    ordered = sorted(latencies_ns)
+    total = sum(ordered) / 1e9
+
+    def pct(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 1000, 2)
+
+    return {
+        'ops': len(ordered),
+        'seconds': round(total, 4),
+        'ops_per_sec': round(len(ordered) / total, 1) if total else None,
+        'p50_us': pct(0.50),
+        'p99_us': pct(0.99),
+        'max_us': round(ordered[-1] / 1000, 2),
+    }
+
+def bench(fn, arg_list, max_seconds):
+    """Calls fn once per argument tuple until the list or time budget runs out."""
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    for args in arg_list:
+        started = time.perf_counter_ns()
+        fn(*args)
+        latencies.append(time.perf_counter_ns() - started)
+        if time.perf_counter() > deadline:
+            break
+    return summarize(latencies)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_single(books, storage_mode, ops, max_seconds, seed, loans_per_book):
+    """Benchmarks one dataset size against one storage backend."""
+    rng = random.Random(seed)
+    report = {'books': books, 'storage': storage_mode}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        counts, popular_ids, cum_weights = generate_library(books, rng, workdir, loans_per_book)
+        report['generate_seconds'] = round(time.perf_counter() - started, 3)
+        report.update(counts)
+
+        # data.txt holds what the json and journal backends rewrite: books,
+        # members and open loans, not the archived history.
+        snapshot = os.path.join(workdir, lms.DATA_FILE)
+        results = report['operations'] = {}
+        results['load_data'] = bench(lms.load_data, [(snapshot,)] * 3, max_seconds)
+        data = lms.load_data(snapshot)
+        results['save_data'] = bench(lms.save_data, [(data, snapshot)] * 3, max_seconds)
+        del data
+        member_ids = [lms.format_id('M', i) for i in range(1, counts['members'] + 1)]
+
+        # The first open imports data.txt and its history archive (sqlite)
+        # or starts the journal; time a plain reopen.
+        first_open = lms.open_storage(storage_mode, workdir)
+        first_open.load()
+        first_open.close()
+        started = time.perf_counter_ns()
+        service = lms.LibraryService(lms.open_storage(storage_mode, workdir))
+        results['startup'] = summarize([time.perf_counter_ns() - started])
+
+        available = [b['id'] for b in service.get_all_books() if b['status'] == 'Available']
+        to_issue = rng.sample(available, min(ops, len(available)))
+        results['issue_book'] = bench(service.issue_book, [(b, rng.choice(member_ids)) for b in to_issue], max_seconds)
+        issued = [b for b in to_issue if b in service.active_by_book]
+        results['return_book'] = bench(service.return_book, [(b,) for b in issued], max_seconds)
+        results['find_book'] = bench(service.find_book, [(rng.choice(popular_ids),) for _ in range(ops)], max_seconds)
+        results['stats'] = bench(service.get_stats, [()] * ops, max_seconds)
+
+        idle = [m for m in member_ids if m not in service.active_by_member]
+        idle = rng.sample(idle, min(ops, len(idle)))
+        results['delete_member'] = bench(service.delete_member, [(m,) for m in idle], max_seconds)
+        member_ids = [m for m in member_ids if m in service.members_by_id]
+
+        report['mixed'] = run_mixed(service, rng, popular_ids, cum_weights, member_ids, ops, max_seconds)
+        service.close()
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    if lms.METRICS.enabled:
+        # With LMS_INSTRUMENT=1, break each operation down by phase.
+        report['phases'] = lms.METRICS.snapshot()
+    return report
+
+def run_mixed(service, rng, popular_ids, cum_weights, member_ids, ops, max_seconds):
+    """A circulation-desk mix: checkouts of popular titles, returns, lookups, stats."""
+    active = list(service.active_by_book)
+    latencies = {'issue_book': [], 'return_book': [], 'find_book': [], 'stats': []}
+    picks = rng.choices(popular_ids, cum_weights=cum_weights, k=ops)
+    deadline = time.perf_counter() + max_seconds
+
+    for book_id in picks:
+        roll = rng.random()
+        if roll < 0.40:
+            op, call = 'issue_book', (service.issue_book, book_id, rng.choice(member_ids))
+        elif roll < 0.75 and active:
+            i = rng.randrange(len(active))
+            active[i], active[-1] = active[-1], active[i]
+            op, call = 'return_book', (service.return_book, active.pop())
+        elif roll < 0.95:
+            op, call = 'find_book', (service.find_book, book_id)
+        else:
+            op, call = 'stats', (service.get_stats,)
+
+        started = time.perf_counter_ns()
+        result = call[0](*call[1:])
+        latencies[op].append(time.perf_counter_ns() - started)
+        if op == 'issue_book' and result[0]:
+            active.append(book_id)
+        if time.perf_counter() > deadline:
+            break
+
+    every = [t for timings in latencies.values() for t in timings]
+    return {'overall': summarize(every), **{op: summarize(t) for op, t in latencies.items()}}
+
+# --- 4. COMMAND LINE ---
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="bench.py", description="LibraryService benchmarks")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated catalog sizes (number of books)")
+    parser.add_argument('--storage', default=','.join(DEFAULT_STORAGES),
+                        help="comma-separated storage modes to compare")
+    parser.add_argument('--ops', type=int, default=DEFAULT_OPS, help="calls per microbenchmark")
+    parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS,
+                        help="time budget per microbenchmark")
+    parser.add_argument('--loans-per-book', type=int, default=LOANS_PER_BOOK)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    storages = args.storage.split(',')
+
+    if args.single:
+        report = run_single(sizes[0], storages[0], args.ops, args.max_seconds, args.seed, args.loans_per_book)
+        print(json.dumps(report))
+        return
+
+    # Each run gets its own process so peak RSS belongs to that run alone.
+    runs = []
+    for size in sizes:
+        for storage in storages:
+            print(f"Benchmarking {size} books with {storage} storage...", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), '--single',
+                       '--sizes', str(size), '--storage', storage, '--ops', str(args.ops),
+                       '--max-seconds', str(args.max_seconds), '--seed', str(args.seed),
+                       '--loans-per-book', str(args.loans_per_book)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output))
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,181 +1,3319 @@
-import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk
+import time
+
+# Startup time-to-interactive is measured from here (see LibraryApp.mark_ready).
+STARTED_NS = time.perf_counter_ns()
+
+try:
+    import tkinter as tk
+    from tkinter import messagebox, simpledialog, ttk
+except ImportError:
+    # Headless installs (server.py, the CLI) can run without Tk.
+    tk = messagebox = simpledialog = ttk = None
 import json
-import hashlib
-from datetime import datetime, timedelta
+import functools
+import os
+import sys
+import argparse
+import itertools
+import operator
+import heapq
+import bisect
+import re
+import unicodedata
+import threading
+import urllib.parse
+import queue
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from userstore import UserStore
 
 # --- 1. CONFIGURATION & FILE MANAGEMENT ---
 
 DATA_FILE = "data.txt"
-USERS_FILE = "users.txt"
 DEFAULT_LOAN_DAYS = 14
 
-def load_data():
-    """Loads books and members from the data file."""
+# A hold waits up to HOLD_EXPIRY_DAYS for a copy; once a returned copy is set
+# aside for it, the member has HOLD_PICKUP_DAYS to collect it. Holds with a
+# lower priority number are served first, then in request order. Expired
+# holds are swept every HOLD_SWEEP_MS.
+HOLD_EXPIRY_DAYS = 90
+HOLD_PICKUP_DAYS = 7
+DEFAULT_HOLD_PRIORITY = 1
+HOLD_SWEEP_MS = 60 * 1000
+
+# "json" rewrites DATA_FILE on every change; "journal" appends one record per
+# change to JOURNAL_FILE and folds it back into DATA_FILE in the background;
+# "sqlite" keeps everything in SQLITE_FILE.
+STORAGE_MODE = "json"
+JOURNAL_FILE = "data.journal"
+JOURNAL_COMPACT_BYTES = 8 * 1024 * 1024
+JOURNAL_FSYNC = False
+SQLITE_FILE = "library.db"
+
+# Branches (`python lms.py --branches CEN,EAST`): each branch keeps its books,
+# loans and holds in a shard of its own under BRANCH_DIR/<code>/, and members
+# are shared from the SQLite database BRANCH_DIR/members.db, which every desk
+# opens. Branch records carry their branch in their IDs (CEN-B001). A desk
+# opens its own branch first; new books go there. A shard is open at one desk
+# at a time: the desk holds SHARD_LOCK_FILE in it locked while it is open.
+BRANCHES = ()
+BRANCH_DIR = "branches"
+SHARD_LOCK_FILE = "desk.lock"
+
+# The json and journal backends keep only open loans in DATA_FILE; returned
+# loans move to JSON-lines segment files in HISTORY_DIR and are read back on
+# demand, so startup time depends on the open loans, not years of history.
+HISTORY_DIR = "history"
+HISTORY_SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Lists longer than this only materialize the visible Treeview rows.
+VIRTUAL_ROW_THRESHOLD = 5000
+VIRTUAL_BUFFER_ROWS = 20
+SEARCH_RESULT_LIMIT = 500
+HISTORY_PAGE_SIZE = 50
+# The Transactions tab reads the loan history LOAN_PAGE_ROWS loans at a time.
+LOAN_PAGE_ROWS = 1000
+
+# The GUI runs service calls on a worker thread and saves at most once per
+# FLUSH_DELAY_MS; DISPATCH_POLL_MS is how often it collects their results.
+FLUSH_DELAY_MS = 200
+DISPATCH_POLL_MS = 30
+
+# The login screen shows while the library loads in the background, and each
+# dashboard tab is built on first selection. Startup steps slower than
+# STARTUP_BUDGET_MS are reported on stderr (and timed under LMS_INSTRUMENT).
+STARTUP_BUDGET_MS = 300
+
+# Client mode (`python lms.py --server URL`) talks to server.py instead of
+# reading the data files, and pulls other desks' changes every REMOTE_SYNC_MS.
+REMOTE_TIMEOUT = 10
+REMOTE_SYNC_MS = 2000
+IMPORT_BATCH_SIZE = 10000
+
+# LMS_INSTRUMENT=1 times service operations and UI refreshes (see METRICS).
+# LMS_PROFILE=issue_books,return_books (or *) also runs those operations under
+# cProfile and writes one .prof file per call to PROFILE_DIR.
+PROFILE_OPERATIONS = [op for op in os.environ.get('LMS_PROFILE', '').split(',') if op]
+INSTRUMENT = os.environ.get('LMS_INSTRUMENT', '') not in ('', '0') or bool(PROFILE_OPERATIONS)
+PROFILE_DIR = os.environ.get('LMS_PROFILE_DIR', 'profiles')
+
+def read_data(path=DATA_FILE):
+    """Parses the data file; a corrupt file raises ValueError."""
+    try:
+        with open(path, 'r') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {'books': [], 'members': [], 'transactions': []}
+    return json.loads(content) if content else {'books': [], 'members': [], 'transactions': []}
+
+def load_data(path=DATA_FILE):
+    """Loads books and members from the data file."""
+    try:
+        return read_data(path)
+    except json.JSONDecodeError:
+        if messagebox:
+            messagebox.showerror("Error", "Data file corrupted.")
+        else:
+            print("Error: Data file corrupted.", file=sys.stderr)
+        return {'books': [], 'members': [], 'transactions': []}
+
+def file_version(path):
+    """Changes whenever the file is replaced or rewritten; None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def save_data(data, path=DATA_FILE):
+    """Saves books, members, and transactions to the data file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=encode_record)
+    os.replace(tmp_path, path)
+
+# --- 1.1 STORAGE BACKENDS ---
+#
+# LibraryService describes every mutation as a list of changes and hands it to
+# its storage backend:
+#   ['put', collection, record]      add or replace a whole record
+#   ['set', collection, id, fields]  update some fields of a record
+#   ['del', collection, id]          remove a record
+
+def apply_changes(data, changes):
+    """Replays a sequence of changes onto a data dict loaded from a snapshot."""
+    tables = {}
+    for change in changes:
+        kind, collection = change[0], change[1]
+        if collection not in tables:
+            tables[collection] = {r['id']: r for r in data.get(collection, [])}
+        table = tables[collection]
+
+        if kind == 'put':
+            table[change[2]['id']] = change[2]
+        elif kind == 'set':
+            record = table.get(change[2])
+            if record is not None:
+                record.update(change[3])
+        elif kind == 'del':
+            table.pop(change[2], None)
+
+    for collection, table in tables.items():
+        data[collection] = list(table.values())
+    return data
+
+def split_loans(transactions, closing_ids=None):
+    """Splits loans into (open, closed), keeping only closed ones in closing_ids if given."""
+    open_loans, closed = [], []
+    for t in transactions:
+        if t['status'] == 'Issued':
+            open_loans.append(t)
+        elif closing_ids is None or t['id'] in closing_ids:
+            closed.append(t)
+    return open_loans, closed
+
+def seed_loan_sequence(data, closed):
+    """Data from before ID counters keeps its returned loans in the data
+    file. The loan counter is seeded from all of them before they leave for
+    the archive, where load no longer sees them."""
+    sequences = data.setdefault('sequences', [])
+    if not any(s['id'] == 'T' for s in sequences):
+        last = max((id_number(t['id']) for t in itertools.chain(data['transactions'], closed)), default=0)
+        sequences.append({'id': 'T', 'last': last})
+
+# Returned loans on disk are read back a page at a time by loan_page_sql, in
+# the order LibraryService.sort_key gives: one field, then the ID's length
+# and the ID (numeric order within a prefix). Loan tables carry the length
+# as a generated column, ID_LENGTH_COLUMN, so every order has an index
+# SQLite can seek in.
+LOAN_COLUMNS = ('id', 'book_id', 'member_id', 'issue_date', 'due_date', 'return_date', 'status')
+ID_LENGTH_COLUMN = "id_length INTEGER AS (length(id))"
+
+def loan_indexes(table):
+    statements = [f"CREATE INDEX IF NOT EXISTS {table}_by_id ON {table} (id_length, id)"]
+    statements += [f"CREATE INDEX IF NOT EXISTS {table}_by_{field} ON {table} ({field}, id_length, id)"
+                   for field in LOAN_COLUMNS[1:]]
+    # A member's or a book's loans by issue date, for the history views.
+    statements += [f"CREATE INDEX IF NOT EXISTS {table}_{field}_history ON {table} ({field}, issue_date, id_length, id)"
+                   for field in ('member_id', 'book_id')]
+    return ';\n'.join(statements) + ';'
+
+def loan_page_sql(table, sort, descending, filters, cursor, limit):
+    """(sql, params) selecting up to `limit` returned loans after `cursor`,
+    a (value, len(id), id) key with dates as 'YYYY-MM-DD'. Filters on
+    member_id and book_id are applied; the caller handles the rest."""
+    if sort not in LOAN_COLUMNS:
+        raise ValueError(f"Unknown loan field: {sort}")
+    # Unary + keeps SQLite from picking the status index over the sort's.
+    where, params = ["+status = 'Returned'"], []
+    for field in ('member_id', 'book_id'):
+        if filters.get(field):
+            where.append(f"{field} = ?")
+            params.append(filters[field])
+    order = ['id_length', 'id'] if sort == 'id' else [sort, 'id_length', 'id']
+    if cursor is not None:
+        values = list(cursor[1:]) if sort == 'id' else list(cursor)
+        where.append(f"({', '.join(order)}) {'<' if descending else '>'} ({', '.join('?' * len(values))})")
+        params += values
+    direction = ' DESC' if descending else ''
+    sql = (f"SELECT {', '.join(LOAN_COLUMNS)} FROM {table} WHERE {' AND '.join(where)}"
+           f" ORDER BY {', '.join(column + direction for column in order)} LIMIT ?")
+    return sql, params + [limit]
+
+class HistoryArchive:
+    """Returned loans, appended to numbered JSON-lines segment files.
+
+    The owning storage saves `position()` in its snapshot after each
+    append; `open()` with that position cuts off anything appended after it
+    (a crash between the two writes), so a loan is never archived twice.
+    Without a position (no readable snapshot) the segments are moved aside.
+    Reading streams one line at a time and stops at the committed position.
+
+    The loans are also indexed in a SQLite table (INDEX_FILE) that answers
+    loan_page() queries. It is trimmed and caught up with the committed
+    position the first time it is used, so an archive written before it
+    existed is indexed in one pass on first use.
+    """
+
+    INDEX_FILE = "loans.db"
+
+    def __init__(self, directory=HISTORY_DIR, segment_bytes=HISTORY_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.written = self.committed = (1, 0)
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self.index = None
+        # The journal's compactor appends on a thread of its own.
+        self.index_lock = threading.Lock()
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f"segment-{segment:05d}.jsonl")
+
+    def open(self, position=None):
+        segment, offset = self.written = self.committed = tuple(position or (1, 0))
+        if not os.path.isdir(self.directory):
+            return
+        if position is None:
+            # The snapshot is missing or unreadable, so nothing says how much
+            # of the archive is committed: move it aside instead of trimming.
+            if any(re.fullmatch(r'segment-(\d+)\.jsonl', name) for name in os.listdir(self.directory)):
+                aside = f"{self.directory}.orphaned-{datetime.now():%Y%m%d-%H%M%S}"
+                os.replace(self.directory, aside)
+                print(f"Warning: no saved history position; moved {self.directory} to {aside}", file=sys.stderr)
+            return
+        for name in os.listdir(self.directory):
+            match = re.fullmatch(r'segment-(\d+)\.jsonl', name)
+            if match and int(match.group(1)) > segment:
+                os.remove(os.path.join(self.directory, name))
+        path = self.segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) > offset:
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        if os.path.exists(self.index_path):
+            with self.index_lock:
+                self.loan_index()
+
+    def append(self, records, fsync=False):
+        if not records:
+            return
+        segment, offset = self.written
+        if offset >= self.segment_bytes:
+            segment, offset = segment + 1, 0
+        os.makedirs(self.directory, exist_ok=True)
+        lines = [(json.dumps(r, separators=(',', ':'), default=encode_record) + '\n').encode() for r in records]
+        with self.index_lock:
+            index = self.loan_index()
+            with open(self.segment_path(segment), 'ab') as f:
+                start = f.tell()
+                f.write(b''.join(lines))
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+                self.written = (segment, f.tell())
+            offsets = itertools.accumulate((len(line) for line in lines[:-1]), initial=start)
+            with index:
+                self.index_loans(zip(itertools.repeat(segment), offsets, records))
+
+    def position(self):
+        return list(self.written)
+
+    def commit(self, position):
+        self.committed = tuple(position)
+
+    def __iter__(self):
+        for _, _, line in self.lines():
+            yield json.loads(line)
+
+    def lines(self, start=(1, 0)):
+        """Yields (segment, offset, line) for the committed lines from `start`."""
+        last_segment, last_offset = self.committed
+        for segment in range(start[0], last_segment + 1):
+            try:
+                f = open(self.segment_path(segment), 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                offset = start[1] if segment == start[0] else 0
+                f.seek(offset)
+                for line in f:
+                    if segment == last_segment and offset + len(line) > last_offset:
+                        break
+                    yield segment, offset, line
+                    offset += len(line)
+
+    def loan_index(self):
+        """The SQLite index of the archive. Opening it drops rows past the
+        committed position and indexes committed lines it is missing.
+        Call with index_lock held."""
+        if self.index is not None:
+            return self.index
+        import sqlite3  # only needed once the history is queried or grows
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.index.row_factory = sqlite3.Row
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=NORMAL")
+        self.index.executescript(f"""
+            CREATE TABLE IF NOT EXISTS loans ({', '.join(LOAN_COLUMNS)}, segment INTEGER, byte_offset INTEGER,
+                                              {ID_LENGTH_COLUMN});
+            CREATE INDEX IF NOT EXISTS loans_position ON loans (segment, byte_offset);
+            {loan_indexes('loans')}
+        """)
+        segment, offset = self.committed
+        with self.index:
+            self.index.execute("DELETE FROM loans WHERE segment > ? OR (segment = ? AND byte_offset >= ?)",
+                               (segment, segment, offset))
+            last = self.index.execute("SELECT segment, byte_offset FROM loans"
+                                      " ORDER BY segment DESC, byte_offset DESC LIMIT 1").fetchone()
+            missing = self.lines() if last is None else itertools.islice(self.lines(tuple(last)), 1, None)
+            self.index_loans((segment, offset, json.loads(line)) for segment, offset, line in missing)
+        return self.index
+
+    def index_loans(self, entries):
+        """Adds (segment, offset, loan) entries to the index."""
+        columns = LOAN_COLUMNS + ('segment', 'byte_offset')
+        self.index.executemany(f"INSERT INTO loans ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                               ([loan.get(c) for c in LOAN_COLUMNS] + [segment, offset] for segment, offset, loan in entries))
+
+    def loan_page(self, sort, descending, filters, cursor, limit):
+        """Up to `limit` archived loans after cursor; see loan_page_sql."""
+        with self.index_lock:
+            return [dict(row) for row in self.loan_index().execute(*loan_page_sql('loans', sort, descending, filters, cursor, limit))]
+
+    def close(self):
+        with self.index_lock:
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+
+class JsonStorage:
+    """Rewrites the data file after every change.
+
+    The data file holds books, members and open loans; loans are moved to
+    the history archive as they are returned.
+    """
+
+    lazy_history = True
+    # Every commit rewrites the data file; bulk imports commit once instead.
+    rewrites_on_commit = True
+
+    def __init__(self, path=DATA_FILE, history_dir=HISTORY_DIR):
+        self.path = path
+        self.archive = HistoryArchive(history_dir)
+
+    def load(self):
+        data = load_data(self.path)
+        self.archive.open(data.pop('history', None))
+        data['transactions'], closed = split_loans(data['transactions'])
+        if closed:
+            # Data files from before the archive carry the whole history.
+            seed_loan_sequence(data, closed)
+            self.save(data, closed)
+        return data
+
+    def read(self):
+        """What load() returns, without writing, repairing or locking
+        anything, so reports can run beside a live desk. A corrupt data
+        file raises ValueError. Commit and close are not available."""
+        data = read_data(self.path)
+        data.pop('history', None)
+        data['transactions'], _ = split_loans(data.get('transactions', []))
+        return data
+
+    def commit(self, data, changes):
+        returned = {c[2] for c in changes if c[0] == 'set' and c[1] == 'transactions' and c[3].get('status') == 'Returned'}
+        open_loans, closed = split_loans(data['transactions'], returned)
+        self.save({**data, 'transactions': open_loans}, closed)
+
+    def save(self, data, closed):
+        self.archive.append(closed)
+        position = self.archive.position()
+        save_data({**data, 'history': position}, self.path)
+        self.archive.commit(position)
+
+    def iter_transactions(self):
+        return iter(self.archive)
+
+    def loan_page(self, sort, descending, filters, cursor, limit):
+        return self.archive.loan_page(sort, descending, filters, cursor, limit)
+
+    def close(self):
+        self.archive.close()
+
+class CompactionError(Exception):
+    """Folding the journal into the snapshot failed. The journal is intact
+    and nothing was lost; the sealed journal is compacted again later."""
+
+class JournalStorage:
+    """Appends one compact record per operation to a write-ahead journal.
+
+    DATA_FILE stays the snapshot. On startup the journal is replayed onto it,
+    and once the journal grows past `compact_bytes` it is sealed and folded
+    into a new snapshot on a background thread, which also moves returned
+    loans out to the history archive. If that fails, the next commit (after
+    writing its record) or close raises CompactionError, and the commit
+    retries the compaction.
+    """
+
+    lazy_history = True
+    rewrites_on_commit = False
+
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE,
+                 compact_bytes=JOURNAL_COMPACT_BYTES, fsync=JOURNAL_FSYNC, history_dir=HISTORY_DIR):
+        self.path = path
+        self.archive = HistoryArchive(history_dir)
+        self.journal_path = journal_path
+        self.sealed_path = journal_path + ".sealed"
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self.seq = 0
+        self.journal = None
+        self.compactor = None
+        self.compaction_error = None
+
+    def load(self):
+        data = load_data(self.path)
+        self.seq = data.pop('journal_seq', 0)
+        self.archive.open(data.pop('history', None))
+        data['transactions'], closed = split_loans(data['transactions'])
+        if closed:
+            # Snapshots from before the archive carry the whole history.
+            seed_loan_sequence(data, closed)
+            self._write_snapshot(data, self.seq, closed)
+
+        # A sealed journal is left behind if compaction was interrupted.
+        for path in (self.sealed_path, self.journal_path):
+            changes, self.seq = self._read_journal(path, self.seq)
+            apply_changes(data, changes)
+
+        self.journal = open(self.journal_path, 'ab')
+        if os.path.exists(self.sealed_path):
+            self._start_compaction()
+        return data
+
+    def read(self):
+        """Like JsonStorage.read: the snapshot with the journals replayed
+        onto it in memory, leaving a torn tail where it is.
+
+        A desk may seal the journal or finish a compaction meanwhile. The
+        live journal is read before the sealed one, so records sealed in
+        between are still seen, and if the snapshot was replaced while
+        reading, everything is read again.
+        """
+        while True:
+            before = file_version(self.path)
+            data = read_data(self.path)
+            records = {}
+            for path in (self.journal_path, self.sealed_path):
+                records.update((record['seq'], record) for record in self._journal_records(path))
+            if file_version(self.path) == before:
+                break
+        seq = data.pop('journal_seq', 0)
+        data.pop('history', None)
+        for record_seq in sorted(records):
+            if record_seq > seq:
+                apply_changes(data, records[record_seq]['ops'])
+        data['transactions'], _ = split_loans(data.get('transactions', []))
+        return data
+
+    def commit(self, data, changes):
+        self.seq += 1
+        record = json.dumps({'seq': self.seq, 'ops': changes}, separators=(',', ':'), default=encode_record)
+        self.journal.write(record.encode() + b'\n')
+        self.journal.flush()
+        if self.fsync:
+            os.fsync(self.journal.fileno())
+
+        if self.journal.tell() >= self.compact_bytes and not os.path.exists(self.sealed_path):
+            self.journal.close()
+            os.replace(self.journal_path, self.sealed_path)
+            self.journal = open(self.journal_path, 'ab')
+            self._start_compaction()
+        self._check_compaction(retry=True)
+
+    def iter_transactions(self):
+        return iter(self.archive)
+
+    def loan_page(self, sort, descending, filters, cursor, limit):
+        return self.archive.loan_page(sort, descending, filters, cursor, limit)
+
+    def close(self):
+        if self.compactor:
+            self.compactor.join()
+        self.archive.close()
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        self._check_compaction()
+
+    def _journal_records(self, path):
+        """Yields a journal's records up to any torn tail, read-only."""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+
+    def _read_journal(self, path, seq):
+        """Returns the changes recorded after `seq` and the last seq seen.
+
+        A torn record at the tail (crash mid-write) is cut off so that later
+        appends start on a clean line.
+        """
+        changes = []
+        try:
+            f = open(path, 'r+b')
+        except FileNotFoundError:
+            return changes, seq
+
+        with f:
+            good_offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    f.truncate(good_offset)
+                    break
+                good_offset += len(line)
+                if record['seq'] > seq:
+                    changes.extend(record['ops'])
+                    seq = record['seq']
+        return changes, seq
+
+    def _start_compaction(self):
+        self.compactor = threading.Thread(target=self._run_compaction, name="journal-compactor")
+        self.compactor.start()
+
+    def _run_compaction(self):
+        try:
+            self._compact()
+        except Exception as e:
+            # The sealed journal stays where it is for the next attempt.
+            print(f"Error: journal compaction failed: {e}", file=sys.stderr)
+            self.compaction_error = e
+
+    def _check_compaction(self, retry=False):
+        """Raises a failed compaction's error once, starting it over first if
+        `retry`."""
+        error = self.compaction_error
+        if error is None:
+            return
+        self.compaction_error = None
+        self.compactor.join()
+        if retry and os.path.exists(self.sealed_path):
+            self._start_compaction()
+        raise CompactionError(f"Journal compaction failed: {error}") from error
+
+    def _compact(self):
+        """Folds the sealed journal into a fresh snapshot of DATA_FILE."""
+        try:
+            with open(self.path, 'r') as f:
+                content = f.read()
+            data = json.loads(content) if content else {'books': [], 'members': [], 'transactions': []}
+        except FileNotFoundError:
+            data = {'books': [], 'members': [], 'transactions': []}
+
+        seq = data.pop('journal_seq', 0)
+        data.pop('history', None)
+        changes, seq = self._read_journal(self.sealed_path, seq)
+        apply_changes(data, changes)
+        data['transactions'], closed = split_loans(data.get('transactions', []))
+        self._write_snapshot(data, seq, closed)
+        os.remove(self.sealed_path)
+
+    def _write_snapshot(self, data, seq, closed):
+        """Archives `closed` loans, then atomically replaces the snapshot."""
+        self.archive.append(closed, fsync=True)
+        position = self.archive.position()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**data, 'journal_seq': seq, 'history': position}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.archive.commit(position)
+
+class SqliteStorage:
+    """Keeps the library in an indexed SQLite database (WAL mode).
+
+    Only books, members and open loans are loaded at startup; returned
+    loans stay on disk and are queried when the history is needed. Every
+    commit runs as one SQL transaction. An existing DATA_FILE is imported
+    the first time the database is created.
+    """
+
+    lazy_history = True
+    rewrites_on_commit = False
+
+    COLUMNS = {
+        'books': ('id', 'title', 'author', 'isbn', 'status'),
+        'members': ('id', 'name', 'email', 'phone', 'join_date'),
+        'transactions': LOAN_COLUMNS,
+        'holds': ('id', 'book_id', 'member_id', 'priority', 'request_time', 'expire_date', 'status'),
+        'sequences': ('id', 'last'),
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            id TEXT PRIMARY KEY, title TEXT, author TEXT, isbn TEXT, status TEXT);
+        CREATE TABLE IF NOT EXISTS members (
+            id TEXT PRIMARY KEY, name TEXT, email TEXT, phone TEXT, join_date TEXT);
+        CREATE TABLE IF NOT EXISTS transactions (
+            id TEXT PRIMARY KEY, book_id TEXT, member_id TEXT, issue_date TEXT,
+            due_date TEXT, return_date TEXT, status TEXT, """ + ID_LENGTH_COLUMN + """);
+        CREATE TABLE IF NOT EXISTS holds (
+            id TEXT PRIMARY KEY, book_id TEXT, member_id TEXT, priority INTEGER,
+            request_time REAL, expire_date TEXT, status TEXT);
+        CREATE TABLE IF NOT EXISTS sequences (id TEXT PRIMARY KEY, last INTEGER);
+        CREATE INDEX IF NOT EXISTS books_status ON books (status);
+        CREATE INDEX IF NOT EXISTS transactions_status ON transactions (status);
+        CREATE INDEX IF NOT EXISTS transactions_book ON transactions (book_id);
+        CREATE INDEX IF NOT EXISTS transactions_member ON transactions (member_id);
+        CREATE INDEX IF NOT EXISTS transactions_due ON transactions (due_date);
+    """
+
+    def __init__(self, path=SQLITE_FILE, import_path=DATA_FILE, history_dir=HISTORY_DIR):
+        self.path = path
+        self.import_path = import_path
+        self.history_dir = history_dir
+        self.conn = None
+
+    def load(self):
+        is_new = not os.path.exists(self.path)
+        import sqlite3  # only this backend needs it
+        # The GUI runs service calls on a worker thread, one at a time.
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        if 'id_length' not in {row[1] for row in self.conn.execute("PRAGMA table_xinfo(transactions)")}:
+            # Databases from before loan paging; indexing them takes a while, once.
+            self.conn.execute(f"ALTER TABLE transactions ADD COLUMN {ID_LENGTH_COLUMN}")
+        self.conn.executescript(loan_indexes('transactions'))
+        if is_new and os.path.exists(self.import_path):
+            self.import_json(self.import_path)
+
+        # Counters missing from older databases are recovered from the
+        # tables, since the loan history is not loaded into memory.
+        sequences = self.query(self.select('sequences'))
+        known = {s['id'] for s in sequences}
+        for prefix, collection in (('B', 'books'), ('M', 'members'), ('T', 'transactions'), ('H', 'holds')):
+            if prefix not in known:
+                last = self.conn.execute(f"SELECT MAX(CAST(SUBSTR(id, 2) AS INTEGER)) FROM {collection}").fetchone()[0]
+                sequences.append({'id': prefix, 'last': last or 0})
+
+        return {
+            'books': self.query(self.select('books') + " ORDER BY rowid"),
+            'members': self.query(self.select('members') + " ORDER BY rowid"),
+            'transactions': self.query(self.select('transactions') + " WHERE status = 'Issued' ORDER BY rowid"),
+            'holds': self.query(self.select('holds') + " ORDER BY rowid"),
+            'sequences': sequences,
+        }
+
+    def read(self):
+        """Like JsonStorage.read; the database is opened read-only and
+        closed again."""
+        if not os.path.exists(self.path):
+            return {'books': [], 'members': [], 'transactions': [], 'holds': []}
+        conn = self.connect_readonly()
+        try:
+            rows = lambda collection, where='': [dict(row) for row in conn.execute(self.select(collection) + where)]
+            return {'books': rows('books'), 'members': rows('members'),
+                    'transactions': rows('transactions', " WHERE status = 'Issued'"), 'holds': rows('holds')}
+        finally:
+            conn.close()
+
+    def connect_readonly(self):
+        import sqlite3
+        conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def select(self, collection):
+        # Not SELECT *, which would include generated columns.
+        return f"SELECT {', '.join(self.COLUMNS[collection])} FROM {collection}"
+
+    def query(self, sql, params=()):
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def iter_transactions(self):
+        # On a connection of its own, so a long read sees one committed
+        # state (WAL) and runs beside commits on self.conn.
+        conn = self.connect_readonly()
+        try:
+            for row in conn.execute(self.select('transactions') + " ORDER BY rowid"):
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def loan_page(self, sort, descending, filters, cursor, limit):
+        return self.query(*loan_page_sql('transactions', sort, descending, filters, cursor, limit))
+
+    def commit(self, data, changes):
+        with self.conn:
+            for change in changes:
+                self.apply(change)
+
+    def apply(self, change):
+        kind, collection = change[0], change[1]
+        columns = self.COLUMNS[collection]
+        if kind == 'put':
+            record = change[2]
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {collection} ({', '.join(columns)})"
+                f" VALUES ({', '.join('?' * len(columns))})",
+                [record.get(c) for c in columns]
+            )
+        elif kind == 'set':
+            fields = [c for c in change[3] if c in columns]
+            self.conn.execute(
+                f"UPDATE {collection} SET {', '.join(c + ' = ?' for c in fields)} WHERE id = ?",
+                [change[3][c] for c in fields] + [change[2]]
+            )
+        elif kind == 'del':
+            self.conn.execute(f"DELETE FROM {collection} WHERE id = ?", (change[2],))
+
+    def import_json(self, path):
+        """Loads a data.txt style JSON file, and its history archive, into the database."""
+        with open(path, 'r') as f:
+            content = f.read()
+        data = json.loads(content) if content else {}
+        with self.conn:
+            if 'history' in data:
+                archive = HistoryArchive(self.history_dir)
+                archive.commit(data['history'])
+                for record in archive:
+                    self.apply(['put', 'transactions', record])
+            for collection in self.COLUMNS:
+                for record in data.get(collection, []):
+                    self.apply(['put', collection, record])
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+def open_storage(mode=None, root=None):
+    """Creates the storage backend selected by STORAGE_MODE, keeping its
+    files under `root` (a branch shard's directory, which must exist) if given."""
+    mode = mode or STORAGE_MODE
+    data, history = os.path.join(root or '', DATA_FILE), os.path.join(root or '', HISTORY_DIR)
+    if mode == "json":
+        return JsonStorage(data, history_dir=history)
+    if mode == "journal":
+        return JournalStorage(data, os.path.join(root or '', JOURNAL_FILE), history_dir=history)
+    if mode == "sqlite":
+        return SqliteStorage(os.path.join(root or '', SQLITE_FILE), import_path=data, history_dir=history)
+    raise ValueError(f"Unknown storage mode: {mode}")
+
+# --- 1.2 BULK IMPORT / EXPORT FILES ---
+
+def record_format(path, fmt=None):
+    """Picks 'csv' or 'jsonl' from an explicit format or the file extension."""
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+def read_records(path, fmt=None):
+    """Streams dict rows from a CSV (with header) or JSON-lines file. A
+    line that is not valid JSON is yielded as a ValueError, which
+    import_records reports as a bad row like any other."""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if record_format(path, fmt) == 'csv':
+            import csv
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield ValueError(f"Invalid JSON ({e.msg} at column {e.colno}).")
+
+def write_records(path, records, fields, fmt=None):
+    """Streams records to a CSV or JSON-lines file. Returns the row count."""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if record_format(path, fmt) == 'csv':
+            import csv
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for record in records:
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record, default=encode_record) + '\n')
+                count += 1
+    return count
+
+# --- 1.3 INSTRUMENTATION ---
+
+class LatencyHistogram:
+    """Log-scale latency counts, four buckets per power of two nanoseconds.
+
+    Recording is a few integer operations; percentiles are read back as the
+    upper edge of their bucket, i.e. within 25%.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * 256
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, elapsed_ns):
+        bits = elapsed_ns.bit_length()
+        bucket = bits << 2 | (elapsed_ns >> (bits - 3) & 3) if bits > 3 else bits << 2
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    @staticmethod
+    def bucket_limit(bucket):
+        bits, step = bucket >> 2, bucket & 3
+        return 1 << bits if bits <= 3 else (5 + step) << (bits - 3)
+
+    def percentile(self, fraction):
+        target, seen = max(1, round(fraction * self.count)), 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(self.bucket_limit(bucket), self.max_ns)
+        return self.max_ns
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_us': round(self.total_ns / self.count / 1000, 1) if self.count else 0.0,
+            'p50_us': round(self.percentile(0.50) / 1000, 1),
+            'p99_us': round(self.percentile(0.99) / 1000, 1),
+            'max_us': round(self.max_ns / 1000, 1),
+        }
+
+class Instrumentation:
+    """Per-operation timings split into lookup, mutation, persistence and ui.
+
+    Methods wrapped with `timed(phase)` record how long they ran. The
+    outermost wrapped call on a thread is the operation; wrapped calls made
+    inside it (lookups, storage writes, tree refreshes) are charged to that
+    operation under their own phase, and the remainder under the operation's
+    phase. Every operation also gets a 'total'. When disabled, `timed`
+    returns the method unchanged, so the switch costs nothing at run time.
+    """
+
+    def __init__(self, enabled=False, profile=(), profile_dir=PROFILE_DIR):
+        self.enabled = enabled
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.armed = set()
+        self.last_profile = None
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def timed(self, phase, name=None):
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            operation = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.run(operation, phase, fn, args, kwargs)
+            return wrapper
+        return decorate
+
+    def run(self, name, phase, fn, args, kwargs):
+        local = self.local
+        operation = getattr(local, 'operation', None)
+        outer = operation is None
+        profiler = None
+        if outer:
+            operation = local.operation = name
+            profiler = self.start_profile(name)
+        parent_ns, local.nested_ns = getattr(local, 'nested_ns', 0), 0
+        started = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            self.record(operation, phase, elapsed - local.nested_ns)
+            if outer:
+                local.operation, local.nested_ns = None, 0
+                self.record(operation, 'total', elapsed)
+                if profiler:
+                    self.save_profile(name, profiler)
+            else:
+                local.nested_ns = parent_ns + elapsed
+
+    def record(self, operation, phase, elapsed_ns):
+        with self.lock:
+            histogram = self.histograms.get((operation, phase))
+            if histogram is None:
+                histogram = self.histograms[(operation, phase)] = LatencyHistogram()
+            histogram.record(elapsed_ns)
+
+    def profile_next(self, operation='*'):
+        """Runs the next call of `operation` (or of any operation) under cProfile."""
+        with self.lock:
+            self.armed.add(operation)
+
+    def start_profile(self, name):
+        if not (self.profile or self.armed):
+            return None
+        with self.lock:
+            if name in self.armed or '*' in self.armed:
+                self.armed.discard(name if name in self.armed else '*')
+            elif name not in self.profile and '*' not in self.profile:
+                return None
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def save_profile(self, name, profiler):
+        profiler.disable()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+        profiler.dump_stats(path)
+        self.last_profile = path
+
+    def snapshot(self):
+        """{operation: {phase: {count, mean_us, p50_us, p99_us, max_us}}}"""
+        with self.lock:
+            items = sorted(self.histograms.items())
+            report = {}
+            for (operation, phase), histogram in items:
+                report.setdefault(operation, {})[phase] = histogram.snapshot()
+        return report
+
+    def report(self):
+        """The snapshot as an aligned text table, for logs and the Stats tab."""
+        lines = [f"{'operation':<26}{'phase':<13}{'count':>8}{'p50 us':>11}{'p99 us':>11}{'max us':>11}"]
+        for operation, phases in self.snapshot().items():
+            for phase, h in phases.items():
+                lines.append(f"{operation:<26}{phase:<13}{h['count']:>8}{h['p50_us']:>11}{h['p99_us']:>11}{h['max_us']:>11}")
+        return '\n'.join(lines)
+
+METRICS = Instrumentation(INSTRUMENT, PROFILE_OPERATIONS)
+
+# --- 2. CORE LIBRARY LOGIC (Simplified from your Java Classes) ---
+
+@functools.lru_cache(maxsize=None)
+def day_ordinal(text):
+    """'YYYY-MM-DD' -> proleptic day number; None stays None."""
+    return None if text is None else date.fromisoformat(text).toordinal()
+
+@functools.lru_cache(maxsize=None)
+def day_name(ordinal):
+    return None if ordinal is None else date.fromordinal(ordinal).isoformat()
+
+def today_ordinal():
+    return date.today().toordinal()
+
+def day_property(slot):
+    """Exposes an ordinal slot as a 'YYYY-MM-DD' string, as stored on disk."""
+    return property(lambda self: day_name(getattr(self, slot)),
+                    lambda self, text: setattr(self, slot, day_ordinal(text)))
+
+class Record:
+    """Base for the slotted records LibraryService keeps in memory.
+
+    Item access (`book['title']`, `.get()`) and `to_dict()` present the
+    fields exactly as the JSON records on disk, so views, storage backends
+    and the server can treat records and plain dicts alike. IDs and status
+    values are interned and dates are held as day ordinals.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def __setitem__(self, field, value):
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+class Book(Record):
+    __slots__ = ('id', 'title', 'author', 'isbn', 'status')
+    FIELDS = __slots__
+
+    def __init__(self, id, title, author, isbn, status='Available'):
+        self.id = sys.intern(id)
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.status = sys.intern(status)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['id'], d['title'], d['author'], d['isbn'], d['status'])
+
+class Member(Record):
+    __slots__ = ('id', 'name', 'email', 'phone', 'join_day')
+    FIELDS = ('id', 'name', 'email', 'phone', 'join_date')
+    join_date = day_property('join_day')
+
+    def __init__(self, id, name, email, phone, join_day):
+        self.id = sys.intern(id)
+        self.name = name
+        self.email = email
+        self.phone = phone
+        self.join_day = join_day
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['id'], d['name'], d['email'], d['phone'], day_ordinal(d.get('join_date')))
+
+class Transaction(Record):
+    __slots__ = ('id', 'book_id', 'member_id', 'issue_day', 'due_day', 'return_day', 'status')
+    FIELDS = ('id', 'book_id', 'member_id', 'issue_date', 'due_date', 'return_date', 'status')
+    issue_date = day_property('issue_day')
+    due_date = day_property('due_day')
+    return_date = day_property('return_day')
+
+    def __init__(self, id, book_id, member_id, issue_day, due_day, return_day=None, status='Issued'):
+        self.id = sys.intern(id)
+        self.book_id = sys.intern(book_id)
+        self.member_id = sys.intern(member_id)
+        self.issue_day = issue_day
+        self.due_day = due_day
+        self.return_day = return_day
+        self.status = sys.intern(status)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['id'], d['book_id'], d['member_id'], day_ordinal(d['issue_date']),
+                   day_ordinal(d['due_date']), day_ordinal(d.get('return_date')), d['status'])
+
+class Hold(Record):
+    """A member waiting for a book: 'Waiting' in its queue, or 'Ready' once a
+    returned copy is set aside for them. expire_day is the last day it is kept."""
+
+    __slots__ = ('id', 'book_id', 'member_id', 'priority', 'request_time', 'expire_day', 'status')
+    FIELDS = ('id', 'book_id', 'member_id', 'priority', 'request_time', 'expire_date', 'status')
+    expire_date = day_property('expire_day')
+
+    def __init__(self, id, book_id, member_id, priority, request_time, expire_day, status='Waiting'):
+        self.id = sys.intern(id)
+        self.book_id = sys.intern(book_id)
+        self.member_id = sys.intern(member_id)
+        self.priority = priority
+        self.request_time = request_time
+        self.expire_day = expire_day
+        self.status = sys.intern(status)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['id'], d['book_id'], d['member_id'], d['priority'], d['request_time'],
+                   day_ordinal(d['expire_date']), d['status'])
+
+RECORD_TYPES = {'books': Book, 'members': Member, 'transactions': Transaction, 'holds': Hold}
+
+def encode_record(obj):
+    """json `default` hook that writes records in their on-disk dict form."""
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class LibraryStats:
+    """Running totals for the Stats tab, kept current by LibraryService.
+
+    Open loans wait in a heap ordered by due day; asking for the overdue
+    count only pops the loans whose due day has passed since the last ask.
+    """
+
+    def __init__(self):
+        self.total_books = 0
+        self.total_members = 0
+        self.books_by_status = {}
+        self.open_loans = set()
+        self.overdue = set()
+        self.pending_due = []
+        self.stale_due = 0
+
+    @classmethod
+    def from_data(cls, data):
+        """Totals for data as storage.read() returns it, for reports that
+        run without a LibraryService."""
+        stats = cls()
+        for b in data.get('books', []):
+            stats.add_book(Book.from_dict(b))
+        for m in data.get('members', []):
+            stats.add_member(Member.from_dict(m))
+        for t in data.get('transactions', []):
+            if t['status'] == 'Issued':
+                stats.open_loan(Transaction.from_dict(t))
+        return stats
+
+    def add_book(self, book):
+        self.total_books += 1
+        self.books_by_status[book.status] = self.books_by_status.get(book.status, 0) + 1
+
+    def remove_book(self, book):
+        self.total_books -= 1
+        self.books_by_status[book.status] -= 1
+
+    def set_book_status(self, old_status, new_status):
+        self.books_by_status[old_status] -= 1
+        self.books_by_status[new_status] = self.books_by_status.get(new_status, 0) + 1
+
+    def add_member(self, member):
+        self.total_members += 1
+
+    def remove_member(self, member):
+        self.total_members -= 1
+
+    def open_loan(self, transaction):
+        self.open_loans.add(transaction.id)
+        heapq.heappush(self.pending_due, (transaction.due_day, transaction.id))
+
+    def close_loan(self, transaction):
+        self.open_loans.discard(transaction.id)
+        if transaction.id in self.overdue:
+            self.overdue.discard(transaction.id)
+            return
+
+        # Its heap entry is now stale; drop stale entries once they dominate.
+        self.stale_due += 1
+        if self.stale_due > len(self.pending_due) // 2:
+            self.pending_due = [e for e in self.pending_due if e[1] in self.open_loans]
+            heapq.heapify(self.pending_due)
+            self.stale_due = 0
+
+    def overdue_count(self, today=None):
+        today = today or today_ordinal()
+        while self.pending_due and self.pending_due[0][0] < today:
+            _, transaction_id = heapq.heappop(self.pending_due)
+            if transaction_id in self.open_loans:
+                self.overdue.add(transaction_id)
+            else:
+                self.stale_due -= 1
+        return len(self.overdue)
+
+    def snapshot(self):
+        return {
+            'total_books': self.total_books,
+            'total_members': self.total_members,
+            'books_issued': self.books_by_status.get('Issued', 0),
+            'books_available': self.books_by_status.get('Available', 0),
+            'books_on_hold': self.books_by_status.get('On Hold', 0),
+            'overdue_books': self.overdue_count(),
+        }
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+def tokenize(text):
+    """Lowercases, strips accents and splits text into word tokens."""
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return TOKEN_PATTERN.findall(text)
+
+def normalize_isbn(isbn):
+    return re.sub(r'[^0-9X]', '', isbn.upper())
+
+class SearchIndex:
+    """Inverted index over book titles and authors, plus exact ISBN lookup.
+
+    Complete words in a query must match a token exactly; the last word is
+    matched as a prefix against the sorted vocabulary so results follow
+    the user's typing. LibraryService builds it on the first search.
+    """
+
+    def __init__(self, books=()):
+        self.postings = {}
+        self.by_isbn = {}
+        self.tokens_by_book = {}
+        for book in books:
+            self.index_book(book)
+        self.vocabulary = sorted(self.postings)
+
+    def index_book(self, book):
+        tokens = set(tokenize(book['title'])) | set(tokenize(book['author']))
+        self.tokens_by_book[book['id']] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(book['id'])
+        self.by_isbn.setdefault(normalize_isbn(book['isbn']), set()).add(book['id'])
+        return tokens
+
+    def add(self, book):
+        for token in self.index_book(book):
+            if len(self.postings[token]) == 1:
+                bisect.insort(self.vocabulary, token)
+
+    def remove(self, book):
+        for token in self.tokens_by_book.pop(book['id'], ()):
+            ids = self.postings[token]
+            ids.discard(book['id'])
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        ids = self.by_isbn.get(normalize_isbn(book['isbn']))
+        if ids:
+            ids.discard(book['id'])
+            if not ids:
+                del self.by_isbn[normalize_isbn(book['isbn'])]
+
+    def prefix_tokens(self, prefix):
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            yield self.vocabulary[i]
+            i += 1
+
+    def search(self, query, limit):
+        """Returns up to `limit` matching book ids."""
+        isbn = normalize_isbn(query)
+        if len(isbn) in (10, 13) and isbn in self.by_isbn:
+            return list(self.by_isbn[isbn])[:limit]
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        *words, prefix = tokens
+
+        candidates = None
+        for word in sorted(words, key=lambda w: len(self.postings.get(w, ()))):
+            ids = self.postings.get(word, set())
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        results = []
+        if candidates is not None:
+            for book_id in candidates:
+                if any(t.startswith(prefix) for t in self.tokens_by_book[book_id]):
+                    results.append(book_id)
+                    if len(results) == limit:
+                        break
+            return results
+
+        seen = set()
+        for token in self.prefix_tokens(prefix):
+            for book_id in self.postings[token]:
+                if book_id not in seen:
+                    seen.add(book_id)
+                    results.append(book_id)
+                    if len(results) == limit:
+                        return results
+        return results
+
+def format_id(prefix, number):
+    return f"{prefix}{number:03d}"
+
+def id_number(record_id):
+    """The counter in an ID: 12 for B012, and for the branch ID CEN-B012."""
+    return int(record_id[len(record_id.rstrip('0123456789')):])
+
+def list_pages(records, key, descending, page_size, cursor=None):
+    """Yields (page, cursor) from records sorted by key, ascending or
+    descending, starting after `cursor` (the key of a page's last record).
+    The start is found by binary search and every page is one slice."""
+    if descending:
+        end = len(records) if cursor is None else bisect.bisect_left(records, tuple(cursor), key=key)
+        while end > 0:
+            page = records[max(0, end - page_size):end][::-1]
+            end -= len(page)
+            yield page, key(page[-1])
+    else:
+        start = 0 if cursor is None else bisect.bisect_right(records, tuple(cursor), key=key)
+        while start < len(records):
+            page = records[start:start + page_size]
+            start += len(page)
+            yield page, key(page[-1])
+
+def branch_of(record_id):
+    """The branch code of a branch ID (CEN for CEN-B012); None for others."""
+    return record_id.rpartition('-')[0] or None
+
+class LibraryService:
+    ID_PREFIXES = {'B': 'books', 'M': 'members', 'T': 'transactions', 'H': 'holds'}
+
+    def __init__(self, storage=None, deferred=False, branch=None, members=None):
+        """A branch shard gets its `branch` code, which prefixes the IDs it
+        hands out, and the SharedMembers every branch uses."""
+        self.storage = storage or open_storage()
+        self.branch = branch
+        self.id_prefix = f"{branch}-" if branch else ''
+        self.shared_members = members
+        self.data = self.storage.load()
+        for collection, record_type in RECORD_TYPES.items():
+            self.data[collection] = [record_type.from_dict(r) for r in self.data.get(collection, [])]
+        self.listeners = []
+        self.deferred = deferred
+        self.unflushed = []
+        self.id_lock = threading.Lock()
+        self.dirty_sequences = set()
+        self.build_indexes()
+        if self.shared_members is not None:
+            self.shared_members.reset_activity(branch, self.member_activity())
+            self.touched_members.clear()
+
+    def build_indexes(self):
+        """Rebuilds the id and active-loan lookups from self.data."""
+        self.load_sequences()
+        self.books_by_id = {b.id: b for b in self.data['books']}
+        if self.shared_members is not None:
+            self.members_by_id = self.shared_members.members_by_id
+        else:
+            self.members_by_id = {m.id: m for m in self.data['members']}
+        self.transactions_by_id = {t.id: t for t in self.data['transactions']}
+        self.active_by_book = {}
+        self.active_by_member = {}
+        self.search_index = None
+        self.sort_orders = {}
+        self.loans_by_member = {}
+        self.loans_by_book = {}
+        for t in self.data['transactions']:
+            self.loans_by_member.setdefault(t.member_id, []).append(t)
+            self.loans_by_book.setdefault(t.book_id, []).append(t)
+        self.holds_by_id = {}
+        self.holds_by_member = {}
+        self.hold_queues = {}
+        self.ready_holds = {}
+        self.hold_expiry = []
+        self.hold_slots = {}
+        # Members whose loans or holds changed since the last commit.
+        self.touched_members = set()
+        self.record_tables = {'books': self.books_by_id, 'members': self.members_by_id,
+                              'transactions': self.transactions_by_id, 'holds': self.holds_by_id}
+        for slot, h in enumerate(self.data['holds']):
+            self.hold_slots[h.id] = slot
+            self.index_hold(h)
+        self.stats = LibraryStats()
+        for b in self.data['books']:
+            self.stats.add_book(b)
+        for m in self.data['members']:
+            self.stats.add_member(m)
+        for t in self.data['transactions']:
+            if t.status == 'Issued':
+                self.index_loan(t)
+                self.stats.open_loan(t)
+
+    def load_sequences(self):
+        """Indexes the per-prefix ID counters stored with the data.
+
+        Data saved before counters existed gets them from the highest ID in
+        use, once; from then on they only move forward.
+        """
+        self.sequences = {s['id']: s for s in self.data.setdefault('sequences', [])}
+        for prefix, collection in self.ID_PREFIXES.items():
+            if prefix not in self.sequences:
+                last = max((id_number(r.id) for r in self.data[collection]), default=0)
+                self.sequences[prefix] = {'id': prefix, 'last': last}
+                self.data['sequences'].append(self.sequences[prefix])
+
+    def reserve_ids(self, prefix, count=1):
+        """Allocates `count` consecutive new IDs for prefix (B, M, T or H).
+
+        IDs are never handed out twice, even after the record holding the
+        highest one is deleted. The new counter value is saved with the
+        next commit.
+        """
+        with self.id_lock:
+            counter = self.sequences[prefix]
+            first = counter['last'] + 1
+            counter['last'] += count
+            self.dirty_sequences.add(prefix)
+        return [format_id(self.id_prefix + prefix, n) for n in range(first, first + count)]
+
+    def allocate_id(self, prefix):
+        return self.reserve_ids(prefix)[0]
+
+    def index_book(self, book):
+        self.books_by_id[book.id] = book
+        self.stats.add_book(book)
+        if self.search_index:
+            self.search_index.add(book)
+
+    def index_member(self, member):
+        self.members_by_id[member.id] = member
+        self.stats.add_member(member)
+
+    def index_loan(self, transaction):
+        self.active_by_book[transaction.book_id] = transaction
+        self.active_by_member.setdefault(transaction.member_id, set()).add(transaction.id)
+        self.touched_members.add(transaction.member_id)
+
+    def unindex_loan(self, transaction):
+        self.active_by_book.pop(transaction.book_id, None)
+        self.touched_members.add(transaction.member_id)
+        loans = self.active_by_member.get(transaction.member_id)
+        if loans is not None:
+            loans.discard(transaction.id)
+            if not loans:
+                del self.active_by_member[transaction.member_id]
+
+    def index_hold(self, hold):
+        self.holds_by_id[hold.id] = hold
+        self.holds_by_member.setdefault(hold.member_id, set()).add(hold.id)
+        self.touched_members.add(hold.member_id)
+        if hold.status == 'Ready':
+            self.ready_holds[hold.book_id] = hold
+        else:
+            heapq.heappush(self.hold_queues.setdefault(hold.book_id, []), (hold.priority, hold.request_time, hold.id))
+        heapq.heappush(self.hold_expiry, (hold.expire_day, hold.id))
+
+    def unindex_hold(self, hold):
+        # Its queue and expiry heap entries go stale and are skipped when popped.
+        self.holds_by_id.pop(hold.id, None)
+        self.touched_members.add(hold.member_id)
+        holds = self.holds_by_member.get(hold.member_id)
+        if holds is not None:
+            holds.discard(hold.id)
+            if not holds:
+                del self.holds_by_member[hold.member_id]
+        if self.ready_holds.get(hold.book_id) is hold:
+            del self.ready_holds[hold.book_id]
+
+    def commit(self, changes):
+        """Persists a list of changes and passes them on to listeners.
+
+        A deferred service holds the changes back until flush() is called.
+        """
+        if self.dirty_sequences:
+            changes = changes + [['put', 'sequences', self.sequences[p]] for p in sorted(self.dirty_sequences)]
+            self.dirty_sequences.clear()
+        self.note_view_changes(changes)
+        if self.touched_members:
+            if self.shared_members is not None:
+                self.shared_members.note_activity(self.branch, self.member_activity(self.touched_members))
+            self.touched_members.clear()
+        if self.deferred:
+            self.unflushed.extend(changes)
+        else:
+            self.persist(changes)
+        for listener in self.listeners:
+            listener(changes)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.storage.close()
+
+    def flush(self):
+        """Writes out all changes held back by deferred commits at once."""
+        if not self.unflushed:
+            return
+        changes, self.unflushed = self.unflushed, []
+        try:
+            self.persist(changes)
+        except CompactionError:
+            # The changes themselves were saved.
+            raise
+        except Exception:
+            self.unflushed = changes + self.unflushed
+            raise
+
+    @METRICS.timed('persistence', name='save')
+    def persist(self, changes):
+        self.storage.commit(self.data, changes)
+
+    def subscribe(self, listener):
+        """Registers a callable that receives every committed change list."""
+        self.listeners.append(listener)
+
+    def get_all_books(self):
+        return self.data['books']
+
+    def get_all_members(self):
+        return self.data['members']
+
+    def get_all_transactions(self):
+        if not self.storage.lazy_history:
+            return self.data['transactions']
+        return list(self.iter_transactions())
+
+    def iter_transactions(self):
+        if not self.storage.lazy_history:
+            return iter(self.data['transactions'])
+        # Loans held in memory (open ones and any returned this session) win
+        # over the stored copy, so callers see each loan once, as one object.
+        stored = (Transaction.from_dict(t) for t in self.storage.iter_transactions()
+                  if t['id'] not in self.transactions_by_id)
+        return itertools.chain(stored, self.data['transactions'])
+
+    def snapshot_transactions(self):
+        """Every loan as of now, for reading while later calls go on: a copy
+        of the loans held in memory, and an iterator over the stored ones
+        that reads storage only as it is consumed. It skips loans held in
+        memory now (those are in the copy) and any newer than the copy."""
+        loans = [t.to_dict() for t in self.data['transactions']]
+        if not self.storage.lazy_history:
+            return loans, iter(())
+        held, last = set(self.transactions_by_id), self.sequences['T']['last']
+        stored = (t for t in self.storage.iter_transactions()
+                  if t['id'] not in held and id_number(t['id']) <= last)
+        return loans, stored
+
+    @METRICS.timed('lookup')
+    def get_stats(self):
+        return self.stats.snapshot()
+
+    # --- Sorted and Filtered Views ---
+    #
+    # Each sort order of a collection is built once, on first use, and then
+    # kept in order as records change: a new record is inserted at its place
+    # by binary search, a record whose sort field changed is moved, and a
+    # deleted record is taken out. The loan history on disk is not part of
+    # these; loan_pages reads it a page at a time.
+
+    DAY_FIELDS = {'issue_date': 'issue_day', 'due_date': 'due_day', 'return_date': 'return_day', 'join_date': 'join_day'}
+
+    def note_view_changes(self, changes):
+        """Keeps the cached sort orders, and the loans by member and book, in step with changes."""
+        # Records to put in place once the whole commit is seen, by (collection, field).
+        moved = {}
+        for change in changes:
+            kind, collection = change[0], change[1]
+            if kind == 'put' and collection == 'transactions':
+                loan = change[2]
+                self.loans_by_member.setdefault(loan.member_id, []).append(loan)
+                self.loans_by_book.setdefault(loan.book_id, []).append(loan)
+            orders = self.sort_orders.get(collection)
+            if not orders:
+                continue
+            if kind == 'del':
+                # The record has already left the by-ID tables, so its keys are unknown.
+                for field, records in orders.items():
+                    moved.get((collection, field), {}).pop(change[2], None)
+                    position = next((i for i, r in enumerate(records) if r.id == change[2]), None)
+                    if position is not None:
+                        del records[position]
+            elif kind == 'put':
+                for field in orders:
+                    moved.setdefault((collection, field), {})[change[2].id] = change[2]
+            else:
+                record = self.record_tables[collection].get(change[2])
+                for field in change[3]:
+                    if field in orders and record is not None:
+                        moved.setdefault((collection, field), {})[record.id] = record
+        # Records are changed in place, so by now a commit that changed the
+        # sort field of several has left them all out of order: take them all
+        # out before binary-searching any back in.
+        for (collection, field), records_by_id in moved.items():
+            records = self.sort_orders[collection][field]
+            if records_by_id:
+                records[:] = [r for r in records if r.id not in records_by_id]
+            for record in records_by_id.values():
+                bisect.insort(records, record, key=self.sort_key(field))
+
+    def sort_key(self, field):
+        """Orders records by `field`, then by ID: no two records share a key,
+        and IDs with the same prefix sort numerically."""
+        if field == 'id':
+            return lambda record: (0, len(record.id), record.id)
+        if field in self.DAY_FIELDS:
+            slot = self.DAY_FIELDS[field]
+            return lambda record: (getattr(record, slot) or 0, len(record.id), record.id)
+        get = operator.attrgetter(field)
+        return lambda record: (get(record), len(record.id), record.id)
+
+    def sorted_records(self, collection, field):
+        """The records of a collection in ascending `field` order, kept
+        current in place; for transactions, the loans held in memory."""
+        orders = self.sort_orders.setdefault(collection, {})
+        records = orders.get(field)
+        if records is None:
+            records = orders[field] = sorted(self.data[collection], key=self.sort_key(field))
+        return records
+
+    def record_filters(self, filters):
+        """Builds predicates from filters such as {'status': 'Issued'},
+        {'member_id': 'M042'}, {'book_id': 'B007'}, {'overdue': True} or
+        {'on_loan': True}. Empty values are ignored."""
+        tests = []
+        if filters.get('status'):
+            tests.append(lambda r, status=filters['status']: r.status == status)
+        if filters.get('member_id'):
+            tests.append(lambda r, member_id=filters['member_id']: r.member_id == member_id)
+        if filters.get('book_id'):
+            tests.append(lambda r, book_id=filters['book_id']: r.book_id == book_id)
+        if filters.get('overdue'):
+            tests.append(lambda r, today=today_ordinal(): r.status == 'Issued' and r.due_day < today)
+        if filters.get('on_loan'):
+            tests.append(lambda r, borrowers=self.active_by_member: r.id in borrowers)
+        return tests
+
+    @METRICS.timed('lookup')
+    def query_records(self, collection, sort=None, descending=False, filters=None):
+        """Returns a new list of a collection's records, filtered and sorted by
+        one field. Without sort the records come in insertion order. For
+        transactions this covers the loans held in memory only; loan_pages
+        pages through the whole history."""
+        records = self.sorted_records(collection, sort) if sort else self.data[collection]
+        for test in self.record_filters(filters or {}):
+            records = list(filter(test, records))
+        return records[::-1] if descending else list(records)
+
+    def loan_pages(self, sort='issue_date', descending=True, filters=None, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """Yields (loans, cursor) pages of every loan, archived ones included,
+        in `sort` order and matching filters (see record_filters), starting
+        after `cursor` if given.
+
+        Each page merges the loans held in memory after the cursor, found by
+        binary search in their sort order, with a page of returned loans read
+        from storage through its index, so a page costs O(log n + page_size)
+        however long the history is. A filter on status or overdue may have
+        to step over non-matching loans held in memory.
+        """
+        filters = filters or {}
+        key = self.sort_key(sort)
+        tests = self.record_filters(filters)
+        stored = self.storage.lazy_history and not filters.get('overdue') and filters.get('status') in (None, '', 'Returned')
+        while True:
+            loans = self.memory_loans(sort, filters)
+            if cursor is None:
+                positions = range(len(loans) - 1, -1, -1) if descending else range(len(loans))
+            elif descending:
+                positions = range(bisect.bisect_left(loans, tuple(cursor), key=key) - 1, -1, -1)
+            else:
+                positions = range(bisect.bisect_right(loans, tuple(cursor), key=key), len(loans))
+            candidates = map(loans.__getitem__, positions)
+            for test in tests:
+                candidates = filter(test, candidates)
+            page = list(itertools.islice(candidates, page_size))
+            if stored:
+                merged = heapq.merge(page, self.stored_loans(sort, descending, filters, cursor, page_size),
+                                     key=key, reverse=descending)
+                page = list(itertools.islice(merged, page_size))
+            if not page:
+                return
+            cursor = key(page[-1])
+            yield page, cursor
+
+    def memory_loans(self, sort, filters):
+        """The loans held in memory that may match filters, in sort order."""
+        for field, loans in (('member_id', self.loans_by_member), ('book_id', self.loans_by_book)):
+            if filters.get(field):
+                return sorted(loans.get(filters[field], ()), key=self.sort_key(sort))
+        return self.sorted_records('transactions', sort)
+
+    def stored_loans(self, sort, descending, filters, cursor, limit):
+        """Up to `limit` returned loans from storage after cursor, leaving
+        out those held in memory."""
+        key = self.sort_key(sort)
+        loans = []
+        while len(loans) < limit:
+            if cursor is not None and sort in self.DAY_FIELDS:
+                cursor = (day_name(cursor[0]) if cursor[0] else '',) + tuple(cursor[1:])
+            batch = [Transaction.from_dict(t) for t in self.storage.loan_page(sort, descending, filters, cursor, limit)]
+            loans += [t for t in batch if t.id not in self.transactions_by_id]
+            if len(batch) < limit:
+                break
+            cursor = key(batch[-1])
+        return loans
+
+    # --- Loan History ---
+    #
+    # A member's or book's loans, newest first. Archived loans are read
+    # through the storage's (member_id|book_id, issue_date) indexes, which
+    # are written as loans are archived, and the loans held in memory come
+    # from loans_by_member and loans_by_book.
+
+    def member_history(self, member_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """Yields (loans, cursor) pages of a member's loans, newest first,
+        starting after `cursor` if given."""
+        return self.loan_pages('issue_date', True, {'member_id': member_id}, page_size, cursor)
+
+    def book_history(self, book_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """Like member_history, for the loans of one book."""
+        return self.loan_pages('issue_date', True, {'book_id': book_id}, page_size, cursor)
+
+    @METRICS.timed('lookup')
+    def find_book(self, book_id):
+        return self.books_by_id.get(book_id)
+
+    @METRICS.timed('lookup')
+    def search_books(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Finds books by title/author words (last word as a prefix) or ISBN."""
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.data['books'])
+        return [self.books_by_id[book_id] for book_id in self.search_index.search(query, limit)]
+
+    @METRICS.timed('lookup')
+    def find_member(self, member_id):
+        if self.shared_members is not None:
+            return self.shared_members.find_member(member_id)
+        return self.members_by_id.get(member_id)
+
+    @METRICS.timed('lookup')
+    def find_transaction(self, transaction_id):
+        return self.transactions_by_id.get(transaction_id)
+
+    # --- Book Operations ---
+
+    @METRICS.timed('mutation')
+    def add_book(self, title, author, isbn):
+        new_book = Book(self.allocate_id('B'), title, author, isbn)
+        self.data['books'].append(new_book)
+        self.index_book(new_book)
+        self.commit([['put', 'books', new_book]])
+        return new_book
+
+    @METRICS.timed('mutation')
+    def delete_book(self, book_id):
+        if book_id in self.active_by_book:
+            return False, "Book is currently issued and cannot be deleted."
+        
+        self.data['books'] = [b for b in self.data['books'] if b.id != book_id]
+        book = self.books_by_id.pop(book_id, None)
+        if book:
+            self.stats.remove_book(book)
+            if self.search_index:
+                self.search_index.remove(book)
+        changes = [['del', 'books', book_id]]
+        self.drop_holds(self.get_holds(book_id=book_id), changes)
+        self.hold_queues.pop(book_id, None)
+        self.commit(changes)
+        return True, "Book deleted successfully."
+
+    # --- Member Operations ---
+
+    @METRICS.timed('mutation')
+    def add_member(self, name, email, phone):
+        new_member = Member(self.allocate_id('M'), name, email, phone, today_ordinal())
+        self.data['members'].append(new_member)
+        self.index_member(new_member)
+        self.commit([['put', 'members', new_member]])
+        return new_member
+
+    @METRICS.timed('mutation')
+    def delete_member(self, member_id):
+        if member_id in self.active_by_member:
+            return False, "Member has outstanding books and cannot be deleted."
+
+        self.data['members'] = [m for m in self.data['members'] if m.id != member_id]
+        member = self.members_by_id.pop(member_id, None)
+        if member:
+            self.stats.remove_member(member)
+        changes = [['del', 'members', member_id]]
+        self.withdraw_holds(self.get_holds(member_id=member_id), changes, today_ordinal())
+        self.commit(changes)
+        return True, "Member deleted successfully."
+
+    def member_activity(self, member_ids=None):
+        """{member_id: (open loans, holds)} for the given members, or for
+        every member with either."""
+        if member_ids is None:
+            member_ids = self.active_by_member.keys() | self.holds_by_member.keys()
+        return {m: (len(self.active_by_member.get(m, ())), len(self.holds_by_member.get(m, ()))) for m in member_ids}
+
+    @METRICS.timed('mutation')
+    def withdraw_member_holds(self, member_id):
+        """Withdraws a member's holds, as delete_member does; for a branch
+        shard whose members are kept elsewhere."""
+        changes = []
+        self.withdraw_holds(self.get_holds(member_id=member_id), changes, today_ordinal())
+        if changes:
+            self.commit(changes)
+
+    # --- Transaction Operations ---
+
+    def issue_book(self, book_id, member_id):
+        return self.issue_books([(book_id, member_id)])[0]
+
+    def return_book(self, book_id):
+        return self.return_books([book_id])[0]
+
+    @METRICS.timed('mutation')
+    def issue_books(self, pairs):
+        """Issues a stack of books in one operation.
+
+        Every (book_id, member_id) pair is checked before anything changes;
+        the valid ones are then applied together and saved with a single
+        commit. Returns one (success, message) per pair, in order.
+        """
+        results, accepted, claimed = [], [], set()
+        for book_id, member_id in pairs:
+            book = self.find_book(book_id)
+            member = self.find_member(member_id)
+            hold = self.ready_holds.get(book_id)
+            if not book or book.status not in ('Available', 'On Hold') or book_id in claimed:
+                results.append((False, "Book is not available for issue."))
+            elif not member:
+                results.append((False, "Member not found."))
+            elif hold and hold.member_id != member_id:
+                results.append((False, f"Book is being held for member {hold.member_id}."))
+            else:
+                claimed.add(book_id)
+                accepted.append((len(results), book, member))
+                results.append(None)
+
+        changes = []
+        issue_day = today_ordinal()
+        transaction_ids = self.reserve_ids('T', len(accepted)) if accepted else []
+        collected = [self.ready_holds[book.id] for _, book, _ in accepted if book.id in self.ready_holds]
+        for transaction_id, (i, book, member) in zip(transaction_ids, accepted):
+            self.stats.set_book_status(book.status, 'Issued')
+            book.status = 'Issued'
+
+            new_transaction = Transaction(transaction_id, book.id, member.id,
+                                          issue_day, issue_day + DEFAULT_LOAN_DAYS)
+            self.data['transactions'].append(new_transaction)
+            self.transactions_by_id[new_transaction.id] = new_transaction
+            self.index_loan(new_transaction)
+            self.stats.open_loan(new_transaction)
+            changes.append(['set', 'books', book.id, {'status': 'Issued'}])
+            changes.append(['put', 'transactions', new_transaction])
+            results[i] = (True, f"Book issued successfully. Due: {new_transaction.due_date}")
+
+        self.drop_holds(collected, changes)
+        if changes:
+            self.commit(changes)
+        return results
+
+    @METRICS.timed('mutation')
+    def return_books(self, book_ids):
+        """Returns a stack of books in one operation, like issue_books."""
+        results, accepted, claimed = [], [], set()
+        for book_id in book_ids:
+            book = self.find_book(book_id)
+            if not book or book.status != 'Issued' or book_id in claimed:
+                results.append((False, "Book is not currently issued."))
+            elif book_id not in self.active_by_book:
+                results.append((False, "Active transaction record not found."))
+            else:
+                claimed.add(book_id)
+                accepted.append((len(results), book, self.active_by_book[book_id]))
+                results.append(None)
+
+        changes = []
+        return_day = today_ordinal()
+        for i, book, active_transaction in accepted:
+            active_transaction.return_day = return_day
+            active_transaction.status = 'Returned'
+            self.unindex_loan(active_transaction)
+            self.stats.close_loan(active_transaction)
+            changes.append(['set', 'transactions', active_transaction.id,
+                            {'return_date': active_transaction.return_date, 'status': 'Returned'}])
+            hold = self.release_copy(book, changes, return_day)
+            if hold:
+                results[i] = (True, f"Book returned successfully. Set it aside for member {hold.member_id} (hold {hold.id}).")
+            else:
+                results[i] = (True, "Book returned successfully.")
+
+        if changes:
+            self.commit(changes)
+        return results
+
+    # --- Hold Operations ---
+    #
+    # Each book has a heap of waiting holds keyed by (priority, request_time),
+    # so handing a returned copy to the next hold is O(log n). Cancelled and
+    # expired holds stay in the heaps until they surface and are skipped.
+
+    def get_all_holds(self):
+        """Every hold, in no particular order."""
+        return self.data['holds']
+
+    @METRICS.timed('lookup')
+    def find_hold(self, hold_id):
+        return self.holds_by_id.get(hold_id)
+
+    @METRICS.timed('lookup')
+    def get_holds(self, book_id=None, member_id=None):
+        """A book's holds in the order they will be served, or a member's
+        holds oldest first."""
+        if member_id is not None:
+            holds = (self.holds_by_id[h] for h in self.holds_by_member.get(member_id, ()))
+            return sorted(holds, key=lambda h: h.request_time)
+        ready = self.ready_holds.get(book_id)
+        waiting = [self.holds_by_id[h] for _, _, h in sorted(self.hold_queues.get(book_id, ()))
+                   if h in self.holds_by_id]
+        return ([ready] if ready else []) + waiting
+
+    @METRICS.timed('mutation')
+    def place_hold(self, book_id, member_id, priority=DEFAULT_HOLD_PRIORITY):
+        book = self.find_book(book_id)
+        if not book:
+            return False, "Book not found."
+        if not self.find_member(member_id):
+            return False, "Member not found."
+        if book.status == 'Available':
+            return False, "Book is available; issue it instead."
+        loan = self.active_by_book.get(book_id)
+        if loan and loan.member_id == member_id:
+            return False, "Member already has this book."
+        if any(self.holds_by_id[h].book_id == book_id for h in self.holds_by_member.get(member_id, ())):
+            return False, "Member already has a hold on this book."
+
+        hold = Hold(self.allocate_id('H'), book_id, member_id, priority, time.time(),
+                    today_ordinal() + HOLD_EXPIRY_DAYS)
+        self.hold_slots[hold.id] = len(self.data['holds'])
+        self.data['holds'].append(hold)
+        self.index_hold(hold)
+        self.commit([['put', 'holds', hold]])
+        return True, f"Hold {hold.id} placed."
+
+    @METRICS.timed('mutation')
+    def cancel_hold(self, hold_id):
+        hold = self.holds_by_id.get(hold_id)
+        if not hold:
+            return False, "Hold not found."
+        changes = []
+        self.withdraw_holds([hold], changes, today_ordinal())
+        self.commit(changes)
+        return True, "Hold cancelled."
+
+    @METRICS.timed('mutation')
+    def expire_holds(self, today=None):
+        """Drops holds past their expiry day, passing copies that were set
+        aside for them on to the next hold. Returns how many expired."""
+        today = today or today_ordinal()
+        expired = []
+        while self.hold_expiry and self.hold_expiry[0][0] < today:
+            day, hold_id = heapq.heappop(self.hold_expiry)
+            hold = self.holds_by_id.get(hold_id)
+            if hold is not None and hold.expire_day == day:
+                expired.append(hold)
+        if not expired:
+            return 0
+
+        changes = []
+        self.withdraw_holds(expired, changes, today)
+        self.commit(changes)
+        return len(expired)
+
+    def drop_holds(self, holds, changes):
+        """Removes fulfilled, cancelled or expired holds.
+
+        Each one is swapped with the last hold in the list and popped, so a
+        removal is O(1) however many holds there are.
+        """
+        all_holds = self.data['holds']
+        for hold in holds:
+            slot = self.hold_slots.pop(hold.id, None)
+            if slot is None:
+                continue
+            self.unindex_hold(hold)
+            last = all_holds.pop()
+            if last is not hold:
+                all_holds[slot] = last
+                self.hold_slots[last.id] = slot
+            changes.append(['del', 'holds', hold.id])
+
+    def withdraw_holds(self, holds, changes, today):
+        """Drops holds that will not be collected, passing any copies set
+        aside for them on to the next hold."""
+        self.drop_holds(holds, changes)
+        for hold in holds:
+            if hold.status == 'Ready' and hold.book_id in self.books_by_id:
+                self.release_copy(self.books_by_id[hold.book_id], changes, today)
+
+    def next_hold(self, book_id):
+        """Pops the book's first live waiting hold, or returns None."""
+        queue = self.hold_queues.get(book_id)
+        hold = None
+        while queue and hold is None:
+            _, _, hold_id = heapq.heappop(queue)
+            hold = self.holds_by_id.get(hold_id)
+        if queue is not None and not queue:
+            del self.hold_queues[book_id]
+        return hold
+
+    def release_copy(self, book, changes, today):
+        """A copy has come free: sets it aside for the next hold, if any, or
+        makes it available. Returns the hold it went to."""
+        hold = self.next_hold(book.id)
+        status = 'On Hold' if hold else 'Available'
+        if book.status != status:
+            self.stats.set_book_status(book.status, status)
+            book.status = status
+            changes.append(['set', 'books', book.id, {'status': status}])
+        if hold:
+            hold.status = 'Ready'
+            hold.expire_day = today + HOLD_PICKUP_DAYS
+            self.ready_holds[book.id] = hold
+            heapq.heappush(self.hold_expiry, (hold.expire_day, hold.id))
+            changes.append(['set', 'holds', hold.id, {'status': 'Ready', 'expire_date': hold.expire_date}])
+        return hold
+
+    # --- Bulk Operations ---
+
+    IMPORT_FIELDS = {
+        'books': ('title', 'author', 'isbn'),
+        'members': ('name', 'email', 'phone'),
+    }
+
+    EXPORT_FIELDS = {
+        'books': ('id', 'title', 'author', 'isbn', 'status'),
+        'members': ('id', 'name', 'email', 'phone', 'join_date'),
+        'transactions': ('id', 'book_id', 'member_id', 'issue_date', 'due_date', 'return_date', 'status'),
+    }
+
+    @METRICS.timed('mutation')
+    def import_records(self, collection, rows, batch_size=IMPORT_BATCH_SIZE):
+        """Adds books or members from an iterable of dict rows.
+
+        Rows are validated and given IDs one batch at a time, and each batch
+        is committed once; a row that fails validation is reported and
+        skipped, and so is a row that is not a dict (read_records yields
+        unreadable lines as ValueErrors). Storage that rewrites its whole file per commit (json) is
+        written once, after the last batch. Returns (imported_count, errors)
+        where errors is a list of (row_number, message).
+        """
+        fields = self.IMPORT_FIELDS[collection]
+        today = today_ordinal()
+        hold_back = self.hold_back_commits()
+        if hold_back:
+            self.deferred = True
+
+        imported, errors, batch = 0, [], []
+        try:
+            for row_number, row in enumerate(rows, 1):
+                if not isinstance(row, dict):
+                    errors.append((row_number, str(row) if isinstance(row, ValueError) else "Not a record."))
+                    continue
+                values = {f: str(row.get(f) or '').strip() for f in fields}
+                missing = [f for f, v in values.items() if not v]
+                if missing:
+                    errors.append((row_number, f"Missing {', '.join(missing)}."))
+                    continue
+
+                if collection == 'books':
+                    record = (values['title'], values['author'], values['isbn'])
+                else:
+                    try:
+                        join_day = day_ordinal(str(row['join_date'])) if row.get('join_date') else today
+                    except ValueError:
+                        errors.append((row_number, "Invalid join_date, expected YYYY-MM-DD."))
+                        continue
+                    record = (values['name'], values['email'], values['phone'], join_day)
+                batch.append(record)
+
+                if len(batch) >= batch_size:
+                    imported += self.commit_import(collection, batch)
+                    batch = []
+            if batch:
+                imported += self.commit_import(collection, batch)
+        finally:
+            if hold_back:
+                self.deferred = False
+                self.flush()
+        return imported, errors
+
+    def hold_back_commits(self):
+        return self.storage.rewrites_on_commit and not self.deferred
+
+    def commit_import(self, collection, batch):
+        prefix, record_type = ('B', Book) if collection == 'books' else ('M', Member)
+        batch = [record_type(record_id, *values) for record_id, values in zip(self.reserve_ids(prefix, len(batch)), batch)]
+        index = self.index_book if collection == 'books' else self.index_member
+        self.data[collection].extend(batch)
+        for record in batch:
+            index(record)
+        self.commit([['put', collection, record] for record in batch])
+        return len(batch)
+
+    def export_records(self, collection):
+        """Streams the records of a collection without copying them."""
+        if collection == 'transactions':
+            return self.iter_transactions()
+        return iter(self.data[collection])
+
+
+# --- 2.1 REMOTE SERVICE CLIENT ---
+
+class RemoteLibraryService:
+    """Stands in for LibraryService by talking to a server.py instance.
+
+    Books, members and transactions are mirrored locally from /snapshot and
+    kept current by replaying the server's change log, so reads stay local
+    and listeners see the same change lists a local service would publish.
+    """
+
+    COLLECTIONS = ('books', 'members', 'transactions', 'holds')
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.listeners = []
+        self.load()
+
+    def request(self, method, path, body=None):
+        # urllib.request pulls in http.client, ssl and email; only client
+        # mode pays for them.
+        import urllib.error
+        import urllib.request
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=REMOTE_TIMEOUT) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            # 409 carries a refused operation's (success, message) reply.
+            if e.code != 409:
+                raise
+            return json.loads(e.read())
+
+    def load(self):
+        snapshot = self.request('GET', '/snapshot')
+        self.epoch = snapshot['epoch']
+        self.seq = snapshot['seq']
+        self.tables = {name: {r['id']: r for r in snapshot.get(name, [])} for name in self.COLLECTIONS}
+        self.lists = {}
+
+    def sync(self):
+        """Applies changes made on the server since the last sync."""
+        params = urllib.parse.urlencode({'since': self.seq, 'epoch': self.epoch})
+        reply = self.request('GET', f'/changes?{params}')
+        if reply.get('reset'):
+            # Too far behind the server's change log: reload everything.
+            old_ids = {name: set(self.tables[name]) for name in self.COLLECTIONS}
+            self.load()
+            changes = [['del', name, record_id] for name in self.COLLECTIONS
+                       for record_id in old_ids[name] - set(self.tables[name])]
+            changes += [['put', name, r] for name in self.COLLECTIONS for r in self.tables[name].values()]
+            self.publish(changes)
+            return
+
+        for seq, changes in reply['changes']:
+            self.seq = seq
+            for change in changes:
+                self.apply(change)
+            self.publish(changes)
+
+    def apply(self, change):
+        kind, collection = change[0], change[1]
+        if collection not in self.tables:
+            return
+        table = self.tables[collection]
+        self.lists.pop(collection, None)
+        if kind == 'put':
+            if change[2]['id'] in table:
+                # Keep the existing object so references held by the UI stay live.
+                record = table[change[2]['id']]
+                record.clear()
+                record.update(change[2])
+            else:
+                table[change[2]['id']] = change[2]
+        elif kind == 'set' and change[2] in table:
+            table[change[2]].update(change[3])
+        elif kind == 'del':
+            table.pop(change[2], None)
+
+    def publish(self, changes):
+        for listener in self.listeners:
+            listener(changes)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def all(self, collection):
+        if collection not in self.lists:
+            self.lists[collection] = list(self.tables[collection].values())
+        return self.lists[collection]
+
+    def get_all_books(self):
+        return self.all('books')
+
+    def get_all_members(self):
+        return self.all('members')
+
+    def get_all_transactions(self):
+        return self.all('transactions')
+
+    def member_history(self, member_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        return self.loan_pages('issue_date', True, {'member_id': member_id}, page_size, cursor)
+
+    def book_history(self, book_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        return self.loan_pages('issue_date', True, {'book_id': book_id}, page_size, cursor)
+
+    @METRICS.timed('lookup')
+    def get_stats(self):
+        return self.request('GET', '/stats')
+
+    @METRICS.timed('lookup')
+    def find_book(self, book_id):
+        return self.tables['books'].get(book_id)
+
+    @METRICS.timed('lookup')
+    def find_member(self, member_id):
+        return self.tables['members'].get(member_id)
+
+    @METRICS.timed('lookup')
+    def find_transaction(self, transaction_id):
+        return self.tables['transactions'].get(transaction_id)
+
+    @METRICS.timed('lookup')
+    def search_books(self, query, limit=SEARCH_RESULT_LIMIT):
+        params = urllib.parse.urlencode({'q': query, 'limit': limit})
+        return [self.tables['books'].get(b['id'], b) for b in self.request('GET', f'/books?{params}')]
+
+    @staticmethod
+    def record_key(field):
+        """Like LibraryService.sort_key, for the mirror's plain dicts."""
+        if field == 'id':
+            return lambda r: ('', len(r['id']), r['id'])
+        return lambda r: (r[field] or '', len(r['id']), r['id'])
+
+    @METRICS.timed('lookup')
+    def query_records(self, collection, sort=None, descending=False, filters=None):
+        """Like LibraryService.query_records, over the local mirror (which
+        holds every loan)."""
+        filters = filters or {}
+        records = self.all(collection)
+        if filters.get('status'):
+            records = [r for r in records if r['status'] == filters['status']]
+        if filters.get('member_id'):
+            records = [r for r in records if r['member_id'] == filters['member_id']]
+        if filters.get('book_id'):
+            records = [r for r in records if r['book_id'] == filters['book_id']]
+        if filters.get('overdue'):
+            today = date.today().isoformat()
+            records = [r for r in records if r['status'] == 'Issued' and r['due_date'] < today]
+        if filters.get('on_loan'):
+            borrowers = {t['member_id'] for t in self.all('transactions') if t['status'] == 'Issued'}
+            records = [r for r in records if r['id'] in borrowers]
+        if sort:
+            return sorted(records, key=self.record_key(sort), reverse=descending)
+        return records[::-1] if descending else list(records)
+
+    def loan_pages(self, sort='issue_date', descending=True, filters=None, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """Like LibraryService.loan_pages; the matching loans are sorted once
+        when paging starts."""
+        loans = self.query_records('transactions', sort, False, filters)
+        yield from list_pages(loans, self.record_key(sort), descending, page_size, cursor)
+
+    def mutate(self, method, path, body=None):
+        """Runs an operation on the server, then pulls in its changes."""
+        result = self.request(method, path, body)
+        self.sync()
+        return result
+
+    def add_book(self, title, author, isbn):
+        book = self.mutate('POST', '/books', {'title': title, 'author': author, 'isbn': isbn})
+        return self.find_book(book['id']) or book
+
+    def delete_book(self, book_id):
+        reply = self.mutate('DELETE', f'/books/{urllib.parse.quote(book_id)}')
+        return reply['success'], reply['message']
+
+    def add_member(self, name, email, phone):
+        member = self.mutate('POST', '/members', {'name': name, 'email': email, 'phone': phone})
+        return self.find_member(member['id']) or member
+
+    def delete_member(self, member_id):
+        reply = self.mutate('DELETE', f'/members/{urllib.parse.quote(member_id)}')
+        return reply['success'], reply['message']
+
+    def issue_book(self, book_id, member_id):
+        reply = self.mutate('POST', '/issue', {'book_id': book_id, 'member_id': member_id})
+        return reply['success'], reply['message']
+
+    def return_book(self, book_id):
+        reply = self.mutate('POST', '/return', {'book_id': book_id})
+        return reply['success'], reply['message']
+
+    def issue_books(self, pairs):
+        reply = self.mutate('POST', '/issue-batch', {'items': [{'book_id': b, 'member_id': m} for b, m in pairs]})
+        return [(r['success'], r['message']) for r in reply['results']]
+
+    def return_books(self, book_ids):
+        reply = self.mutate('POST', '/return-batch', {'book_ids': list(book_ids)})
+        return [(r['success'], r['message']) for r in reply['results']]
+
+    def get_all_holds(self):
+        return self.all('holds')
+
+    @METRICS.timed('lookup')
+    def find_hold(self, hold_id):
+        return self.tables['holds'].get(hold_id)
+
+    @METRICS.timed('lookup')
+    def get_holds(self, book_id=None, member_id=None):
+        if member_id is not None:
+            holds = [h for h in self.all('holds') if h['member_id'] == member_id]
+            return sorted(holds, key=lambda h: h['request_time'])
+        holds = [h for h in self.all('holds') if h['book_id'] == book_id]
+        return sorted(holds, key=lambda h: (h['status'] != 'Ready', h['priority'], h['request_time']))
+
+    def place_hold(self, book_id, member_id, priority=DEFAULT_HOLD_PRIORITY):
+        reply = self.mutate('POST', '/holds', {'book_id': book_id, 'member_id': member_id, 'priority': priority})
+        return reply['success'], reply['message']
+
+    def cancel_hold(self, hold_id):
+        reply = self.mutate('DELETE', f'/holds/{urllib.parse.quote(hold_id)}')
+        return reply['success'], reply['message']
+
+    def expire_holds(self, today=None):
+        # The server runs the expiry sweep for every desk.
+        return 0
+
+
+# --- 2.2 BRANCH SHARDS ---
+
+class SharedMembers:
+    """The members every branch shares, in one SQLite database,
+    BRANCH_DIR/members.db, that every desk opens.
+
+    SQLite's locking makes the database the single owner of the members
+    across desks. A new member's ID is allocated in the same write
+    transaction that inserts the member, so two desks never hand out the
+    same ID. Each desk keeps the members in memory for lookups. Triggers log
+    every change to member_changes, and a desk reads that log whenever
+    PRAGMA data_version shows that another desk has written.
+
+    Branch shards record each member's open loans and holds with them in
+    member_activity as they commit, so a delete can check every branch, not
+    just the ones this desk has open.
+    """
+
+    FILE = "members.db"
+    # Entries of member_changes kept when a desk opens the database; a desk
+    # that falls further behind than this reloads every member.
+    CHANGE_LOG_ROWS = 100000
+    IMPORT_FIELDS = LibraryService.IMPORT_FIELDS
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS members (
+            id TEXT PRIMARY KEY, name TEXT, email TEXT, phone TEXT, join_date TEXT);
+        CREATE TABLE IF NOT EXISTS sequences (id TEXT PRIMARY KEY, last INTEGER);
+        CREATE TABLE IF NOT EXISTS member_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, member_id TEXT);
+        CREATE TRIGGER IF NOT EXISTS members_put AFTER INSERT ON members
+            BEGIN INSERT INTO member_changes (member_id) VALUES (NEW.id); END;
+        CREATE TRIGGER IF NOT EXISTS members_set AFTER UPDATE ON members
+            BEGIN INSERT INTO member_changes (member_id) VALUES (NEW.id); END;
+        CREATE TRIGGER IF NOT EXISTS members_del AFTER DELETE ON members
+            BEGIN INSERT INTO member_changes (member_id) VALUES (OLD.id); END;
+        CREATE TABLE IF NOT EXISTS member_activity (
+            member_id TEXT, branch TEXT, loans INTEGER, holds INTEGER, PRIMARY KEY (member_id, branch));
+        CREATE INDEX IF NOT EXISTS members_by_id ON members (length(id), id);
+        CREATE INDEX IF NOT EXISTS members_by_name ON members (name, length(id), id);
+        CREATE INDEX IF NOT EXISTS members_by_email ON members (email, length(id), id);
+        CREATE INDEX IF NOT EXISTS members_by_phone ON members (phone, length(id), id);
+        CREATE INDEX IF NOT EXISTS members_by_join_date ON members (join_date, length(id), id);
+        CREATE INDEX IF NOT EXISTS member_activity_by_branch ON member_activity (branch);
+    """
+
+    def __init__(self, path, mode=None):
+        """`mode` is the storage backend of an older members shard to move in."""
+        import sqlite3  # only branch desks need it
+        is_new = not os.path.exists(path)
+        # Shards commit from the router's threads; self.lock keeps them apart.
+        # Writes begin IMMEDIATE, so they wait for other desks' writes up
+        # front instead of failing partway through.
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level='IMMEDIATE', check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.lock = threading.RLock()
+        self.listeners = []
+        self.members_by_id = {}
+        self.member_list = None
+        self.change_seq = 0
+        self.data_version = None
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO sequences VALUES ('M', 0)")
+            self.conn.execute("DELETE FROM member_changes WHERE seq <= (SELECT MAX(seq) FROM member_changes) - ?",
+                              (self.CHANGE_LOG_ROWS,))
+        self.legacy_dir = os.path.join(os.path.dirname(path), 'members')
+        if is_new and os.path.isdir(self.legacy_dir):
+            self.import_legacy(mode)
+        self.refresh()
+
+    @classmethod
+    def open(cls, mode=None):
+        os.makedirs(BRANCH_DIR, exist_ok=True)
+        return cls(os.path.join(BRANCH_DIR, cls.FILE), mode)
+
+    def import_legacy(self, mode):
+        """Moves in the members of a BRANCH_DIR/members/ shard, where they
+        were kept before this database; the shard's files are left as they are."""
+        storage = open_storage(mode, self.legacy_dir)
+        try:
+            data = storage.load()
+        finally:
+            storage.close()
+        members = [Member.from_dict(m) for m in data.get('members', [])]
+        last = max([s['last'] for s in data.get('sequences', []) if s['id'] == 'M'] +
+                   [id_number(m.id) for m in members], default=0)
+        with self.conn:
+            self.conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?, ?)",
+                                  [(m.id, m.name, m.email, m.phone, m.join_date) for m in members])
+            self.conn.execute("UPDATE sequences SET last = MAX(last, ?) WHERE id = 'M'", (last,))
+
+    # --- Keeping up with other desks ---
+
+    def refresh(self):
+        """Pulls in the members other desks added, changed or deleted, and
+        passes the changes on to listeners."""
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return
+            self.data_version = version
+            oldest = self.conn.execute("SELECT MIN(seq) FROM member_changes").fetchone()[0]
+            if self.change_seq and oldest is not None and oldest > self.change_seq + 1:
+                self.change_seq = 0  # The log was trimmed past us.
+            if self.change_seq:
+                # One statement, so every row shows the members as of one moment.
+                rows = self.conn.execute("""
+                    SELECT c.seq, c.member_id, m.id, m.name, m.email, m.phone, m.join_date
+                    FROM member_changes c LEFT JOIN members m ON m.id = c.member_id
+                    WHERE c.seq > ? ORDER BY c.seq""", (self.change_seq,)).fetchall()
+                if rows:
+                    self.change_seq = rows[-1]['seq']
+                stored = {row['member_id']: row for row in rows}
+            else:
+                self.change_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM member_changes").fetchone()[0]
+                stored = {row['id']: row for row in self.conn.execute("SELECT * FROM members ORDER BY rowid")}
+                stored.update((member_id, None) for member_id in self.members_by_id.keys() - stored.keys())
+
+            changes = []
+            for member_id, row in stored.items():
+                member = self.members_by_id.get(member_id)
+                if row is None or row['id'] is None:
+                    if member is not None:
+                        del self.members_by_id[member_id]
+                        changes.append(['del', 'members', member_id])
+                    continue
+                fresh = Member.from_dict(dict(row))
+                if member is None or member.to_dict() != fresh.to_dict():
+                    self.members_by_id[member_id] = fresh
+                    changes.append(['put', 'members', fresh])
+            if changes:
+                self.member_list = None
+        if changes:
+            self.publish(changes)
+
+    def publish(self, changes):
+        for listener in self.listeners:
+            listener(changes)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def flush(self):
+        pass  # Every change is written as it is made.
+
+    def close(self):
+        self.conn.close()
+
+    # --- Lookups ---
+
+    @METRICS.timed('lookup')
+    def find_member(self, member_id):
+        self.refresh()
+        return self.members_by_id.get(member_id)
+
+    def get_all_members(self):
+        self.refresh()
+        with self.lock:
+            if self.member_list is None:
+                self.member_list = list(self.members_by_id.values())
+            return self.member_list
+
+    @METRICS.timed('lookup')
+    def get_stats(self):
+        self.refresh()
+        return {**LibraryStats().snapshot(), 'total_members': len(self.members_by_id)}
+
+    @METRICS.timed('lookup')
+    def query_records(self, collection, sort=None, descending=False, filters=None):
+        """Like LibraryService.query_records for members; the database's
+        indexes give the sort order."""
+        self.refresh()
+        if sort:
+            if sort not in Member.FIELDS:
+                raise ValueError(f"Unknown sort field: {sort}")
+            order = 'length(id), id' if sort == 'id' else f'{sort}, length(id), id'
+            with self.lock:
+                ids = [row[0] for row in self.conn.execute(f"SELECT id FROM members ORDER BY {order}")]
+            records = [self.members_by_id[i] for i in ids if i in self.members_by_id]
+        else:
+            records = self.get_all_members()
+        if filters and filters.get('on_loan'):
+            borrowers = self.borrowers()
+            records = [m for m in records if m.id in borrowers]
+        return records[::-1] if descending else list(records)
+
+    def export_records(self, collection):
+        return iter(self.get_all_members())
+
+    # --- Branch activity ---
+
+    def reset_activity(self, branch, activity):
+        """Replaces what a branch has recorded, as its shard opens."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM member_activity WHERE branch = ?", (branch,))
+            self.conn.executemany("INSERT INTO member_activity VALUES (?, ?, ?, ?)",
+                                  [(m, branch, loans, holds) for m, (loans, holds) in activity.items()])
+
+    def note_activity(self, branch, activity):
+        """Records {member_id: (open loans, holds)} at a branch."""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM member_activity WHERE member_id = ? AND branch = ?",
+                                  [(m, branch) for m, counts in activity.items() if counts == (0, 0)])
+            self.conn.executemany("INSERT OR REPLACE INTO member_activity VALUES (?, ?, ?, ?)",
+                                  [(m, branch, *counts) for m, counts in activity.items() if counts != (0, 0)])
+
+    def borrowers(self):
+        """IDs of the members with a book out at any branch."""
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT DISTINCT member_id FROM member_activity WHERE loans > 0")}
+
+    # --- Mutations ---
+
+    def insert(self, batch):
+        """Adds members from (name, email, phone, join_day) tuples, with IDs
+        allocated in the same transaction."""
+        with self.lock:
+            with self.conn:
+                last = self.conn.execute("UPDATE sequences SET last = last + ? WHERE id = 'M' RETURNING last",
+                                         (len(batch),)).fetchone()[0]
+                numbers = range(last - len(batch) + 1, last + 1)
+                members = [Member(format_id('M', n), *values) for n, values in zip(numbers, batch)]
+                self.conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?, ?)",
+                                      [(m.id, m.name, m.email, m.phone, m.join_date) for m in members])
+            for member in members:
+                self.members_by_id[member.id] = member
+            self.member_list = None
+        self.publish([['put', 'members', m] for m in members])
+        return members
+
+    @METRICS.timed('mutation')
+    def add_member(self, name, email, phone):
+        return self.insert([(name, email, phone, today_ordinal())])[0]
+
+    import_records = LibraryService.import_records
+
+    def hold_back_commits(self):
+        return False  # each batch is one SQL transaction
+
+    def commit_import(self, collection, batch):
+        return len(self.insert(batch))
+
+    @METRICS.timed('mutation')
+    def delete_member(self, member_id, shards=None):
+        """Deletes a member who has no books out at any branch. Their holds
+        are withdrawn at the branches in `shards` (the ones this desk has
+        open); holds at any other branch have to be cancelled there first."""
+        shards = shards or {}
+        with self.lock:
+            activity = self.conn.execute("SELECT branch, loans, holds FROM member_activity WHERE member_id = ?",
+                                         (member_id,)).fetchall()
+            if any(row['loans'] for row in activity):
+                return False, "Member has outstanding books and cannot be deleted."
+            elsewhere = sorted(row['branch'] for row in activity if row['holds'] and row['branch'] not in shards)
+            if elsewhere:
+                return False, f"Member has holds at {', '.join(elsewhere)}; cancel them there first."
+            for shard in shards.values():
+                shard.withdraw_member_holds(member_id)
+            # Another desk may have lent the member a book in the meantime.
+            with self.conn:
+                deleted = self.conn.execute("""
+                    DELETE FROM members WHERE id = ? AND NOT EXISTS (
+                        SELECT 1 FROM member_activity WHERE member_id = ? AND (loans > 0 OR holds > 0))""",
+                    (member_id, member_id)).rowcount
+                if deleted:
+                    self.conn.execute("DELETE FROM member_activity WHERE member_id = ?", (member_id,))
+            if not deleted and member_id in self.members_by_id:
+                return False, "Member has outstanding books or holds and cannot be deleted."
+            if self.members_by_id.pop(member_id, None) is not None:
+                self.member_list = None
+        self.publish([['del', 'members', member_id]])
+        return True, "Member deleted successfully."
+
+class BranchRouter:
+    """Stands in for LibraryService over the shards of several branches.
+
+    Each branch's books, loans and holds live in a LibraryService of their
+    own, and the members every branch shares in SharedMembers. Records carry
+    their branch in their IDs, so operations on a book, loan or hold go
+    straight to its shard; batches are split by branch. Lookups, queries
+    and stats that span branches run on all shards at once on a thread pool
+    and their results are merged. The first branch is the desk's home
+    branch, where new books are added.
+    """
+
+    def __init__(self, members, shards):
+        self.members = members
+        self.shards = shards
+        self.home = next(iter(shards))
+        self.locks = []
+        self.pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="branch")
+        self.combined = {}
+        self.subscribe(self.on_changes)
+
+    @classmethod
+    def open(cls, branches, mode=None, deferred=False):
+        """Loads the members and the given branches' shards, the branches in
+        parallel. Raises BranchInUseError, having opened nothing, if another
+        desk has one of the shards open."""
+        paths = {code: branch_dir(code) for code in branches}
+        locks = []
+        try:
+            for code in branches:
+                locks.append(lock_shard(code, paths[code]))
+            members = SharedMembers.open(mode)
+
+            def open_shard(code):
+                storage = open_storage(mode, paths[code])
+                return LibraryService(storage, deferred, branch=code, members=members)
+
+            with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="branch") as pool:
+                router = cls(members, dict(zip(branches, pool.map(open_shard, branches))))
+        except BaseException:
+            for lock in locks:
+                lock.close()
+            raise
+        router.locks = locks
+        return router
+
+    def services(self):
+        return [self.members, *self.shards.values()]
+
+    def fan_out(self, fn, shards=None):
+        """fn(shard) for every shard (or the given ones) at once, in order."""
+        return list(self.pool.map(fn, self.shards.values() if shards is None else shards))
+
+    def shard_for(self, record_id):
+        return self.shards.get(branch_of(record_id))
+
+    def on_changes(self, changes):
+        # Records are changed in place, so only puts and deletes upset the
+        # combined lists.
+        for change in changes:
+            if change[0] != 'set':
+                self.combined.pop(change[1], None)
+
+    def combine(self, collection):
+        """One list of every shard's records of a collection, kept until it changes."""
+        records = self.combined.get(collection)
+        if records is None:
+            records = self.combined[collection] = [r for shard in self.shards.values() for r in shard.data[collection]]
+        return records
+
+    def subscribe(self, listener):
+        for service in self.services():
+            service.subscribe(listener)
+
+    def flush(self):
+        self.fan_out(lambda service: service.flush(), self.services())
+
+    def close(self):
+        try:
+            self.fan_out(lambda service: service.close(), self.services())
+        finally:
+            self.pool.shutdown()
+            for lock in self.locks:
+                lock.close()  # closing the file releases its lock
+
+    # --- Lookups ---
+
+    def get_all_books(self):
+        return self.combine('books')
+
+    def get_all_members(self):
+        return self.members.get_all_members()
+
+    def get_all_transactions(self):
+        return list(self.iter_transactions())
+
+    def iter_transactions(self):
+        return itertools.chain.from_iterable(shard.iter_transactions() for shard in self.shards.values())
+
+    def get_all_holds(self):
+        return self.combine('holds')
+
+    @METRICS.timed('lookup')
+    def get_stats(self):
+        snapshots = self.fan_out(lambda service: service.get_stats(), self.services())
+        return {key: sum(s[key] for s in snapshots) for key in snapshots[0]}
+
+    def find_book(self, book_id):
+        shard = self.shard_for(book_id)
+        return shard.find_book(book_id) if shard else None
+
+    def find_member(self, member_id):
+        return self.members.find_member(member_id)
+
+    def find_transaction(self, transaction_id):
+        shard = self.shard_for(transaction_id)
+        return shard.find_transaction(transaction_id) if shard else None
+
+    def find_hold(self, hold_id):
+        shard = self.shard_for(hold_id)
+        return shard.find_hold(hold_id) if shard else None
+
+    @METRICS.timed('lookup')
+    def search_books(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Matches from every branch, the home branch's first."""
+        results = self.fan_out(lambda shard: shard.search_books(query, limit))
+        return list(itertools.islice(itertools.chain.from_iterable(results), limit))
+
+    @METRICS.timed('lookup')
+    def query_records(self, collection, sort=None, descending=False, filters=None):
+        """Like LibraryService.query_records; each shard sorts its own part
+        and the sorted parts are merged."""
+        if collection == 'members':
+            filters = dict(filters or {})
+            on_loan = filters.pop('on_loan', None)
+            records = self.members.query_records(collection, sort, descending, filters)
+            if on_loan:
+                borrowers = self.members.borrowers()
+                records = [m for m in records if m.id in borrowers]
+            return records
+        parts = self.fan_out(lambda shard: shard.query_records(collection, sort, descending, filters))
+        if not sort:
+            return [r for part in parts for r in part]
+        return list(heapq.merge(*parts, key=self.shards[self.home].sort_key(sort), reverse=descending))
+
+    def loan_pages(self, sort='issue_date', descending=True, filters=None, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """Like LibraryService.loan_pages: each shard's pages are merged, so a
+        page still costs O(page_size) per branch."""
+        shards = self.shards.values()
+        if filters and filters.get('book_id'):
+            shards = [shard for shard in [self.shard_for(filters['book_id'])] if shard]
+        key = self.shards[self.home].sort_key(sort)
+        streams = [(loan for page, _ in shard.loan_pages(sort, descending, filters, page_size, cursor) for loan in page)
+                   for shard in shards]
+        loans = heapq.merge(*streams, key=key, reverse=descending)
+        while True:
+            page = list(itertools.islice(loans, page_size))
+            if not page:
+                return
+            yield page, key(page[-1])
+
+    def member_history(self, member_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        """A member's loans across branches, newest first."""
+        return self.loan_pages('issue_date', True, {'member_id': member_id}, page_size, cursor)
+
+    def book_history(self, book_id, page_size=HISTORY_PAGE_SIZE, cursor=None):
+        return self.loan_pages('issue_date', True, {'book_id': book_id}, page_size, cursor)
+
+    def get_holds(self, book_id=None, member_id=None):
+        if member_id is not None:
+            parts = self.fan_out(lambda shard: shard.get_holds(member_id=member_id))
+            return list(heapq.merge(*parts, key=lambda h: h.request_time))
+        shard = self.shard_for(book_id)
+        return shard.get_holds(book_id=book_id) if shard else []
+
+    # --- Operations ---
+
+    def route(self, items, book_id_of, method, refused):
+        """Runs a batch operation, each branch's part on its own shard, and
+        returns the results in the batch's order."""
+        results = [refused] * len(items)
+        parts = {}
+        for i, item in enumerate(items):
+            shard = self.shard_for(book_id_of(item))
+            if shard is not None:
+                parts.setdefault(shard, []).append(i)
+        done = self.fan_out(lambda shard: getattr(shard, method)([items[i] for i in parts[shard]]), list(parts))
+        for indexes, part in zip(parts.values(), done):
+            for i, result in zip(indexes, part):
+                results[i] = result
+        return results
+
+    def add_book(self, title, author, isbn):
+        return self.shards[self.home].add_book(title, author, isbn)
+
+    def delete_book(self, book_id):
+        shard = self.shard_for(book_id)
+        return shard.delete_book(book_id) if shard else (False, "Book not found.")
+
+    def add_member(self, name, email, phone):
+        return self.members.add_member(name, email, phone)
+
+    def delete_member(self, member_id):
+        return self.members.delete_member(member_id, self.shards)
+
+    def issue_book(self, book_id, member_id):
+        return self.issue_books([(book_id, member_id)])[0]
+
+    def return_book(self, book_id):
+        return self.return_books([book_id])[0]
+
+    def issue_books(self, pairs):
+        return self.route(pairs, operator.itemgetter(0), 'issue_books', (False, "Book is not available for issue."))
+
+    def return_books(self, book_ids):
+        return self.route(book_ids, lambda book_id: book_id, 'return_books', (False, "Book is not currently issued."))
+
+    def place_hold(self, book_id, member_id, priority=DEFAULT_HOLD_PRIORITY):
+        shard = self.shard_for(book_id)
+        return shard.place_hold(book_id, member_id, priority) if shard else (False, "Book not found.")
+
+    def cancel_hold(self, hold_id):
+        shard = self.shard_for(hold_id)
+        return shard.cancel_hold(hold_id) if shard else (False, "Hold not found.")
+
+    def expire_holds(self, today=None):
+        return sum(self.fan_out(lambda shard: shard.expire_holds(today)))
+
+    def import_records(self, collection, rows, batch_size=IMPORT_BATCH_SIZE):
+        """Members go to the shared members, books to the home branch."""
+        service = self.members if collection == 'members' else self.shards[self.home]
+        return service.import_records(collection, rows, batch_size)
+
+    def export_records(self, collection):
+        if collection == 'members':
+            return self.members.export_records(collection)
+        return itertools.chain.from_iterable(shard.export_records(collection) for shard in self.shards.values())
+
+def branch_dir(code, create=False):
+    """A branch's shard directory. Only `create` (`lms.py add-branch`)
+    makes a new one, so a mistyped code is an error, not an empty branch."""
+    if not re.fullmatch(r'[A-Z0-9]+', code):
+        raise ValueError(f"Branch codes are capital letters and digits: {code!r}")
+    path = os.path.join(BRANCH_DIR, code)
+    if create:
+        os.makedirs(path)
+    elif not os.path.isdir(path):
+        raise ValueError(f"No branch {code} in {BRANCH_DIR}/; create it with `python lms.py add-branch {code}`.")
+    return path
+
+class BranchInUseError(Exception):
+    """Another desk has a branch's shard open."""
+
+def lock_shard(code, path):
+    """Locks SHARD_LOCK_FILE in a shard for this desk; close the returned
+    file to unlock it. The OS drops the lock if the desk dies."""
+    f = open(os.path.join(path, SHARD_LOCK_FILE), 'a+b')
     try:
-        with open(DATA_FILE, 'r') as f:
-            content = f.read()
-            if not content:
-                return {'books': [], 'members': [], 'transactions': []}
-            return json.loads(content)
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise BranchInUseError(f"Branch {code} is open at another desk; close it there, "
+                               f"or leave {code} out of --branches.") from None
+    return f
+
+def list_branches():
+    """The codes of the branches under BRANCH_DIR."""
+    try:
+        names = os.listdir(BRANCH_DIR)
     except FileNotFoundError:
-        return {'books': [], 'members': [], 'transactions': []}
-    except json.JSONDecodeError:
-        messagebox.showerror("Error", "Data file corrupted.")
-        return {'books': [], 'members': [], 'transactions': []}
+        return []
+    return sorted(name for name in names
+                  if re.fullmatch(r'[A-Z0-9]+', name) and os.path.isdir(os.path.join(BRANCH_DIR, name)))
 
-def save_data(data):
-    """Saves books, members, and transactions to the data file."""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+def branch_stats(mode, code):
+    """One branch's stats, read from its shard; run in a worker process by
+    `lms.py stats`."""
+    return LibraryStats.from_data(open_storage(mode, branch_dir(code)).read()).snapshot()
 
-def hash_password(password):
-    """Hashes a password using SHA-256 for simple security."""
-    return hashlib.sha256(password.encode()).hexdigest()
 
-# --- 2. CORE LIBRARY LOGIC (Simplified from your Java Classes) ---
+# --- 3. GUI (Tkinter) APPLICATION ---
 
-class LibraryService:
-    def __init__(self):
-        self.data = load_data()
+class ServiceDispatcher:
+    """Runs LibraryService calls on a worker thread, off the Tk event loop.
 
-    def get_all_books(self):
-        return self.data['books']
+    Calls run one at a time in submission order. Their results, and the
+    change lists the service publishes while running them, are queued and
+    handed back on the Tk thread by a `master.after` poll. Mutations leave
+    the service dirty and schedule a single flush FLUSH_DELAY_MS later, so
+    a burst of operations is written to disk once.
 
-    def get_all_members(self):
-        return self.data['members']
+    The service may also be built by load() on a thread of its own, so the
+    worker is free for logins while a large library is still being read.
 
-    def get_all_transactions(self):
-        return self.data['transactions']
+    The worker changes records in place, so the Tk thread is never handed
+    one: records come back as rows, named tuples of their fields copied on
+    the worker (or on the thread publishing a change list).
+    """
 
-    def find_book(self, book_id):
-        return next((b for b in self.data['books'] if b['id'] == book_id), None)
+    ROW_TYPES = {collection: namedtuple(f'{record_type.__name__}Row', record_type.FIELDS)
+                 for collection, record_type in RECORD_TYPES.items()}
+    FINDERS = {'books': 'find_book', 'members': 'find_member', 'transactions': 'find_transaction', 'holds': 'find_hold'}
 
-    def find_member(self, member_id):
-        return next((m for m in self.data['members'] if m['id'] == member_id), None)
-
-    def generate_id(self, prefix, items):
-        """Generates a unique ID (e.g., B001, M002)"""
-        if not items:
-            return f"{prefix}001"
-        last_id_num = int(items[-1]['id'][1:])
-        new_id_num = last_id_num + 1
-        return f"{prefix}{new_id_num:03d}"
-    
-    # --- Book Operations ---
+    def __init__(self, master, service, on_changes, on_busy):
+        self.master = master
+        self.service = None
+        self.on_changes = on_changes
+        self.on_busy = on_busy
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-worker")
+        self.results = queue.Queue()
+        self.pending = 0
+        self.busy = False
+        self.flush_job = None
+        self.loading = None
+        if service is not None:
+            self.attach(service)
+        self.poll()
 
-    def add_book(self, title, author, isbn):
-        book_id = self.generate_id('B', self.data['books'])
-        new_book = {
-            'id': book_id,
-            'title': title,
-            'author': author,
-            'isbn': isbn,
-            'status': 'Available'
-        }
-        self.data['books'].append(new_book)
-        save_data(self.data)
-        return new_book
+    def attach(self, service):
+        self.service = service
+        service.subscribe(lambda changes: self.results.put((self.on_changes, self.snapshot(changes), None)))
+        return service
 
-    def delete_book(self, book_id):
-        if any(t['book_id'] == book_id and t['status'] == 'Issued' for t in self.data['transactions']):
-            return False, "Book is currently issued and cannot be deleted."
-        
-        self.data['books'] = [b for b in self.data['books'] if b['id'] != book_id]
-        save_data(self.data)
-        return True, "Book deleted successfully."
+    def row(self, collection, record):
+        row_type = self.ROW_TYPES[collection]
+        return row_type._make(record.get(field) for field in row_type._fields)
 
-    # --- Member Operations ---
+    def find_row(self, collection, record_id):
+        record = getattr(self.service, self.FINDERS[collection])(record_id)
+        return None if record is None else self.row(collection, record)
 
-    def add_member(self, name, email, phone):
-        member_id = self.generate_id('M', self.data['members'])
-        new_member = {
-            'id': member_id,
-            'name': name,
-            'email': email,
-            'phone': phone,
-            'join_date': datetime.now().strftime("%Y-%m-%d")
-        }
-        self.data['members'].append(new_member)
-        save_data(self.data)
-        return new_member
+    def snapshot(self, changes):
+        """A published change list as (kind, collection, id, row) entries,
+        with each record's row as of the commit, or None once it is gone."""
+        entries = []
+        for change in changes:
+            kind, collection = change[0], change[1]
+            if collection not in self.ROW_TYPES:
+                continue  # e.g. ID sequences, which no tab shows
+            if kind == 'put':
+                record_id, row = change[2]['id'], self.row(collection, change[2])
+            else:
+                record_id = change[2]
+                row = None if kind == 'del' else self.find_row(collection, record_id)
+            entries.append((kind, collection, record_id, row))
+        return entries
 
-    def delete_member(self, member_id):
-        if any(t['member_id'] == member_id and t['status'] == 'Issued' for t in self.data['transactions']):
-            return False, "Member has outstanding books and cannot be deleted."
+    def load(self, open_service, on_done=None, on_error=None):
+        """Runs open_service() on a loader thread; the service it returns is
+        attached and passed to on_done. Only service calls made after that
+        may use it. If it raises, on_error gets the exception."""
+        loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-loader")
+        self.loading = loader.submit(lambda: self.attach(open_service()))
+        loader.shutdown(wait=False)
+        self.track(self.loading, on_done, on_error)
 
-        self.data['members'] = [m for m in self.data['members'] if m['id'] != member_id]
-        save_data(self.data)
-        return True, "Member deleted successfully."
+    def call(self, fn, *args, on_done=None):
+        """Runs fn(*args) on the worker and passes its result to on_done."""
+        self.track(self.executor.submit(fn, *args), on_done)
 
-    # --- Transaction Operations ---
+    def call_rows(self, collection, fn, *args, on_done=None):
+        """Like call(), for fn returning records: on_done gets their rows."""
+        self.call(lambda: [self.row(collection, record) for record in fn(*args)], on_done=on_done)
 
-    def issue_book(self, book_id, member_id):
-        book = self.find_book(book_id)
-        if not book or book['status'] != 'Available':
-            return False, "Book is not available for issue."
+    def find(self, collection, record_id, on_done):
+        """Looks a record up on the worker; on_done gets its row, or None."""
+        self.call(self.find_row, collection, record_id, on_done=on_done)
 
-        member = self.find_member(member_id)
-        if not member:
-            return False, "Member not found."
+    def next_page(self, pages, on_done):
+        """Reads the next page of a loan_pages() generator on the worker;
+        on_done gets its loans' rows, [] past the last page."""
+        def read():
+            page = next(pages, None)
+            return [self.row('transactions', loan) for loan in page[0]] if page else []
 
-        # Update book status
-        book['status'] = 'Issued'
+        self.call(read, on_done=on_done)
 
-        # Create transaction
-        issue_date = datetime.now()
-        due_date = issue_date + timedelta(days=DEFAULT_LOAN_DAYS)
-        
-        transaction_id = self.generate_id('T', self.data['transactions'])
-        new_transaction = {
-            'id': transaction_id,
-            'book_id': book_id,
-            'member_id': member_id,
-            'issue_date': issue_date.strftime("%Y-%m-%d"),
-            'due_date': due_date.strftime("%Y-%m-%d"),
-            'return_date': None,
-            'status': 'Issued'
-        }
-        self.data['transactions'].append(new_transaction)
-        save_data(self.data)
-        return True, f"Book issued successfully. Due: {due_date.strftime('%Y-%m-%d')}"
+    def track(self, future, on_done, on_error=None):
+        self.pending += 1
+        self.set_busy(True)
+        future.add_done_callback(lambda f: self.results.put((on_done, on_error, f)))
 
-    def return_book(self, book_id):
-        book = self.find_book(book_id)
-        if not book or book['status'] != 'Issued':
-            return False, "Book is not currently issued."
+    def mutate(self, fn, *args, on_done=None):
+        """Like call(), for operations that change data and need saving."""
+        self.call(fn, *args, on_done=on_done)
+        if self.flush_job is None:
+            self.flush_job = self.master.after(FLUSH_DELAY_MS, self.flush)
 
-        active_transaction = next((t for t in self.data['transactions'] if t['book_id'] == book_id and t['status'] == 'Issued'), None)
-        if not active_transaction:
-            return False, "Active transaction record not found."
+    def flush(self):
+        self.flush_job = None
+        self.call(self.service.flush)
 
-        # Update book status
-        book['status'] = 'Available'
+    def set_busy(self, busy):
+        if busy != self.busy:
+            self.busy = busy
+            self.on_busy(busy)
 
-        # Update transaction status
-        active_transaction['return_date'] = datetime.now().strftime("%Y-%m-%d")
-        active_transaction['status'] = 'Returned'
+    def poll(self):
+        self.master.after(DISPATCH_POLL_MS, self.poll)
+        while True:
+            try:
+                # (on_changes, entries, None) or (on_done, on_error, future)
+                callback, extra, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if future is None:
+                callback(extra)
+                continue
 
-        save_data(self.data)
-        return True, "Book returned successfully."
+            self.pending -= 1
+            if future.exception() and extra:
+                extra(future.exception())
+            elif future.exception():
+                messagebox.showerror("Error", str(future.exception()))
+            elif callback:
+                callback(future.result())
+        self.set_busy(self.pending > 0)
 
+    def close(self):
+        """Writes out anything unsaved and stops the worker. Returns the
+        exception that kept the library from being saved and closed, if any."""
+        if self.flush_job:
+            self.master.after_cancel(self.flush_job)
+            self.flush_job = None
+        if self.loading is not None:
+            # Waits for a library still loading, so it is closed too.
+            self.loading.exception()
+        error = None
+        if self.service is not None:
+            error = self.executor.submit(self.service.close).exception()
+        self.executor.shutdown(wait=True)
+        return error
 
-# --- 3. GUI (Tkinter) APPLICATION ---
+class RecordTree:
+    """Keeps a Treeview in step with a list of record IDs. `lookup` gives an
+    ID's row (see ServiceDispatcher), or None once the record is gone, and
+    `render` the values shown for a row.
+
+    Up to VIRTUAL_ROW_THRESHOLD records every row is materialized, keyed by
+    record id, and only the rows whose records changed are touched. Past
+    that, only the visible window plus VIRTUAL_BUFFER_ROWS rows exist in the
+    widget and scrolling refills them from the record list.
+    """
+
+    def __init__(self, tree, scrollbar, records, lookup, render, insert_at='end'):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.records = records
+        self.lookup = lookup
+        self.render = render
+        self.insert_at = insert_at
+        self.virtual = None
+        self.offset = 0
+        self.pending = set()
+
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            tree.bind(sequence, self.on_wheel)
+        tree.bind('<Configure>', self.on_resize)
+
+    def note(self, record_id):
+        """Marks a record as added, changed or removed since the last refresh."""
+        self.pending.add(record_id)
+
+    @METRICS.timed('ui')
+    def refresh(self):
+        records = self.records()
+        virtual = len(records) > VIRTUAL_ROW_THRESHOLD
+        if virtual != self.virtual:
+            self.virtual = virtual
+            self.rebuild()
+        elif virtual:
+            self.render_window()
+        else:
+            self.apply_pending()
+        self.pending.clear()
+
+    def rebuild(self):
+        self.tree.delete(*self.tree.get_children())
+        if self.virtual:
+            self.offset = 0
+            self.scrollbar.configure(command=self.on_scroll)
+            self.tree.configure(yscrollcommand='')
+            self.render_window()
+        else:
+            self.scrollbar.configure(command=self.tree.yview)
+            self.tree.configure(yscrollcommand=self.scrollbar.set)
+            for record_id in self.records():
+                row = self.lookup(record_id)
+                if row is not None:
+                    self.tree.insert('', 'end', iid=record_id, values=self.render(row))
+
+    @METRICS.timed('ui')
+    def reload(self):
+        """Rebuilds every row, e.g. after the record list was swapped out."""
+        self.virtual = None
+        self.refresh()
+
+    def apply_pending(self):
+        for record_id in self.pending:
+            row = self.lookup(record_id)
+            if row is None:
+                if self.tree.exists(record_id):
+                    self.tree.delete(record_id)
+            elif self.tree.exists(record_id):
+                self.tree.item(record_id, values=self.render(row))
+            else:
+                self.tree.insert('', self.insert_at, iid=record_id, values=self.render(row))
+
+    # --- Virtual mode ---
+
+    def visible_rows(self):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        return max(1, self.tree.winfo_height() // row_height)
+
+    @METRICS.timed('ui')
+    def render_window(self):
+        records = self.records()
+        visible = self.visible_rows()
+        self.offset = max(0, min(self.offset, len(records) - visible))
+        # A query result may still list records deleted since; they are skipped.
+        window = [row for row in map(self.lookup, records[self.offset:self.offset + visible + VIRTUAL_BUFFER_ROWS])
+                  if row is not None]
+
+        rows = self.tree.get_children()
+        for i, row in enumerate(window):
+            if i < len(rows):
+                self.tree.item(rows[i], values=self.render(row))
+            else:
+                self.tree.insert('', 'end', values=self.render(row))
+        if len(rows) > len(window):
+            self.tree.delete(*rows[len(window):])
+
+        if records:
+            self.scrollbar.set(self.offset / len(records), min(1.0, (self.offset + visible) / len(records)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def on_scroll(self, action, value, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(value) * len(self.records()))
+        elif unit == 'pages':
+            self.offset += int(value) * self.visible_rows()
+        else:
+            self.offset += int(value)
+        self.render_window()
+
+    def on_resize(self, event):
+        if self.virtual:
+            self.render_window()
+
+    def on_wheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 5 or event.delta < 0:
+            self.on_scroll('scroll', 3, 'units')
+        else:
+            self.on_scroll('scroll', -3, 'units')
+        return 'break'
 
 class LibraryApp:
-    def __init__(self, master):
+    def __init__(self, master, service=None, open_service=None):
+        """Pass a ready `service`, or `open_service`, a function that builds
+        one; it runs in the background while the login screen is up."""
         self.master = master
         master.title("Library Management System")
         master.geometry("800x600")
         
-        self.service = LibraryService()
+        self.service = None
+        self.dispatcher = ServiceDispatcher(master, None, self.on_service_changes, self.show_busy)
+        self.users = UserStore()
+        self.analytics = None
+        self.record_views = {}
+        # The rows the tabs show, by ID (see ServiceDispatcher), and the IDs
+        # of every record of a collection once its tab has fetched them.
+        self.rows = {collection: {} for collection in RECORD_TYPES}
+        self.all_ids = {}
+        self.views = {}
+        self.view_jobs = {}
+        self.stats_labels = {}
+        self.tab_builders = {}
         self.current_user = None
+        master.protocol("WM_DELETE_WINDOW", self.handle_close)
+
+        # Status bar with a busy indicator for work running in the background
+        status_bar = ttk.Frame(master, padding=(10, 2))
+        status_bar.pack(side='bottom', fill='x')
+        self.busy_bar = ttk.Progressbar(status_bar, mode='indeterminate', length=80)
+        self.busy_bar.pack(side='right')
+        self.busy_label = ttk.Label(status_bar, text="")
+        self.busy_label.pack(side='right', padx=5)
+        self.status_label = ttk.Label(status_bar, text="")
+        self.status_label.pack(side='left')
+        self.retry_button = ttk.Button(status_bar, text="Retry", command=self.load_service)
 
         # Create main frames
         self.auth_frame = ttk.Frame(master, padding="10")
         self.dashboard_frame = ttk.Frame(master, padding="10")
 
         self.show_auth_screen()
+        master.after_idle(self.mark_ready, 'login_screen', STARTED_NS)
+        if service is not None:
+            open_service = lambda: service
+        self.open_service = open_service or (lambda: LibraryService(deferred=True))
+        self.load_error = None
+        self.load_service()
+
+    def load_service(self):
+        """Opens the library in the background; run again by the Retry
+        button after a failed load."""
+        self.load_error = None
+        self.status_label.config(text="")
+        self.retry_button.pack_forget()
+        self.dispatcher.load(self.open_service, on_done=self.on_service_loaded, on_error=self.on_service_failed)
+        if self.current_user:
+            self.show_dashboard()
+
+    def on_service_failed(self, error):
+        self.load_error = error
+        self.status_label.config(text=f"The library could not be loaded: {error}")
+        self.retry_button.pack(side='left', padx=5)
+        if self.current_user:
+            self.show_dashboard()
+
+    def on_service_loaded(self, service):
+        self.service = service
+        if isinstance(service, RemoteLibraryService):
+            self.master.after(REMOTE_SYNC_MS, self.sync_remote)
+        else:
+            self.sweep_holds()
+        if self.current_user:
+            # Logged in while the library was loading.
+            self.show_dashboard()
+
+    def mark_ready(self, step, started_ns):
+        """Records how long a startup step took to reach an idle event loop."""
+        elapsed_ns = time.perf_counter_ns() - started_ns
+        if METRICS.enabled:
+            METRICS.record('startup', step, elapsed_ns)
+        if elapsed_ns > STARTUP_BUDGET_MS * 1000000:
+            print(f"Startup: {step} took {elapsed_ns // 1000000} ms (budget {STARTUP_BUDGET_MS} ms)", file=sys.stderr)
+
+    def sync_remote(self):
+        """Pulls in changes made at other desks sharing the server."""
+        def done(result):
+            if self.current_user and self.record_views:
+                self.update_all_related_lists()
+                self.update_members_list()
+            self.master.after(REMOTE_SYNC_MS, self.sync_remote)
+
+        self.dispatcher.call(self.service.sync, on_done=done)
+
+    def sweep_holds(self):
+        """Expires overdue holds on the worker thread, then again after HOLD_SWEEP_MS."""
+        def done(expired):
+            if expired and self.current_user and self.record_views:
+                self.update_all_related_lists()
+            self.master.after(HOLD_SWEEP_MS, self.sweep_holds)
+
+        self.dispatcher.mutate(self.service.expire_holds, on_done=done)
+
+    def show_busy(self, busy):
+        if busy:
+            self.busy_label.config(text="Working...")
+            self.busy_bar.start(10)
+        else:
+            self.busy_label.config(text="")
+            self.busy_bar.stop()
+
+    def handle_close(self):
+        error = self.dispatcher.close()
+        if error is not None:
+            messagebox.showerror("Error", f"The library could not be saved: {error}")
+        self.master.destroy()
 
     # --- 3.1 AUTHENTICATION SCREENS ---
 
@@ -214,20 +3352,18 @@ class LibraryApp:
     def handle_login(self, dialog):
         username = self.login_user.get()
         password = self.login_pass.get()
-        hashed_password = hash_password(password)
 
-        try:
-            with open(USERS_FILE, 'r') as f:
-                users = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            users = {}
-
-        if username in users and users[username] == hashed_password:
-            self.current_user = username
-            dialog.destroy()
-            self.show_dashboard()
-        else:
-            messagebox.showerror("Error", "Invalid username or password.")
+        def done(result):
+            success, message = result
+            if success:
+                self.current_user = username
+                dialog.destroy()
+                self.show_dashboard()
+            else:
+                messagebox.showerror("Error", message)
+
+        # Password hashing is deliberately slow; keep it on the worker.
+        self.dispatcher.call(self.users.verify, username, password, on_done=done)
             
     def show_signup_dialog(self):
         dialog = tk.Toplevel(self.master)
@@ -248,61 +3384,245 @@ class LibraryApp:
     def handle_signup(self, dialog):
         username = self.signup_user.get()
         password = self.signup_pass.get()
-        hashed_password = hash_password(password)
 
         if not username or not password:
             messagebox.showerror("Error", "Username and password cannot be empty.")
             return
 
-        try:
-            with open(USERS_FILE, 'r') as f:
-                content = f.read()
-                users = json.loads(content) if content else {}
-        except (FileNotFoundError, json.JSONDecodeError):
-            users = {}
-
-        if username in users:
-            messagebox.showerror("Error", "Username already exists.")
-            return
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                dialog.destroy()
+            else:
+                messagebox.showerror("Error", message)
 
-        users[username] = hashed_password
-        with open(USERS_FILE, 'w') as f:
-            json.dump(users, f, indent=4)
-        
-        messagebox.showinfo("Success", "Account created successfully! You can now log in.")
-        dialog.destroy()
+        self.dispatcher.call(self.users.register, username, password, on_done=done)
 
 
     # --- 3.2 DASHBOARD & NAVIGATION ---
 
     def show_dashboard(self):
+        started_ns = time.perf_counter_ns()
         self.auth_frame.pack_forget()
         self.dashboard_frame.pack(fill='both', expand=True)
 
+        # Clear the previous session's tabs
+        for job in self.view_jobs.values():
+            if job:
+                self.master.after_cancel(job)
+        for widget in self.dashboard_frame.winfo_children():
+            widget.destroy()
+        self.record_views, self.views, self.view_jobs, self.stats_labels = {}, {}, {}, {}
+        self.all_ids = {}
+
         # Main Title and Logout
         ttk.Label(self.dashboard_frame, text=f"Welcome, {self.current_user}", font=("Arial", 16)).grid(row=0, column=0, columnspan=2, pady=10)
         ttk.Button(self.dashboard_frame, text="Logout", command=self.handle_logout).grid(row=0, column=2, sticky='e')
 
+        if self.service is None:
+            text = "Loading library..." if self.load_error is None else "The library could not be loaded; see the status bar."
+            ttk.Label(self.dashboard_frame, text=text).grid(row=1, column=0, columnspan=3, pady=20)
+            return
+
         # Notebook (Tabbed Interface)
         self.notebook = ttk.Notebook(self.dashboard_frame)
         self.notebook.grid(row=1, column=0, columnspan=3, sticky='nsew', padx=10, pady=10)
         self.dashboard_frame.grid_columnconfigure(0, weight=1)
         self.dashboard_frame.grid_rowconfigure(1, weight=1)
 
-        # Create tabs
+        # Create tabs; each is filled in the first time it is selected
+        self.tab_builders = {}
         self.create_tab("Books", self.setup_books_tab)
         self.create_tab("Members", self.setup_members_tab)
         self.create_tab("Transactions", self.setup_transactions_tab)
+        self.create_tab("Holds", self.setup_holds_tab)
+        self.create_tab("Reports", self.setup_reports_tab)
         self.create_tab("Stats", self.setup_stats_tab)
+        self.notebook.bind('<<NotebookTabChanged>>', self.build_selected_tab)
+        self.build_selected_tab()
+        self.master.after_idle(self.mark_ready, 'dashboard', started_ns)
 
     def handle_logout(self):
         self.current_user = None
         self.show_auth_screen()
 
+    @METRICS.timed('ui')
+    def on_service_changes(self, changes):
+        """Takes in the rows touched by a service operation and queues them
+        for the next refresh."""
+        new_loans, gone = [], {}
+        for kind, collection, record_id, row in changes:
+            table = self.rows[collection]
+            if row is None:
+                table.pop(record_id, None)
+                gone.setdefault(collection, set()).add(record_id)
+            else:
+                if kind == 'put' and record_id not in table:
+                    if collection == 'transactions':
+                        new_loans.append(record_id)
+                    elif collection in self.all_ids:
+                        self.all_ids[collection].append(record_id)
+                table[record_id] = row
+            view = self.record_views.get(collection)
+            if view:
+                view.note(record_id)
+        for collection, record_ids in gone.items():
+            if collection in self.all_ids:
+                self.all_ids[collection][:] = [i for i in self.all_ids[collection] if i not in record_ids]
+
+        loans = self.views.get('transactions')
+        if loans and loans['records'] is not None and self.is_default_view('transactions'):
+            # Newest first: new loans go on top without re-sorting.
+            loans['records'][:0] = reversed(new_loans)
+        # Sorted or filtered views are re-queried once the batch is in. Loans
+        # decide the "With books out" filter, so they touch members too.
+        touched = {change[1] for change in changes}
+        if 'transactions' in touched:
+            touched.add('members')
+        for collection in touched & set(self.views):
+            if not self.is_default_view(collection) and not self.view_jobs.get(collection):
+                self.schedule_view_refresh(collection, delay=0)
+
     def create_tab(self, name, setup_function):
         tab = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(tab, text=name)
-        setup_function(tab)
+        self.tab_builders[str(tab)] = setup_function
+
+    @METRICS.timed('ui')
+    def build_selected_tab(self, event=None):
+        tab = self.notebook.select()
+        setup_function = self.tab_builders.pop(tab, None)
+        if setup_function:
+            setup_function(self.notebook.nametowidget(tab))
+
+    # --- Sorted and Filtered Views ---
+
+    # Treeview column -> record field, per collection.
+    VIEW_COLUMNS = {
+        'books': {'ID': 'id', 'Title': 'title', 'Author': 'author', 'ISBN': 'isbn', 'Status': 'status'},
+        'members': {'ID': 'id', 'Name': 'name', 'Email': 'email', 'Phone': 'phone', 'Join Date': 'join_date'},
+        'transactions': {'ID': 'id', 'Book ID': 'book_id', 'Member ID': 'member_id', 'Issue Date': 'issue_date',
+                         'Due Date': 'due_date', 'Return Date': 'return_date', 'Status': 'status'},
+    }
+    DEFAULT_SORT = {'books': (None, False), 'members': (None, False), 'transactions': ('issue_date', True)}
+
+    def setup_view(self, collection, tree, filters):
+        """Makes a tab's column headings sort its records and `filters`
+        ({name: tk variable}) filter them. Sorting and filtering run in the
+        service, off the Tk thread."""
+        sort, descending = self.DEFAULT_SORT[collection]
+        self.views[collection] = {'tree': tree, 'sort': sort, 'descending': descending,
+                                  'filters': filters, 'records': None, 'pages': None, 'shown_pages': None}
+        for column in self.VIEW_COLUMNS[collection]:
+            tree.heading(column, command=lambda c=column: self.sort_view(collection, c))
+        for variable in filters.values():
+            variable.trace_add('write', lambda *args: self.schedule_view_refresh(collection))
+        self.show_sort_arrows(collection)
+
+    def view_filters(self, collection):
+        filters = {}
+        for name, variable in self.views[collection]['filters'].items():
+            value = variable.get()
+            filters[name] = value.strip().upper() if name == 'member_id' else value
+        return filters
+
+    def is_default_view(self, collection):
+        spec = self.views[collection]
+        return ((spec['sort'], spec['descending']) == self.DEFAULT_SORT[collection]
+                and not any(self.view_filters(collection).values()))
+
+    def view_records(self, collection):
+        """The IDs of the rows a tab shows: every record when it is unsorted
+        and unfiltered, otherwise the last query result."""
+        records = self.views[collection]['records']
+        if records is None:
+            return self.all_ids.get(collection) or []
+        return records
+
+    def keep_rows(self, collection, rows):
+        """Stores rows fetched on the worker; returns their IDs in order."""
+        table = self.rows[collection]
+        for row in rows:
+            table[row.id] = row
+        return [row.id for row in rows]
+
+    def load_all_records(self, collection, fetch):
+        """Fetches every record of a collection with `fetch` on the worker.
+        From then on, change lists keep all_ids in step."""
+        def done(rows):
+            self.all_ids[collection] = self.keep_rows(collection, rows)
+            if collection in self.record_views:
+                self.record_views[collection].reload()
+
+        self.dispatcher.call_rows(collection, fetch, on_done=done)
+
+    def sort_view(self, collection, column):
+        """Heading click: sort by that column, or flip the order if it already is."""
+        spec = self.views[collection]
+        field = self.VIEW_COLUMNS[collection][column]
+        if spec['sort'] == field:
+            spec['descending'] = not spec['descending']
+        else:
+            spec['sort'], spec['descending'] = field, False
+        self.show_sort_arrows(collection)
+        self.schedule_view_refresh(collection, delay=0)
+
+    def show_sort_arrows(self, collection):
+        spec = self.views[collection]
+        for column, field in self.VIEW_COLUMNS[collection].items():
+            arrow = (' \u25bc' if spec['descending'] else ' \u25b2') if field == spec['sort'] else ''
+            spec['tree'].heading(column, text=column + arrow)
+
+    def schedule_view_refresh(self, collection, delay=300):
+        """Re-queries a view, waiting `delay` ms so typing in a filter box
+        runs one query instead of one per keystroke."""
+        if self.view_jobs.get(collection):
+            self.master.after_cancel(self.view_jobs[collection])
+        self.view_jobs[collection] = self.master.after(delay, lambda: self.refresh_view(collection))
+
+    def refresh_view(self, collection):
+        self.view_jobs[collection] = None
+        spec = self.views[collection]
+        if collection == 'transactions':
+            # The history is read a page at a time, starting over here. Making
+            # the generator reads nothing; each page is read on the worker.
+            spec['pages'] = self.service.loan_pages(spec['sort'], spec['descending'],
+                                                    self.view_filters(collection), LOAN_PAGE_ROWS)
+            self.load_loan_page()
+            return
+        if self.is_default_view(collection):
+            self.show_view(collection, None)
+            return
+        self.dispatcher.call_rows(
+            collection, self.service.query_records, collection, spec['sort'], spec['descending'], self.view_filters(collection),
+            on_done=lambda rows: self.show_view(collection, self.keep_rows(collection, rows))
+        )
+
+    @METRICS.timed('ui')
+    def show_view(self, collection, records):
+        if collection not in self.views:
+            return  # logged out since the query was sent
+        self.views[collection]['records'] = records
+        self.record_views[collection].reload()
+
+    def load_loan_page(self):
+        """Reads the Transactions tab's next page of loans on the worker."""
+        pages = self.views['transactions']['pages']
+        self.loans_more.config(state='disabled')
+        self.dispatcher.next_page(pages, on_done=lambda loans: self.show_loan_page(pages, loans))
+
+    @METRICS.timed('ui')
+    def show_loan_page(self, pages, loans):
+        spec = self.views.get('transactions')
+        if spec is None or spec['pages'] is not pages:
+            return  # logged out or re-queried since the page was asked for
+        if spec['records'] is None or pages is not spec['shown_pages']:
+            spec['records'], spec['shown_pages'] = [], pages
+        spec['records'].extend(self.keep_rows('transactions', loans))
+        self.loans_more.config(state='normal' if len(loans) == LOAN_PAGE_ROWS else 'disabled')
+        self.loans_shown.config(text=f"{len(spec['records'])} loans shown")
+        self.record_views['transactions'].reload()
 
     # --- 3.3 TAB SETUP FUNCTIONS ---
 
@@ -315,10 +3635,23 @@ class LibraryApp:
         controls.grid(row=0, column=0, sticky='ew', pady=10)
         ttk.Button(controls, text="Add Book", command=self.open_add_book_dialog).pack(side='left', padx=5)
         ttk.Button(controls, text="Delete Selected", command=self.delete_selected_book).pack(side='left', padx=5)
+        ttk.Label(controls, text="Status:").pack(side='left', padx=(15, 0))
+        book_status = tk.StringVar()
+        ttk.Combobox(controls, textvariable=book_status, values=('', 'Available', 'Issued', 'On Hold'),
+                     state='readonly', width=10).pack(side='left', padx=5)
+
+        self.book_search_var = tk.StringVar()
+        self.book_search_results = None
+        self.book_search_job = None
+        ttk.Entry(controls, textvariable=self.book_search_var, width=30).pack(side='right', padx=5)
+        ttk.Label(controls, text="Search:").pack(side='right')
+        self.book_search_var.trace_add('write', lambda *args: self.schedule_book_search())
 
         # Treeview for Books
         self.books_tree = ttk.Treeview(tab, columns=('ID', 'Title', 'Author', 'ISBN', 'Status'), show='headings')
         self.books_tree.grid(row=1, column=0, sticky='nsew')
+        scrollbar = ttk.Scrollbar(tab, orient='vertical')
+        scrollbar.grid(row=1, column=1, sticky='ns')
 
         for col in ('ID', 'Title', 'Author', 'ISBN', 'Status'):
             self.books_tree.heading(col, text=col, anchor=tk.W)
@@ -327,16 +3660,45 @@ class LibraryApp:
         self.books_tree.column('ID', width=50)
         self.books_tree.column('Title', width=200)
 
-        self.update_books_list()
+        self.record_views['books'] = RecordTree(
+            self.books_tree, scrollbar, self.visible_books, self.rows['books'].get,
+            lambda book: (book.id, book.title, book.author, book.isbn, book.status)
+        )
+        self.setup_view('books', self.books_tree, {'status': book_status})
+        self.books_tree.bind('<Double-1>', lambda event: self.open_history_dialog('books', self.books_tree, event))
+        self.load_all_records('books', self.service.get_all_books)
+
+    def visible_books(self):
+        if self.book_search_results is not None:
+            return self.book_search_results
+        return self.view_records('books')
 
     def update_books_list(self):
-        for i in self.books_tree.get_children():
-            self.books_tree.delete(i)
-        
-        for book in self.service.get_all_books():
-            self.books_tree.insert('', 'end', values=(
-                book['id'], book['title'], book['author'], book['isbn'], book['status']
-            ))
+        if 'books' not in self.record_views:
+            return  # tab not built yet
+        if self.book_search_results is not None:
+            self.run_book_search()
+        else:
+            self.record_views['books'].refresh()
+
+    def schedule_book_search(self):
+        """Filters the Books tab shortly after the user stops typing."""
+        if self.book_search_job:
+            self.master.after_cancel(self.book_search_job)
+        self.book_search_job = self.master.after(150, self.run_book_search)
+
+    def run_book_search(self):
+        self.book_search_job = None
+        query = self.book_search_var.get().strip()
+        if not query:
+            self.show_book_search(None)
+        else:
+            self.dispatcher.call_rows('books', self.service.search_books, query, on_done=self.show_book_search)
+
+    @METRICS.timed('ui')
+    def show_book_search(self, rows):
+        self.book_search_results = None if rows is None else self.keep_rows('books', rows)
+        self.record_views['books'].reload()
 
     def open_add_book_dialog(self):
         dialog = tk.Toplevel(self.master)
@@ -357,10 +3719,13 @@ class LibraryApp:
             isbn = entries["ISBN:"].get()
 
             if title and author and isbn:
-                self.service.add_book(title, author, isbn)
-                self.update_books_list()
-                messagebox.showinfo("Success", "Book added successfully.")
-                dialog.destroy()
+                def done(book):
+                    self.update_books_list()
+                    self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1]))
+                    messagebox.showinfo("Success", "Book added successfully.")
+                    dialog.destroy()
+
+                self.dispatcher.mutate(self.service.add_book, title, author, isbn, on_done=done)
             else:
                 messagebox.showerror("Error", "All fields are required.")
         
@@ -373,15 +3738,17 @@ class LibraryApp:
             return
 
         book_id = self.books_tree.item(selected_item, 'values')[0]
-        
-        success, message = self.service.delete_book(book_id)
 
-        if success:
-            messagebox.showinfo("Success", message)
-            self.update_books_list()
-            self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1])) # Update stats
-        else:
-            messagebox.showerror("Error", message)
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                self.update_books_list()
+                self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1])) # Update stats
+            else:
+                messagebox.showerror("Error", message)
+
+        self.dispatcher.mutate(self.service.delete_book, book_id, on_done=done)
 
     def setup_members_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
@@ -392,10 +3759,14 @@ class LibraryApp:
         controls.grid(row=0, column=0, sticky='ew', pady=10)
         ttk.Button(controls, text="Add Member", command=self.open_add_member_dialog).pack(side='left', padx=5)
         ttk.Button(controls, text="Delete Selected", command=self.delete_selected_member).pack(side='left', padx=5)
+        members_on_loan = tk.BooleanVar()
+        ttk.Checkbutton(controls, text="With books out", variable=members_on_loan).pack(side='left', padx=15)
 
         # Treeview for Members
         self.members_tree = ttk.Treeview(tab, columns=('ID', 'Name', 'Email', 'Phone', 'Join Date'), show='headings')
         self.members_tree.grid(row=1, column=0, sticky='nsew')
+        scrollbar = ttk.Scrollbar(tab, orient='vertical')
+        scrollbar.grid(row=1, column=1, sticky='ns')
 
         for col in ('ID', 'Name', 'Email', 'Phone', 'Join Date'):
             self.members_tree.heading(col, text=col, anchor=tk.W)
@@ -405,16 +3776,17 @@ class LibraryApp:
         self.members_tree.column('Name', width=150)
         self.members_tree.column('Email', width=180)
 
-        self.update_members_list()
+        self.record_views['members'] = RecordTree(
+            self.members_tree, scrollbar, lambda: self.view_records('members'), self.rows['members'].get,
+            lambda member: (member.id, member.name, member.email, member.phone, member.join_date)
+        )
+        self.setup_view('members', self.members_tree, {'on_loan': members_on_loan})
+        self.members_tree.bind('<Double-1>', lambda event: self.open_history_dialog('members', self.members_tree, event))
+        self.load_all_records('members', self.service.get_all_members)
 
     def update_members_list(self):
-        for i in self.members_tree.get_children():
-            self.members_tree.delete(i)
-        
-        for member in self.service.get_all_members():
-            self.members_tree.insert('', 'end', values=(
-                member['id'], member['name'], member['email'], member['phone'], member['join_date']
-            ))
+        if 'members' in self.record_views:
+            self.record_views['members'].refresh()
 
     def open_add_member_dialog(self):
         dialog = tk.Toplevel(self.master)
@@ -435,10 +3807,13 @@ class LibraryApp:
             phone = entries["Phone:"].get()
 
             if name and email and phone:
-                self.service.add_member(name, email, phone)
-                self.update_members_list()
-                messagebox.showinfo("Success", "Member added successfully.")
-                dialog.destroy()
+                def done(member):
+                    self.update_members_list()
+                    self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1]))
+                    messagebox.showinfo("Success", "Member added successfully.")
+                    dialog.destroy()
+
+                self.dispatcher.mutate(self.service.add_member, name, email, phone, on_done=done)
             else:
                 messagebox.showerror("Error", "All fields are required.")
         
@@ -451,19 +3826,21 @@ class LibraryApp:
             return
 
         member_id = self.members_tree.item(selected_item, 'values')[0]
-        
-        success, message = self.service.delete_member(member_id)
 
-        if success:
-            messagebox.showinfo("Success", message)
-            self.update_members_list()
-            self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1]))
-        else:
-            messagebox.showerror("Error", message)
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                self.update_members_list()
+                self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1]))
+            else:
+                messagebox.showerror("Error", message)
+
+        self.dispatcher.mutate(self.service.delete_member, member_id, on_done=done)
 
     def setup_transactions_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
-        tab.grid_rowconfigure(1, weight=1)
+        tab.grid_rowconfigure(3, weight=1)
 
         # Frame for controls and forms (Row 0)
         controls_frame = ttk.Frame(tab)
@@ -492,61 +3869,396 @@ class LibraryApp:
         self.return_book_entry.grid(row=0, column=1, padx=5, pady=2)
 
         ttk.Button(return_frame, text="Return", command=self.handle_return).grid(row=1, column=1, padx=5, pady=5, sticky='e')
-        
-        # --- Transaction History Treeview (Row 1) ---
+
+        # --- Scan Queue Section (Row 1) ---
+        # A barcode scanner types the ID followed by Enter; each scan is
+        # queued and the whole stack is issued or returned in one batch.
+        scan_frame = ttk.LabelFrame(tab, text="Scan Queue", padding="10")
+        scan_frame.grid(row=1, column=0, columnspan=2, sticky='ew', padx=10, pady=5)
+        scan_frame.grid_columnconfigure(4, weight=1)
+
+        self.scan_mode = tk.StringVar(value='return')
+        ttk.Radiobutton(scan_frame, text="Return", variable=self.scan_mode, value='return').grid(row=0, column=0, padx=5)
+        ttk.Radiobutton(scan_frame, text="Issue to Member:", variable=self.scan_mode, value='issue').grid(row=0, column=1, padx=5)
+        self.scan_member_entry = ttk.Entry(scan_frame, width=10)
+        self.scan_member_entry.grid(row=0, column=2, padx=5)
+        ttk.Label(scan_frame, text="Scan Book ID:").grid(row=0, column=3, padx=5)
+        self.scan_entry = ttk.Entry(scan_frame)
+        self.scan_entry.grid(row=0, column=4, padx=5, sticky='ew')
+        self.scan_entry.bind('<Return>', self.queue_scan)
+        self.scan_entry.bind('<KP_Enter>', self.queue_scan)
+
+        self.scan_queue = []
+        self.scan_notes = {}
+        self.scan_listbox = tk.Listbox(scan_frame, height=4)
+        self.scan_listbox.grid(row=1, column=0, columnspan=5, sticky='ew', padx=5, pady=5)
+        scan_buttons = ttk.Frame(scan_frame)
+        scan_buttons.grid(row=1, column=5, sticky='n')
+        ttk.Button(scan_buttons, text="Submit", command=self.submit_scan_queue).pack(fill='x', pady=1)
+        ttk.Button(scan_buttons, text="Remove", command=self.remove_scanned).pack(fill='x', pady=1)
+        ttk.Button(scan_buttons, text="Clear", command=self.clear_scan_queue).pack(fill='x', pady=1)
+        self.scan_status = ttk.Label(scan_frame, text="")
+        self.scan_status.grid(row=2, column=0, columnspan=6, sticky='w', padx=5)
+
+        # --- History Filters (Row 2) ---
+        filter_frame = ttk.Frame(tab)
+        filter_frame.grid(row=2, column=0, columnspan=2, sticky='ew', padx=10, pady=(5, 0))
+        loan_status = tk.StringVar()
+        loan_member = tk.StringVar()
+        loans_overdue = tk.BooleanVar()
+        ttk.Label(filter_frame, text="Status:").pack(side='left')
+        ttk.Combobox(filter_frame, textvariable=loan_status, values=('', 'Issued', 'Returned'),
+                     state='readonly', width=10).pack(side='left', padx=5)
+        ttk.Label(filter_frame, text="Member ID:").pack(side='left', padx=(10, 0))
+        ttk.Entry(filter_frame, textvariable=loan_member, width=10).pack(side='left', padx=5)
+        ttk.Checkbutton(filter_frame, text="Overdue only", variable=loans_overdue).pack(side='left', padx=10)
+        self.loans_more = ttk.Button(filter_frame, text="Load More", state='disabled', command=self.load_loan_page)
+        self.loans_more.pack(side='right')
+        self.loans_shown = ttk.Label(filter_frame, text="")
+        self.loans_shown.pack(side='right', padx=10)
+
+        # --- Transaction History Treeview (Row 3) ---
         self.transactions_tree = ttk.Treeview(tab, columns=('ID', 'Book ID', 'Member ID', 'Issue Date', 'Due Date', 'Return Date', 'Status'), show='headings')
-        self.transactions_tree.grid(row=1, column=0, sticky='nsew')
+        self.transactions_tree.grid(row=3, column=0, sticky='nsew')
+        scrollbar = ttk.Scrollbar(tab, orient='vertical')
+        scrollbar.grid(row=3, column=1, sticky='ns')
         
         for col in ('ID', 'Book ID', 'Member ID', 'Issue Date', 'Due Date', 'Return Date', 'Status'):
             self.transactions_tree.heading(col, text=col, anchor=tk.W)
             self.transactions_tree.column(col, width=100)
 
         self.transactions_tree.column('Status', width=80)
-        self.update_transactions_list()
+
+        # Newest first by default; new loans are prepended by on_service_changes.
+        # Only the pages read so far are held, LOAN_PAGE_ROWS loans each.
+        self.record_views['transactions'] = RecordTree(
+            self.transactions_tree, scrollbar, lambda: self.views['transactions']['records'] or [], self.rows['transactions'].get,
+            self.loan_values, insert_at=0
+        )
+        self.setup_view('transactions', self.transactions_tree,
+                        {'status': loan_status, 'member_id': loan_member, 'overdue': loans_overdue})
+        self.refresh_view('transactions')
+
+    @staticmethod
+    def loan_values(t):
+        return (t.id, t.book_id, t.member_id, t.issue_date, t.due_date, t.return_date if t.return_date else 'N/A', t.status)
 
     def update_transactions_list(self):
-        for i in self.transactions_tree.get_children():
-            self.transactions_tree.delete(i)
-        
-        transactions = sorted(self.service.get_all_transactions(), key=lambda t: t['issue_date'], reverse=True)
-        
-        for t in transactions:
-            self.transactions_tree.insert('', 'end', values=(
-                t['id'], t['book_id'], t['member_id'], t['issue_date'], t['due_date'], t['return_date'] if t['return_date'] else 'N/A', t['status']
-            ))
+        if 'transactions' in self.record_views:
+            self.record_views['transactions'].refresh()
 
     def handle_issue(self):
         book_id = self.issue_book_entry.get().upper()
         member_id = self.issue_member_entry.get().upper()
 
-        success, message = self.service.issue_book(book_id, member_id)
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                self.issue_book_entry.delete(0, tk.END)
+                self.issue_member_entry.delete(0, tk.END)
+                self.update_all_related_lists()
+            else:
+                messagebox.showerror("Error", message)
 
-        if success:
-            messagebox.showinfo("Success", message)
-            self.issue_book_entry.delete(0, tk.END)
-            self.issue_member_entry.delete(0, tk.END)
-            self.update_all_related_lists()
-        else:
-            messagebox.showerror("Error", message)
+        self.dispatcher.mutate(self.service.issue_book, book_id, member_id, on_done=done)
 
     def handle_return(self):
         book_id = self.return_book_entry.get().upper()
 
-        success, message = self.service.return_book(book_id)
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                self.return_book_entry.delete(0, tk.END)
+                self.update_all_related_lists()
+            else:
+                messagebox.showerror("Error", message)
+
+        self.dispatcher.mutate(self.service.return_book, book_id, on_done=done)
+
+    def queue_scan(self, event=None):
+        book_id = self.scan_entry.get().strip().upper()
+        self.scan_entry.delete(0, tk.END)
+        if book_id:
+            self.scan_queue.append(book_id)
+            self.scan_notes.pop(book_id, None)
+            self.show_scan_queue()
+        return 'break'
+
+    def show_scan_queue(self):
+        self.scan_listbox.delete(0, tk.END)
+        for book_id in self.scan_queue:
+            note = self.scan_notes.get(book_id)
+            self.scan_listbox.insert(tk.END, f"{book_id}  -  {note}" if note else book_id)
+        self.scan_listbox.see(tk.END)
+
+    def remove_scanned(self):
+        for index in reversed(self.scan_listbox.curselection()):
+            del self.scan_queue[index]
+        self.show_scan_queue()
+
+    def clear_scan_queue(self):
+        self.scan_queue, self.scan_notes = [], {}
+        self.show_scan_queue()
+        self.scan_status.config(text="")
+
+    def submit_scan_queue(self):
+        """Issues or returns every queued book in one batch, then refreshes once."""
+        book_ids, mode = self.scan_queue, self.scan_mode.get()
+        if not book_ids:
+            return
+        if mode == 'issue':
+            member_id = self.scan_member_entry.get().strip().upper()
+            if not member_id:
+                messagebox.showerror("Error", "Enter the member ID to issue the scanned books to.")
+                return
+            fn, items = self.service.issue_books, [(book_id, member_id) for book_id in book_ids]
+        else:
+            fn, items = self.service.return_books, book_ids
+
+        # Scanning can go on while the batch runs; failures come back to the front.
+        self.scan_queue, self.scan_notes = [], {}
+        self.show_scan_queue()
+        self.scan_status.config(text=f"Submitting {len(book_ids)} books...")
+
+        def done(results):
+            failed = [(book_id, message) for book_id, (success, message) in zip(book_ids, results) if not success]
+            self.scan_queue = [book_id for book_id, _ in failed] + self.scan_queue
+            self.scan_notes.update(failed)
+            self.show_scan_queue()
+            verb = "issued" if mode == 'issue' else "returned"
+            summary = f"{len(book_ids) - len(failed)} of {len(book_ids)} books {verb}."
+            if failed:
+                summary += " Books that failed are left in the queue."
+            self.scan_status.config(text=summary)
+            if len(failed) < len(book_ids):
+                self.update_all_related_lists()
+
+        self.dispatcher.mutate(fn, items, on_done=done)
+
+    def setup_holds_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(1, weight=1)
+
+        # --- Place Hold Section ---
+        hold_frame = ttk.LabelFrame(tab, text="Place Hold", padding="10")
+        hold_frame.grid(row=0, column=0, columnspan=2, sticky='ew', padx=10, pady=10)
+
+        ttk.Label(hold_frame, text="Book ID:").grid(row=0, column=0, padx=5, pady=2)
+        self.hold_book_entry = ttk.Entry(hold_frame, width=12)
+        self.hold_book_entry.grid(row=0, column=1, padx=5, pady=2)
+        ttk.Label(hold_frame, text="Member ID:").grid(row=0, column=2, padx=5, pady=2)
+        self.hold_member_entry = ttk.Entry(hold_frame, width=12)
+        self.hold_member_entry.grid(row=0, column=3, padx=5, pady=2)
+        self.hold_priority = tk.BooleanVar()
+        ttk.Checkbutton(hold_frame, text="Priority", variable=self.hold_priority).grid(row=0, column=4, padx=5)
+        ttk.Button(hold_frame, text="Place Hold", command=self.handle_place_hold).grid(row=0, column=5, padx=5)
+        ttk.Button(hold_frame, text="Cancel Selected", command=self.cancel_selected_hold).grid(row=0, column=6, padx=5)
+
+        # --- Holds Treeview ---
+        self.holds_tree = ttk.Treeview(tab, columns=('ID', 'Book ID', 'Member ID', 'Priority', 'Requested', 'Status', 'Expires'), show='headings')
+        self.holds_tree.grid(row=1, column=0, sticky='nsew')
+        scrollbar = ttk.Scrollbar(tab, orient='vertical')
+        scrollbar.grid(row=1, column=1, sticky='ns')
+
+        for col in ('ID', 'Book ID', 'Member ID', 'Priority', 'Requested', 'Status', 'Expires'):
+            self.holds_tree.heading(col, text=col, anchor=tk.W)
+            self.holds_tree.column(col, width=100)
+        self.holds_tree.column('Requested', width=140)
+
+        self.record_views['holds'] = RecordTree(
+            self.holds_tree, scrollbar, lambda: self.all_ids.get('holds') or [], self.rows['holds'].get,
+            lambda h: (h.id, h.book_id, h.member_id, h.priority,
+                       datetime.fromtimestamp(h.request_time).strftime('%Y-%m-%d %H:%M'), h.status, h.expire_date)
+        )
+        self.load_all_records('holds', self.service.get_all_holds)
+
+    def update_holds_list(self):
+        if 'holds' in self.record_views:
+            self.record_views['holds'].refresh()
+
+    def handle_place_hold(self):
+        book_id = self.hold_book_entry.get().strip().upper()
+        member_id = self.hold_member_entry.get().strip().upper()
+        priority = 0 if self.hold_priority.get() else DEFAULT_HOLD_PRIORITY
 
-        if success:
-            messagebox.showinfo("Success", message)
-            self.return_book_entry.delete(0, tk.END)
-            self.update_all_related_lists()
+        def done(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", message)
+                self.hold_book_entry.delete(0, tk.END)
+                self.hold_member_entry.delete(0, tk.END)
+                self.update_holds_list()
+            else:
+                messagebox.showerror("Error", message)
+
+        self.dispatcher.mutate(self.service.place_hold, book_id, member_id, priority, on_done=done)
+
+    def cancel_selected_hold(self):
+        selected_item = self.holds_tree.focus()
+        if not selected_item:
+            messagebox.showwarning("Warning", "Please select a hold to cancel.")
+            return
+
+        hold_id = self.holds_tree.item(selected_item, 'values')[0]
+
+        def done(result):
+            success, message = result
+            if success:
+                self.update_all_related_lists()
+            else:
+                messagebox.showerror("Error", message)
+
+        self.dispatcher.mutate(self.service.cancel_hold, hold_id, on_done=done)
+
+    def open_history_dialog(self, collection, tree, event):
+        """Double-click on a member or book: its details and loan history,
+        newest first, one page at a time."""
+        item = tree.identify_row(event.y)
+        if not item:
+            return
+        record_id = tree.item(item, 'values')[0]
+        self.dispatcher.find(collection, record_id, on_done=lambda row: self.show_history_dialog(collection, row))
+
+    def show_history_dialog(self, collection, record):
+        if record is None:
+            return  # deleted since it was clicked
+        record_id = record.id
+        if collection == 'members':
+            pages = self.service.member_history(record_id)
+            details = f"{record.name} ({record_id}), {record.email}, {record.phone}, joined {record.join_date}"
         else:
-            messagebox.showerror("Error", message)
+            pages = self.service.book_history(record_id)
+            details = f"{record.title} by {record.author} ({record_id}), ISBN {record.isbn}, {record.status}"
+
+        dialog = tk.Toplevel(self.master)
+        dialog.title(f"Loan History - {record_id}")
+        dialog.transient(self.master)
+        dialog.grid_columnconfigure(0, weight=1)
+        dialog.grid_rowconfigure(1, weight=1)
+        ttk.Label(dialog, text=details, font=("Arial", 12)).grid(row=0, column=0, columnspan=2, sticky='w', padx=10, pady=10)
+
+        columns = ('ID', 'Book ID', 'Member ID', 'Issue Date', 'Due Date', 'Return Date', 'Status')
+        history_tree = ttk.Treeview(dialog, columns=columns, show='headings', height=15)
+        history_tree.grid(row=1, column=0, sticky='nsew', padx=(10, 0))
+        scrollbar = ttk.Scrollbar(dialog, orient='vertical', command=history_tree.yview)
+        scrollbar.grid(row=1, column=1, sticky='ns', padx=(0, 10))
+        history_tree.configure(yscrollcommand=scrollbar.set)
+        for col in columns:
+            history_tree.heading(col, text=col, anchor=tk.W)
+            history_tree.column(col, width=100)
 
+        footer = ttk.Frame(dialog)
+        footer.grid(row=2, column=0, columnspan=2, sticky='ew', padx=10, pady=10)
+        summary = ttk.Label(footer, text="Loading...")
+        summary.pack(side='left')
+        more = ttk.Button(footer, text="Load More", state='disabled', command=lambda: load_page())
+        more.pack(side='right')
+
+        def show_page(loans):
+            if not dialog.winfo_exists():
+                return
+            for t in loans:
+                history_tree.insert('', 'end', values=self.loan_values(t))
+            shown = len(history_tree.get_children())
+            if len(loans) < HISTORY_PAGE_SIZE:
+                summary.config(text=f"{shown} loans in all.")
+            else:
+                summary.config(text=f"The {shown} most recent loans.")
+                more.config(state='normal')
+
+        def load_page():
+            # Pages are read from storage; keep that on the worker.
+            more.config(state='disabled')
+            self.dispatcher.next_page(pages, on_done=show_page)
+
+        load_page()
+
+    @METRICS.timed('ui')
     def update_all_related_lists(self):
         """Updates all relevant listviews after a major operation"""
         self.update_books_list()
         self.update_transactions_list()
+        self.update_holds_list()
         self.update_stats_tab(self.notebook.nametowidget(self.notebook.tabs()[-1]))
 
+    # Report name -> (CirculationAnalytics query, columns)
+    REPORTS = {
+        "Most Borrowed Titles": ('top_titles', ('Book ID', 'Title', 'Author', 'Loans')),
+        "Demand by Author": ('author_demand', ('Author', 'Titles Borrowed', 'Loans')),
+        "Busiest Weekdays": ('busiest_weekdays', ('Weekday', 'Loans')),
+        "Member Activity": ('member_activity', ('Member ID', 'Name', 'Loans', 'Returned', 'Avg Days')),
+    }
+
+    def setup_reports_tab(self, tab):
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(2, weight=1)
+
+        # Controls Frame
+        controls = ttk.Frame(tab)
+        controls.grid(row=0, column=0, columnspan=2, sticky='ew', pady=10)
+        ttk.Label(controls, text="Report:").pack(side='left')
+        self.report_choice = tk.StringVar(value=next(iter(self.REPORTS)))
+        ttk.Combobox(controls, textvariable=self.report_choice, values=list(self.REPORTS),
+                     state='readonly', width=22).pack(side='left', padx=5)
+        ttk.Label(controls, text="Issued from:").pack(side='left', padx=(10, 0))
+        self.report_start = ttk.Entry(controls, width=11)
+        self.report_start.pack(side='left', padx=5)
+        ttk.Label(controls, text="to:").pack(side='left')
+        self.report_end = ttk.Entry(controls, width=11)
+        self.report_end.pack(side='left', padx=5)
+        ttk.Button(controls, text="Run", command=self.run_report).pack(side='left', padx=5)
+        self.report_choice.trace_add('write', lambda *args: self.run_report())
+
+        self.report_summary = ttk.Label(tab, text="Dates are YYYY-MM-DD; leave blank for all history.")
+        self.report_summary.grid(row=1, column=0, columnspan=2, sticky='w', padx=5)
+
+        self.report_tree = ttk.Treeview(tab, show='headings')
+        self.report_tree.grid(row=2, column=0, sticky='nsew')
+        scrollbar = ttk.Scrollbar(tab, orient='vertical', command=self.report_tree.yview)
+        scrollbar.grid(row=2, column=1, sticky='ns')
+        self.report_tree.configure(yscrollcommand=scrollbar.set)
+
+        if self.analytics is None:
+            # Loaded with the tab: NumPy, when installed, takes longer to
+            # import than the rest of the application.
+            # It subscribes to the service, so it is built on the worker.
+            from analytics import CirculationAnalytics
+            self.dispatcher.call(self.attach_analytics, CirculationAnalytics)
+
+    def attach_analytics(self, analytics_type):
+        if self.analytics is None:
+            self.analytics = analytics_type(self.service)
+
+    def run_report(self):
+        """Runs the chosen report on the worker; the first one builds the projection."""
+        try:
+            start, end = (day_ordinal(entry.get().strip() or None) for entry in (self.report_start, self.report_end))
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be YYYY-MM-DD.")
+            return
+        name = self.report_choice.get()
+        query, columns = self.REPORTS[name]
+
+        def report():
+            return getattr(self.analytics, query)(start, end), self.analytics.average_loan_days(start, end)
+
+        def done(result):
+            rows, (average, returned) = result
+            self.report_tree.configure(columns=columns)
+            for col in columns:
+                self.report_tree.heading(col, text=col, anchor=tk.W)
+                self.report_tree.column(col, width=200 if col in ('Title', 'Author', 'Name') else 100)
+            self.report_tree.delete(*self.report_tree.get_children())
+            for row in rows:
+                self.report_tree.insert('', 'end', values=['' if v is None else v for v in row])
+            self.report_summary.config(text=f"{name}: {len(rows)} rows. Average loan {average} days "
+                                            f"over {returned} returned loans.")
+
+        self.report_summary.config(text=f"Running {name}...")
+        self.dispatcher.call(report, on_done=done)
+
     def setup_stats_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
         
@@ -555,45 +4267,158 @@ class LibraryApp:
         self.stats_labels = {}
         row_offset = 1
         
-        stats = ["Total Books:", "Total Members:", "Books Issued:", "Books Available:", "Overdue Books:"]
+        stats = ["Total Books:", "Total Members:", "Books Issued:", "Books Available:", "Books On Hold:", "Overdue Books:"]
         
         for i, stat in enumerate(stats):
             ttk.Label(tab, text=stat, font=("Arial", 12)).grid(row=row_offset + i, column=0, padx=10, pady=5, sticky='w')
             label = ttk.Label(tab, text="0", font=("Arial", 12, "bold"))
             label.grid(row=row_offset + i, column=1, padx=10, pady=5, sticky='w')
             self.stats_labels[stat] = label
-            
+
+        if METRICS.enabled:
+            row = row_offset + len(stats)
+            ttk.Label(tab, text="Performance", font=("Arial", 14, "bold")).grid(row=row, column=0, pady=(20, 5), sticky='w')
+            buttons = ttk.Frame(tab)
+            buttons.grid(row=row, column=1, sticky='e')
+            ttk.Button(buttons, text="Refresh", command=self.show_metrics).pack(side='left', padx=5)
+            ttk.Button(buttons, text="Profile Next Operation", command=self.profile_next_operation).pack(side='left', padx=5)
+            self.metrics_text = tk.Text(tab, height=12, font=("Courier", 9), wrap='none')
+            self.metrics_text.grid(row=row + 1, column=0, columnspan=2, sticky='nsew')
+            tab.grid_rowconfigure(row + 1, weight=1)
+
         self.update_stats_tab(tab)
 
     def update_stats_tab(self, tab):
-        books = self.service.get_all_books()
-        members = self.service.get_all_members()
-        transactions = self.service.get_all_transactions()
-        
-        total_books = len(books)
-        total_members = len(members)
-        books_issued = len([b for b in books if b['status'] == 'Issued'])
-        books_available = len([b for b in books if b['status'] == 'Available'])
-        
-        # Calculate Overdue
-        overdue_count = 0
-        today = datetime.now().date()
-        for t in transactions:
-            if t['status'] == 'Issued':
-                due_date = datetime.strptime(t['due_date'], "%Y-%m-%d").date()
-                if due_date < today:
-                    overdue_count += 1
+        if not self.stats_labels:
+            return  # tab not built yet
+        self.dispatcher.call(self.service.get_stats, on_done=self.show_stats)
+
+    @METRICS.timed('ui')
+    def show_stats(self, stats):
+        if not self.stats_labels:
+            return
+        self.stats_labels["Total Books:"].config(text=str(stats['total_books']))
+        self.stats_labels["Total Members:"].config(text=str(stats['total_members']))
+        self.stats_labels["Books Issued:"].config(text=str(stats['books_issued']))
+        self.stats_labels["Books Available:"].config(text=str(stats['books_available']))
+        self.stats_labels["Books On Hold:"].config(text=str(stats.get('books_on_hold', 0)))
+        self.stats_labels["Overdue Books:"].config(text=str(stats['overdue_books']))
+        if METRICS.enabled:
+            self.show_metrics()
+
+    def show_metrics(self):
+        text = METRICS.report()
+        if METRICS.last_profile:
+            text += f"\n\nLast profile: {METRICS.last_profile}"
+        self.metrics_text.delete('1.0', tk.END)
+        self.metrics_text.insert('1.0', text)
 
-        self.stats_labels["Total Books:"].config(text=str(total_books))
-        self.stats_labels["Total Members:"].config(text=str(total_members))
-        self.stats_labels["Books Issued:"].config(text=str(books_issued))
-        self.stats_labels["Books Available:"].config(text=str(books_available))
-        self.stats_labels["Overdue Books:"].config(text=str(overdue_count))
+    def profile_next_operation(self):
+        METRICS.profile_next()
+        messagebox.showinfo("Profiling", f"The next operation will be profiled and saved under {PROFILE_DIR}/.")
 
 
 # --- 4. RUN APPLICATION ---
 
+def print_stats(branches, mode=None):
+    """Prints the library's stats; with branches, one row per branch and the
+    totals. Each branch is read by a process of its own."""
+    if not branches:
+        for key, value in LibraryStats.from_data(open_storage(mode).read()).snapshot().items():
+            print(f"{key:<18}{value}")
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(len(branches), os.cpu_count() or 1)) as pool:
+        rows = list(zip(branches, pool.map(branch_stats, itertools.repeat(mode), branches)))
+    rows.append(('Total', {key: sum(stats[key] for _, stats in rows) for key in rows[0][1]}))
+    members = SharedMembers.open(mode)
+    try:
+        total_members = members.get_stats()['total_members']
+    finally:
+        members.close()
+
+    keys = [key for key in rows[0][1] if key != 'total_members']
+    print(f"{'branch':<10}" + ''.join(f"{key:>17}" for key in keys))
+    for branch, stats in rows:
+        print(f"{branch:<10}" + ''.join(f"{stats[key]:>17}" for key in keys))
+    print(f"Members (shared by all branches): {total_members}")
+
+def run_cli(argv):
+    """Starts the GUI, or runs a headless command such as `import books catalog.csv`."""
+    parser = argparse.ArgumentParser(prog="lms.py", description="Library Management System")
+    parser.add_argument('--storage', choices=('json', 'journal', 'sqlite'), default=None,
+                        help="storage backend (default: STORAGE_MODE)")
+    parser.add_argument('--server', metavar='URL',
+                        help="run the GUI against a server.py instance instead of local files")
+    parser.add_argument('--branches', default=','.join(BRANCHES), metavar='CODES',
+                        help="comma-separated branch shards to open, home branch first (default: BRANCHES)")
+    commands = parser.add_subparsers(dest='command')
+
+    import_cmd = commands.add_parser('import', help="bulk-load books or members from CSV/JSON lines")
+    import_cmd.add_argument('collection', choices=('books', 'members'))
+    import_cmd.add_argument('path')
+    import_cmd.add_argument('--format', choices=('csv', 'jsonl'))
+    import_cmd.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    export_cmd = commands.add_parser('export', help="stream a collection out to CSV/JSON lines")
+    export_cmd.add_argument('collection', choices=('books', 'members', 'transactions'))
+    export_cmd.add_argument('path')
+    export_cmd.add_argument('--format', choices=('csv', 'jsonl'))
+
+    commands.add_parser('stats', help="library statistics, per branch when --branches is given")
+
+    add_branch_cmd = commands.add_parser('add-branch', help="create an empty shard for a new branch")
+    add_branch_cmd.add_argument('code')
+
+    args = parser.parse_args(argv)
+    branches = [code.strip().upper() for code in args.branches.split(',') if code.strip()]
+    try:
+        if args.command == 'add-branch':
+            branch_dir(args.code.upper(), create=True)
+            print(f"Created branch {args.code.upper()} in {BRANCH_DIR}/.")
+            return
+        for code in branches:
+            branch_dir(code)
+    except (ValueError, FileExistsError) as e:
+        parser.error(str(e))
+    if args.command is None:
+        root = tk.Tk()
+        if args.server:
+            open_service = lambda: RemoteLibraryService(args.server)
+        elif branches:
+            open_service = lambda: BranchRouter.open(branches, args.storage, deferred=True)
+        else:
+            open_service = lambda: LibraryService(open_storage(args.storage), deferred=True)
+        app = LibraryApp(root, open_service=open_service)
+        root.mainloop()
+        if METRICS.enabled:
+            print(METRICS.report(), file=sys.stderr)
+        return
+
+    if args.command == 'stats':
+        print_stats(branches, args.storage)
+        return
+
+    try:
+        service = BranchRouter.open(branches, args.storage) if branches else LibraryService(open_storage(args.storage))
+    except BranchInUseError as e:
+        parser.error(str(e))
+    try:
+        if args.command == 'import':
+            rows = read_records(args.path, args.format)
+            imported, errors = service.import_records(args.collection, rows, args.batch_size)
+            for row_number, message in errors:
+                print(f"Row {row_number}: {message}", file=sys.stderr)
+            print(f"Imported {imported} {args.collection}, skipped {len(errors)} rows.")
+        else:
+            records = service.export_records(args.collection)
+            count = write_records(args.path, records, LibraryService.EXPORT_FIELDS[args.collection], args.format)
+            print(f"Exported {count} {args.collection}.")
+    finally:
+        service.close()
+        if METRICS.enabled:
+            print(METRICS.report(), file=sys.stderr)
+
 if __name__ == '__main__':
-    root = tk.Tk()
-    app = LibraryApp(root)
-    root.mainloop()
+    run_cli(sys.argv[1:])
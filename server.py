@@ -0,0 +1,380 @@
+import argparse
+import http.client
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from lms import DEFAULT_HOLD_PRIORITY, HOLD_SWEEP_MS, METRICS, LibraryService, encode_record, open_storage
+
+# --- 1. CONFIGURATION ---
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Desks further behind than this many operations reload a full snapshot.
+CHANGE_LOG_SIZE = 10000
+# Loans per chunk of a /snapshot reply, which is streamed as it is read.
+SNAPSHOT_CHUNK_ROWS = 1000
+
+# --- 2. SERVER ---
+
+class LibraryServer(ThreadingHTTPServer):
+    """Hosts one LibraryService for every circulation desk.
+
+    Requests are handled on their own threads; every service call runs under
+    one lock, so two desks issuing or returning the same book are applied
+    one after the other and the second sees the first's result. Committed
+    change lists are numbered and kept in a bounded log that clients replay
+    through /changes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, LibraryRequestHandler)
+        self.service = service
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.change_log = deque(maxlen=CHANGE_LOG_SIZE)
+        self.closed = threading.Event()
+        service.subscribe(self.log_changes)
+
+    def server_close(self):
+        super().server_close()
+        self.closed.set()
+
+    def log_changes(self, changes):
+        # Called by the service while the caller holds self.lock.
+        self.seq += 1
+        self.change_log.append((self.seq, json.loads(json.dumps(changes, default=encode_record))))
+
+    def changes_since(self, seq, epoch):
+        with self.lock:
+            oldest = self.change_log[0][0] if self.change_log else self.seq + 1
+            if epoch != self.epoch or seq > self.seq or seq < oldest - 1:
+                return {'reset': True}
+            return {'changes': [entry for entry in self.change_log if entry[0] > seq]}
+
+    def snapshot(self):
+        """The library as of one seq, as (everything but the loans, the
+        loans). Only the records in memory are copied under the lock; the
+        stored history is read as the loans are consumed."""
+        with self.lock:
+            loans, stored = self.service.snapshot_transactions()
+            head = {
+                'epoch': self.epoch,
+                'seq': self.seq,
+                'books': [b.to_dict() for b in self.service.get_all_books()],
+                'members': [m.to_dict() for m in self.service.get_all_members()],
+                'holds': [h.to_dict() for h in self.service.get_all_holds()],
+            }
+        return head, itertools.chain(loans, stored)
+
+    def call(self, method, *args):
+        with self.lock:
+            return method(*args)
+
+    def sweep_holds(self):
+        """Expires holds every HOLD_SWEEP_MS until the server is closed.
+        A sweep that fails (say the disk is full) is reported and the next
+        one tries again."""
+        while not self.closed.is_set():
+            try:
+                self.call(self.service.expire_holds)
+            except Exception:
+                print("Hold sweep failed:", file=sys.stderr)
+                traceback.print_exc()
+            self.closed.wait(HOLD_SWEEP_MS / 1000)
+
+class LibraryRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints:
+
+    GET    /snapshot, /changes?since=N&epoch=E, /stats, /metrics
+    GET    /books[?q=QUERY&limit=N], /books/<id>, /members, /members/<id>, /transactions
+    GET    /holds[?book_id=ID|member_id=ID]
+    POST   /books {title, author, isbn}, /members {name, email, phone}
+    POST   /issue {book_id, member_id}, /return {book_id}
+    POST   /issue-batch {items: [{book_id, member_id}]}, /return-batch {book_ids: [...]}
+    POST   /holds {book_id, member_id[, priority]}
+    DELETE /books/<id>, /members/<id>, /holds/<id>
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; don't let Nagle delay the body.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self, method):
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == 'GET' and parts == ['snapshot']:
+            # Streamed, so an error part way through can only drop the connection.
+            self.send_snapshot(*self.server.snapshot())
+            return
+        try:
+            body = self.read_body() if method == 'POST' else {}
+            status, reply = self.route(method, parts, query, body)
+        except (ValueError, KeyError) as e:
+            status, reply = 400, {'error': f"Bad request: {e}"}
+        self.send_json(status, reply)
+
+    def route(self, method, parts, query, body):
+        server, service = self.server, self.server.service
+        resource = parts[0] if parts else ''
+        record_id = parts[1] if len(parts) > 1 else None
+
+        if method == 'GET':
+            if resource == 'changes':
+                return 200, server.changes_since(int(query.get('since', 0)), query.get('epoch'))
+            if resource == 'stats':
+                return 200, server.call(service.get_stats)
+            if resource == 'metrics':
+                # Timings are only collected with LMS_INSTRUMENT=1.
+                return 200, {'enabled': METRICS.enabled, 'operations': METRICS.snapshot()}
+            if resource == 'transactions':
+                return 200, server.call(lambda: list(service.get_all_transactions()))
+            if resource == 'holds':
+                if 'book_id' in query or 'member_id' in query:
+                    return 200, server.call(service.get_holds, query.get('book_id'), query.get('member_id'))
+                return 200, server.call(lambda: list(service.get_all_holds()))
+            if resource in ('books', 'members'):
+                find = service.find_book if resource == 'books' else service.find_member
+                if record_id:
+                    record = server.call(find, record_id)
+                    return (200, record) if record else (404, {'error': f"{record_id} not found."})
+                if resource == 'books' and 'q' in query:
+                    limit = int(query.get('limit', 100))
+                    return 200, server.call(service.search_books, query['q'], limit)
+                listing = service.get_all_books if resource == 'books' else service.get_all_members
+                return 200, server.call(lambda: list(listing()))
+
+        elif method == 'POST':
+            if resource == 'books' and not record_id:
+                require(body, 'title', 'author', 'isbn')
+                return 201, server.call(service.add_book, body['title'], body['author'], body['isbn'])
+            if resource == 'members' and not record_id:
+                require(body, 'name', 'email', 'phone')
+                return 201, server.call(service.add_member, body['name'], body['email'], body['phone'])
+            if resource == 'issue':
+                require(body, 'book_id', 'member_id')
+                return outcome(server.call(service.issue_book, body['book_id'], body['member_id']))
+            if resource == 'return':
+                require(body, 'book_id')
+                return outcome(server.call(service.return_book, body['book_id']))
+            if resource == 'issue-batch':
+                require(body, 'items')
+                pairs = [(item['book_id'], item['member_id']) for item in body['items']]
+                return batch_outcome(server.call(service.issue_books, pairs))
+            if resource == 'return-batch':
+                require(body, 'book_ids')
+                return batch_outcome(server.call(service.return_books, body['book_ids']))
+            if resource == 'holds' and not record_id:
+                require(body, 'book_id', 'member_id')
+                priority = int(body.get('priority', DEFAULT_HOLD_PRIORITY))
+                return outcome(server.call(service.place_hold, body['book_id'], body['member_id'], priority))
+
+        elif method == 'DELETE' and record_id:
+            if resource == 'books':
+                return outcome(server.call(service.delete_book, record_id))
+            if resource == 'members':
+                return outcome(server.call(service.delete_member, record_id))
+            if resource == 'holds':
+                return outcome(server.call(service.cancel_hold, record_id))
+
+        return 404, {'error': f"No route for {method} {self.path}"}
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        return body
+
+    def send_json(self, status, reply):
+        payload = json.dumps(reply, default=encode_record).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_snapshot(self, head, loans):
+        """Writes a snapshot with chunked encoding, SNAPSHOT_CHUNK_ROWS loans
+        to a chunk, so the history is never held whole."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.send_chunk(json.dumps(head)[:-1] + ', "transactions": [')
+        separator = ''
+        while True:
+            rows = list(itertools.islice(loans, SNAPSHOT_CHUNK_ROWS))
+            if not rows:
+                break
+            self.send_chunk(separator + ', '.join(json.dumps(t) for t in rows))
+            separator = ', '
+        self.send_chunk(']}')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def send_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+def require(body, *fields):
+    missing = [f for f in fields if not body.get(f)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+def outcome(result):
+    """Turns a service (success, message) pair into a response."""
+    success, message = result
+    return (200 if success else 409), {'success': success, 'message': message}
+
+def batch_outcome(results):
+    """Per-item replies for a batch; the batch itself always succeeds."""
+    return 200, {'results': [{'success': success, 'message': message} for success, message in results]}
+
+def serve(host, port, storage_mode=None):
+    service = LibraryService(open_storage(storage_mode))
+    server = LibraryServer((host, port), service)
+    threading.Thread(target=server.sweep_holds, name="hold-sweeper", daemon=True).start()
+    print(f"Serving library on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.call(service.close)
+        if METRICS.enabled:
+            print(METRICS.report(), file=sys.stderr)
+
+# --- 3. LOAD GENERATOR ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def run_load(host, port, clients, requests_per_client, books, seed=None):
+    """Drives N concurrent desks doing issue/return/stats against a server.
+
+    Every client works over the same pool of `books` titles, so issues and
+    returns of the same book collide on purpose. Returns a report dict with
+    throughput and latency percentiles in milliseconds.
+    """
+    setup = http.client.HTTPConnection(host, port)
+
+    def post(conn, path, body):
+        conn.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    _, member = post(setup, '/members', {'name': 'Load Test', 'email': 'load@test', 'phone': '0'})
+    book_ids = [post(setup, '/books', {'title': f"Load Test {i}", 'author': 'Load', 'isbn': str(i)})[1]['id']
+                for i in range(books)]
+    setup.close()
+
+    latencies, counts, lock = [], {'ok': 0, 'conflict': 0, 'error': 0}, threading.Lock()
+
+    def client(index):
+        rng = random.Random(None if seed is None else seed + index)
+        conn = http.client.HTTPConnection(host, port)
+        local_latencies, local_counts = [], {'ok': 0, 'conflict': 0, 'error': 0}
+        for _ in range(requests_per_client):
+            op = rng.random()
+            started = time.perf_counter()
+            try:
+                if op < 0.45:
+                    status, _ = post(conn, '/issue', {'book_id': rng.choice(book_ids), 'member_id': member['id']})
+                elif op < 0.9:
+                    status, _ = post(conn, '/return', {'book_id': rng.choice(book_ids)})
+                else:
+                    conn.request('GET', '/stats')
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                local_counts['ok' if status < 300 else 'conflict' if status == 409 else 'error'] += 1
+            except (OSError, http.client.HTTPException):
+                local_counts['error'] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port)
+            local_latencies.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for key, value in local_counts.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        **counts,
+    }
+
+# --- 4. COMMAND LINE ---
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="server.py", description="Library HTTP/JSON server")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_cmd = commands.add_parser('serve', help="host the library for several desks")
+    serve_cmd.add_argument('--host', default=DEFAULT_HOST)
+    serve_cmd.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_cmd.add_argument('--storage', choices=('json', 'journal', 'sqlite'), default=None,
+                           help="storage backend (default: STORAGE_MODE in lms.py)")
+
+    load_cmd = commands.add_parser('loadgen', help="measure throughput/latency under N concurrent clients")
+    load_cmd.add_argument('--host', default=DEFAULT_HOST)
+    load_cmd.add_argument('--port', type=int, default=DEFAULT_PORT)
+    load_cmd.add_argument('--clients', type=int, default=8)
+    load_cmd.add_argument('--requests', type=int, default=500, help="requests per client")
+    load_cmd.add_argument('--books', type=int, default=50, help="size of the shared book pool")
+    load_cmd.add_argument('--seed', type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(args.host, args.port, args.storage)
+    else:
+        report = run_load(args.host, args.port, args.clients, args.requests, args.books, args.seed)
+        print(json.dumps(report, indent=4))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+import random
+from collections import Counter
+from datetime import date
+
+import pytest
+
+import analytics
+import lms
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def columns(request, monkeypatch):
+    """Runs a test on NumPy columns and on the plain-Python fallback."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(analytics, 'numpy', None)
+
+
+def library(tmp_path, monkeypatch):
+    service = lms.LibraryService(lms.open_storage('journal', str(tmp_path)))
+    rng = random.Random(11)
+    books = [service.add_book(f"Book {i}", f"Author {i % 4}", f"isbn-{i}") for i in range(12)]
+    members = [service.add_member(f"Member {i}", "m@example.com", "555-0100") for i in range(5)]
+    first_day = date(2024, 1, 1).toordinal()
+    for step in range(200):
+        monkeypatch.setattr(lms, 'today_ordinal', lambda day=first_day + step // 4: day)
+        book = rng.choice(books)
+        if book.status == 'Issued':
+            service.return_book(book.id)
+        else:
+            service.issue_book(book.id, rng.choice(members).id)
+    return service
+
+
+def scan(service, start, end):
+    """What each report should say, from a plain pass over every loan."""
+    day = lms.day_ordinal
+    loans = [t for t in service.iter_transactions()
+             if (start or 0) <= day(t['issue_date']) <= (end or day('9999-12-31'))]
+    returned = [t for t in loans if t['return_date']]
+    books = {b.id: b for b in service.get_all_books()}
+    by_book = Counter(t['book_id'] for t in loans)
+    authors = Counter()
+    for book_id, n in by_book.items():
+        authors[books[book_id].author] += n
+    durations = [day(t['return_date']) - day(t['issue_date']) for t in returned]
+    return {
+        'titles': {(b, books[b].title, n) for b, n in by_book.items()},
+        'authors': {(a, len({b for b in by_book if books[b].author == a}), n) for a, n in authors.items()},
+        'weekdays': Counter(analytics.WEEKDAYS[date.fromordinal(day(t['issue_date'])).weekday()] for t in loans),
+        'average': (round(sum(durations) / len(durations), 1) if durations else 0.0, len(durations)),
+        'members': {(m, n, sum(t['member_id'] == m for t in returned)) for m, n in Counter(t['member_id'] for t in loans).items()},
+    }
+
+
+def reports(engine, start, end):
+    return {
+        'titles': {(b, title, n) for b, title, _, n in engine.top_titles(start, end, 1000)},
+        'authors': set(engine.author_demand(start, end, 1000)),
+        'weekdays': Counter({weekday: n for weekday, n in engine.busiest_weekdays(start, end) if n}),
+        'average': engine.average_loan_days(start, end),
+        'members': {(m, n, back) for m, _, n, back, _ in engine.member_activity(start, end, 1000)},
+    }
+
+
+def test_reports_match_a_scan(tmp_path, monkeypatch, columns):
+    service = library(tmp_path, monkeypatch)
+    engine = analytics.CirculationAnalytics(service)
+    week = (date(2024, 1, 15).toordinal(), date(2024, 1, 21).toordinal())
+    for start, end in ((None, None), week):
+        assert reports(engine, start, end) == scan(service, start, end)
+    service.close()
+
+
+def test_reports_follow_new_loans(tmp_path, monkeypatch, columns):
+    service = library(tmp_path, monkeypatch)
+    engine = analytics.CirculationAnalytics(service)
+    before = reports(engine, None, None)
+    book = next(b for b in service.get_all_books() if b.status == 'Available')
+    service.issue_book(book.id, 'M001')
+    service.return_book(book.id)
+    after = reports(engine, None, None)
+    assert after != before and after == scan(service, None, None)
+    service.close()
@@ -0,0 +1,121 @@
+import os
+import threading
+
+import pytest
+
+import lms
+
+
+def open_desks(tmp_path, monkeypatch):
+    """Two desks over one BRANCH_DIR, each with a different home branch."""
+    monkeypatch.setattr(lms, 'BRANCH_DIR', str(tmp_path))
+    for code in ('CEN', 'EAST'):
+        lms.branch_dir(code, create=True)
+    central = lms.BranchRouter.open(['CEN'], 'journal')
+    east = lms.BranchRouter.open(['EAST'], 'journal')
+    return central, east
+
+
+def test_desks_never_share_a_member_id(tmp_path, monkeypatch):
+    central, east = open_desks(tmp_path, monkeypatch)
+    added = {central: [], east: []}
+
+    def add(desk):
+        for i in range(25):
+            added[desk].append(desk.add_member(f"Member {i}", "m@example.com", "555-0100").id)
+
+    threads = [threading.Thread(target=add, args=(desk,)) for desk in added]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = added[central] + added[east]
+    assert len(set(ids)) == 50
+    assert sorted(ids, key=lms.id_number)[-1] == 'M050'
+    # Each desk picks up the other's members.
+    assert central.find_member(added[east][0]) is not None
+    assert {m.id for m in east.get_all_members()} == set(ids)
+    central.close()
+    east.close()
+
+
+def test_member_with_books_at_another_branch_is_kept(tmp_path, monkeypatch):
+    central, east = open_desks(tmp_path, monkeypatch)
+    borrower = central.add_member("Ada", "ada@example.com", "555-0100")
+    waiting = central.add_member("Grace", "grace@example.com", "555-0101")
+    book = east.add_book("Book", "Author", "isbn")
+    assert east.issue_book(book.id, borrower.id)[0]
+    assert east.place_hold(book.id, waiting.id)[0]
+
+    assert central.delete_member(borrower.id) == (False, "Member has outstanding books and cannot be deleted.")
+    assert central.query_records('members', filters={'on_loan': True}) == [central.find_member(borrower.id)]
+    success, message = central.delete_member(waiting.id)
+    assert not success and "EAST" in message
+
+    # The desk with EAST open withdraws the hold itself.
+    assert east.delete_member(waiting.id) == (True, "Member deleted successfully.")
+    assert east.get_holds(book_id=book.id) == []
+    assert central.find_member(waiting.id) is None
+    east.return_book(book.id)
+    assert central.delete_member(borrower.id)[0]
+    central.close()
+    east.close()
+
+
+def test_members_shard_is_moved_into_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(lms, 'BRANCH_DIR', str(tmp_path))
+    os.mkdir(tmp_path / 'members')
+    old = lms.LibraryService(lms.open_storage('json', str(tmp_path / 'members')))
+    old.add_member("Ada", "ada@example.com", "555-0100")
+    old.delete_member(old.add_member("Gone", "gone@example.com", "555-0101").id)
+    old.close()
+
+    members = lms.SharedMembers.open('json')
+    assert [m.name for m in members.get_all_members()] == ["Ada"]
+    assert members.add_member("Grace", "grace@example.com", "555-0102").id == 'M003'
+    members.close()
+
+
+def test_unknown_branch_is_not_created(tmp_path, monkeypatch):
+    monkeypatch.setattr(lms, 'BRANCH_DIR', str(tmp_path))
+    lms.branch_dir('CEN', create=True)
+    with pytest.raises(ValueError, match="add-branch CNE"):
+        lms.BranchRouter.open(['CEN', 'CNE'], 'journal')
+    assert not os.path.exists(tmp_path / 'CNE')
+    with pytest.raises(ValueError, match="capital letters"):
+        lms.branch_dir('cen/..', create=True)
+
+
+def test_a_shard_is_open_at_one_desk_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(lms, 'BRANCH_DIR', str(tmp_path))
+    for code in ('CEN', 'EAST'):
+        lms.branch_dir(code, create=True)
+    east = lms.BranchRouter.open(['EAST'], 'journal')
+    with pytest.raises(lms.BranchInUseError, match="EAST"):
+        lms.BranchRouter.open(['CEN', 'EAST'], 'journal')
+    # The refused desk let go of CEN, which it had locked before EAST.
+    central = lms.BranchRouter.open(['CEN'], 'journal')
+    central.close()
+
+    book = east.add_book("East", "Author", "isbn")
+    east.close()
+    both = lms.BranchRouter.open(['CEN', 'EAST'], 'journal')
+    assert both.find_book(book.id) is not None
+    assert both.shards['EAST'].add_book("Another", "Author", "isbn-2").id == 'EAST-B002'
+    both.close()
+
+
+def test_branch_stats_leave_an_open_shard_alone(tmp_path, monkeypatch):
+    central, east = open_desks(tmp_path, monkeypatch)
+    member = central.add_member("Ada", "ada@example.com", "555-0100")
+    books = [east.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(3)]
+    assert east.issue_book(books[0].id, member.id)[0]
+    east.flush()
+    shard = lms.branch_dir('EAST')
+    files = {name: os.path.getsize(os.path.join(shard, name)) for name in os.listdir(shard)}
+
+    stats = lms.branch_stats('journal', 'EAST')
+    assert stats == {**east.get_stats(), 'total_members': 0}
+    assert {name: os.path.getsize(os.path.join(shard, name)) for name in os.listdir(shard)} == files
+    central.close()
+    east.close()
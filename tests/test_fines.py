@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import fines
+import lms
+
+
+def lend(service, count):
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    for i in range(count):
+        book = service.add_book(f"Book {i}", "Author", f"isbn-{i}")
+        service.issue_book(book.id, member.id)
+    return member
+
+
+def sweep(capsys, *args):
+    fines.main(['--date', '2030-01-01', '--output-dir', 'reports', *args])
+    return capsys.readouterr().out.splitlines()[0]
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_sweep_reads_beside_a_live_desk(tmp_path, monkeypatch, capsys, mode):
+    monkeypatch.chdir(tmp_path)
+    service = lms.LibraryService(lms.open_storage(mode))
+    lend(service, 3)
+    service.return_book('B001')
+    files = sorted(os.listdir(tmp_path))
+
+    assert sweep(capsys, '--storage', mode).startswith("2 of 2 open loans overdue")
+    assert sorted(os.listdir(tmp_path)) == files + ['reports']
+    # The desk carries on as if nothing happened.
+    service.issue_book('B001', 'M001')
+    service.close()
+
+
+def test_sweep_leaves_a_torn_journal_alone(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    service = lms.LibraryService(lms.open_storage('journal'))
+    lend(service, 2)
+    service.return_book('B001')
+    service.close()
+    with open(lms.JOURNAL_FILE, 'ab') as f:
+        f.write(b'{"seq": 99, "ops": [["put"')
+    size = os.path.getsize(lms.JOURNAL_FILE)
+
+    assert sweep(capsys, '--storage', 'journal').startswith("1 of 1 open loans overdue")
+    assert os.path.getsize(lms.JOURNAL_FILE) == size
+
+
+def test_sweep_leaves_the_archive_alone(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    service = lms.LibraryService(lms.open_storage('json'))
+    lend(service, 2)
+    service.return_book('B001')
+    service.close()
+    # A loan archived by a desk that has not saved its data file yet.
+    segment = os.path.join(lms.HISTORY_DIR, 'segment-00001.jsonl')
+    with open(segment, 'ab') as f:
+        f.write(b'{"id": "T009"}\n')
+    size = os.path.getsize(segment)
+    os.remove(os.path.join(lms.HISTORY_DIR, lms.HistoryArchive.INDEX_FILE))
+
+    assert sweep(capsys, '--storage', 'json').startswith("1 of 1 open loans overdue")
+    assert os.path.getsize(segment) == size
+    assert os.listdir(lms.HISTORY_DIR) == ['segment-00001.jsonl']
+
+
+def test_sweep_needs_the_branches_of_a_split_library(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    for code in ('CEN', 'EAST'):
+        lms.branch_dir(code, create=True)
+    router = lms.BranchRouter.open(['CEN', 'EAST'], 'journal')
+    member = lend(router, 2)
+    east_book = router.shards['EAST'].add_book("East", "Author", "isbn-e")
+    router.issue_book(east_book.id, member.id)
+    router.close()
+
+    with pytest.raises(SystemExit):
+        sweep(capsys, '--storage', 'journal')
+    assert "--branches CEN,EAST" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        sweep(capsys, '--storage', 'journal', '--branches', 'CEN,WEST')
+    assert sweep(capsys, '--storage', 'journal', '--branches', 'CEN,EAST').startswith("3 of 3 open loans overdue")
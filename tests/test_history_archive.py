@@ -0,0 +1,95 @@
+import glob
+import os
+
+import pytest
+
+import lms
+
+
+@pytest.fixture
+def library(tmp_path):
+    """A json-backed library with one returned loan in its history archive."""
+    storage = lms.JsonStorage(str(tmp_path / "data.txt"), history_dir=str(tmp_path / "history"))
+    service = lms.LibraryService(storage)
+    book = service.add_book("Dune", "Frank Herbert", "9780441013593")
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    service.issue_book(book.id, member.id)
+    service.return_book(book.id)
+    service.close()
+    return tmp_path
+
+
+def reopen(tmp_path):
+    return lms.JsonStorage(str(tmp_path / "data.txt"), history_dir=str(tmp_path / "history"))
+
+
+def archived_ids(directory):
+    archive = lms.HistoryArchive(str(directory))
+    archive.commit((1, os.path.getsize(archive.segment_path(1))))
+    return [loan['id'] for loan in archive]
+
+
+def test_reload_keeps_committed_history(library):
+    storage = reopen(library)
+    storage.load()
+    assert [loan['id'] for loan in storage.iter_transactions()] == ['T001']
+
+
+def test_missing_snapshot_moves_history_aside(library, capsys):
+    os.remove(library / "data.txt")
+    storage = reopen(library)
+    data = storage.load()
+
+    assert data['transactions'] == []
+    assert not os.path.exists(library / "history")
+    [aside] = glob.glob(str(library / "history.orphaned-*"))
+    assert archived_ids(aside) == ['T001']
+    assert "moved" in capsys.readouterr().err
+
+
+def test_corrupt_snapshot_moves_history_aside(library, monkeypatch):
+    monkeypatch.setattr(lms, 'messagebox', None)
+    (library / "data.txt").write_text("{not json")
+    reopen(library).load()
+
+    [aside] = glob.glob(str(library / "history.orphaned-*"))
+    assert archived_ids(aside) == ['T001']
+
+
+def test_loans_archived_after_the_last_snapshot_are_cut_off(library):
+    # A crash after the archive append but before the snapshot was saved.
+    storage = reopen(library)
+    storage.load()
+    committed = storage.archive.position()
+    storage.archive.append([{'id': 'T999', 'book_id': 'B001', 'member_id': 'M001',
+                             'issue_date': '2024-01-01', 'due_date': '2024-01-15',
+                             'return_date': '2024-01-02', 'status': 'Returned'}])
+    storage.archive.append([{'id': 'T998'}])
+
+    storage = reopen(library)
+    storage.load()
+    assert storage.archive.position() == committed
+    assert os.path.getsize(storage.archive.segment_path(1)) == committed[1]
+    assert [loan['id'] for loan in storage.iter_transactions()] == ['T001']
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal'])
+def test_legacy_data_file_keeps_its_loan_numbers(tmp_path, mode):
+    """A data file from before ID counters and the archive, whose newest
+    loan is a returned one."""
+    loan = lambda n, status, returned: {
+        'id': lms.format_id('T', n), 'book_id': 'B001', 'member_id': 'M001', 'issue_date': '2024-01-01',
+        'due_date': '2024-01-15', 'return_date': returned, 'status': status}
+    lms.save_data({
+        'books': [{'id': 'B001', 'title': "Dune", 'author': "Frank Herbert", 'isbn': "9780441013593", 'status': 'Issued'},
+                  {'id': 'B002', 'title': "Emma", 'author': "Jane Austen", 'isbn': "9780141439587", 'status': 'Available'}],
+        'members': [{'id': 'M001', 'name': "Ada", 'email': "ada@example.com", 'phone': "555-0100", 'join_date': '2024-01-01'}],
+        'transactions': [loan(1, 'Issued', None), loan(2, 'Returned', '2024-01-05'), loan(3, 'Returned', '2024-01-09')],
+    }, str(tmp_path / "data.txt"))
+
+    # Opened and closed once, so the returned loans are only in the archive.
+    lms.LibraryService(lms.open_storage(mode, str(tmp_path))).close()
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    assert service.issue_book('B002', 'M001')[0]
+    assert [t.id for t in service.get_all_transactions()] == ['T002', 'T003', 'T001', 'T004']
+    service.close()
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import lms
+
+
+def rows(count, bad=()):
+    """Book rows; the 1-based row numbers in `bad` have no title."""
+    return [{'title': '' if n in bad else f"Book {n}", 'author': "Author", 'isbn': f"isbn-{n}"}
+            for n in range(1, count + 1)]
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_bad_rows_are_skipped_not_their_batch(tmp_path, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    imported, errors = service.import_records('books', rows(10, bad={3, 7}), batch_size=4)
+    assert imported == 8
+    assert errors == [(3, "Missing title."), (7, "Missing title.")]
+    service.close()
+
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    assert [b.isbn for b in service.get_all_books()] == [f"isbn-{n}" for n in (1, 2, 4, 5, 6, 8, 9, 10)]
+    assert [b.id for b in service.get_all_books()] == [lms.format_id('B', n) for n in range(1, 9)]
+    service.close()
+
+
+def test_json_import_writes_the_data_file_once(tmp_path, monkeypatch):
+    service = lms.LibraryService(lms.open_storage('json', str(tmp_path)))
+    saves = []
+    real_save = lms.save_data
+    monkeypatch.setattr(lms, 'save_data', lambda data, path: saves.append(path) or real_save(data, path))
+
+    imported, errors = service.import_records('members', [
+        {'name': f"Member {n}", 'email': "m@example.com", 'phone': "555-0100",
+         'join_date': 'not a date' if n == 5 else '2024-01-02'} for n in range(1, 26)
+    ], batch_size=5)
+    assert (imported, errors) == (24, [(5, "Invalid join_date, expected YYYY-MM-DD.")])
+    assert len(saves) == 1
+    # Later operations are saved as they happen again.
+    service.add_book("Book", "Author", "isbn")
+    assert len(saves) == 2
+    service.close()
+
+    service = lms.LibraryService(lms.open_storage('json', str(tmp_path)))
+    assert len(service.get_all_members()) == 24 and len(service.get_all_books()) == 1
+    service.close()
+
+
+def test_unreadable_lines_are_reported_by_row(tmp_path):
+    path = tmp_path / "books.jsonl"
+    lines = [json.dumps(row) for row in rows(6)]
+    lines[2] = '{"title": "Book 3", "author": '
+    lines[4] = '["Book 5", "Author", "isbn-5"]'
+    path.write_text('\n'.join(lines) + '\n')
+
+    service = lms.LibraryService(lms.open_storage('journal', str(tmp_path)))
+    imported, errors = service.import_records('books', lms.read_records(str(path)), batch_size=2)
+    assert imported == 4
+    assert errors == [(3, "Invalid JSON (Expecting value at column 30)."), (5, "Not a record.")]
+    assert [b.isbn for b in service.get_all_books()] == ["isbn-1", "isbn-2", "isbn-4", "isbn-6"]
+    service.close()
@@ -0,0 +1,41 @@
+import pytest
+
+import lms
+
+
+def assert_indexes_match(service):
+    """The by-ID and active-loan indexes agree with a scan of the data."""
+    assert service.books_by_id == {b.id: b for b in service.get_all_books()}
+    assert service.members_by_id == {m.id: m for m in service.get_all_members()}
+    open_loans = [t for t in service.data['transactions'] if t.status == 'Issued']
+    assert service.active_by_book == {t.book_id: t for t in open_loans}
+    by_member = {}
+    for t in open_loans:
+        by_member.setdefault(t.member_id, set()).add(t.id)
+    assert service.active_by_member == by_member
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_indexes_follow_every_operation(tmp_path, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    ada, grace = (service.add_member(name, f"{name}@example.com", "555-0100") for name in ("ada", "grace"))
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(4)]
+    service.issue_books([(books[0].id, ada.id), (books[1].id, ada.id), (books[2].id, grace.id)])
+    service.return_book(books[1].id)
+
+    assert service.delete_book(books[0].id) == (False, "Book is currently issued and cannot be deleted.")
+    assert service.delete_member(grace.id) == (False, "Member has outstanding books and cannot be deleted.")
+    assert service.delete_book(books[3].id)[0]
+    assert service.find_book(books[3].id) is None
+    assert service.return_book(books[2].id)[0]
+    assert service.delete_member(grace.id)[0]
+    assert service.find_member(grace.id) is None
+    assert_indexes_match(service)
+    service.close()
+
+    # Rebuilt once from the stored data on load.
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    assert_indexes_match(service)
+    assert service.active_by_book.keys() == {books[0].id}
+    assert service.active_by_member == {ada.id: {service.active_by_book[books[0].id].id}}
+    service.close()
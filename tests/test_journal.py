@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+import lms
+
+
+def journal_storage(tmp_path, compact_bytes=lms.JOURNAL_COMPACT_BYTES):
+    return lms.JournalStorage(str(tmp_path / "data.txt"), str(tmp_path / "data.journal"),
+                              compact_bytes=compact_bytes, history_dir=str(tmp_path / "history"))
+
+
+def stock(service, count=3):
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(count)]
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    return books, member
+
+
+def test_journal_is_replayed_onto_the_snapshot(tmp_path):
+    service = lms.LibraryService(journal_storage(tmp_path))
+    books, member = stock(service)
+    service.issue_book(books[0].id, member.id)
+    service.issue_book(books[1].id, member.id)
+    service.return_book(books[0].id)
+    service.close()
+    assert not os.path.exists(tmp_path / "data.txt")
+
+    service = lms.LibraryService(journal_storage(tmp_path))
+    assert [b.status for b in service.get_all_books()] == ['Available', 'Issued', 'Available']
+    assert [t.id for t in service.get_all_transactions()] == ['T001', 'T002']
+    assert service.add_book("Next", "Author", "isbn-next").id == 'B004'
+    service.close()
+
+
+def test_torn_tail_is_cut_off(tmp_path):
+    service = lms.LibraryService(journal_storage(tmp_path))
+    stock(service)
+    service.close()
+    journal = tmp_path / "data.journal"
+    good_size = os.path.getsize(journal)
+    with open(journal, 'ab') as f:
+        f.write(b'{"seq": 99, "ops": [["put", "books", {"id"')
+
+    service = lms.LibraryService(journal_storage(tmp_path))
+    assert os.path.getsize(journal) == good_size
+    assert len(service.get_all_books()) == 3
+    service.add_book("After", "Author", "isbn-after")
+    service.close()
+
+    service = lms.LibraryService(journal_storage(tmp_path))
+    assert [b.title for b in service.get_all_books()][-1] == "After"
+    service.close()
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path):
+    storage = journal_storage(tmp_path, compact_bytes=512)
+    service = lms.LibraryService(storage)
+    books, member = stock(service, 10)
+    for book in books:
+        service.issue_book(book.id, member.id)
+        service.return_book(book.id)
+    service.close()
+
+    assert not os.path.exists(storage.sealed_path)
+    with open(tmp_path / "data.txt") as f:
+        snapshot = json.load(f)
+    assert snapshot['journal_seq'] > 0
+    # Returned loans go to the archive; only loans open at the time are kept.
+    assert all(t['status'] == 'Issued' for t in snapshot['transactions'])
+
+    service = lms.LibraryService(journal_storage(tmp_path, compact_bytes=512))
+    assert len(service.get_all_books()) == 10
+    assert len(service.get_all_transactions()) == 10
+    assert all(t.status == 'Returned' for t in service.get_all_transactions())
+    service.close()
+
+
+def test_failed_compaction_is_reported_and_retried(tmp_path, monkeypatch):
+    storage = journal_storage(tmp_path, compact_bytes=256)
+    service = lms.LibraryService(storage)
+    write_snapshot = storage._write_snapshot
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage, '_write_snapshot', fail)
+    while not os.path.exists(storage.sealed_path):
+        try:
+            service.add_book("Book", "Author", "isbn")
+        except lms.CompactionError:
+            pass  # The compactor can fail before the sealing commit returns.
+    storage.compactor.join()
+    assert os.path.exists(storage.sealed_path)
+
+    monkeypatch.setattr(storage, '_write_snapshot', write_snapshot)
+    with pytest.raises(lms.CompactionError, match="disk full"):
+        service.add_book("Saved anyway", "Author", "isbn")
+    storage.compactor.join()
+    assert not os.path.exists(storage.sealed_path)
+    service.close()
+
+    service = lms.LibraryService(journal_storage(tmp_path))
+    assert service.get_all_books()[-1].title == "Saved anyway"
+    service.close()
+
+
+def test_failed_compaction_is_raised_on_close(tmp_path, monkeypatch):
+    storage = journal_storage(tmp_path, compact_bytes=256)
+    service = lms.LibraryService(storage)
+    monkeypatch.setattr(storage, '_write_snapshot', lambda *args: 1 / 0)
+    while not os.path.exists(storage.sealed_path):
+        try:
+            service.add_book("Book", "Author", "isbn")
+        except lms.CompactionError:
+            pass  # Reported early; the retry fails too.
+    with pytest.raises(lms.CompactionError):
+        service.close()
+    assert os.path.exists(storage.sealed_path)
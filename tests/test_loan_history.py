@@ -0,0 +1,115 @@
+import random
+from datetime import date
+
+import pytest
+
+import lms
+
+
+def lend(service, books, members, monkeypatch, steps=200):
+    """Issues and returns books at random over steps // 4 days."""
+    rng = random.Random(7)
+    first_day = date(2024, 1, 1).toordinal()
+    for step in range(steps):
+        monkeypatch.setattr(lms, 'today_ordinal', lambda day=first_day + step // 4: day)
+        book = rng.choice(books)
+        if service.find_book(book.id).status == 'Issued':
+            service.return_book(book.id)
+        else:
+            service.issue_book(book.id, rng.choice(members).id)
+
+
+def newest_first(service, loans):
+    return [t.id for t in sorted(loans, key=service.sort_key('issue_date'), reverse=True)]
+
+
+def paged_ids(pages):
+    return [loan.id for page, _ in pages for loan in page]
+
+
+def assert_resumes(history, page_size):
+    """Every cursor picks up exactly where its page left off."""
+    pages = list(history(page_size))
+    assert all(len(page) == page_size for page, _ in pages[:-1])
+    for i, (_, cursor) in enumerate(pages):
+        assert paged_ids(history(page_size, cursor)) == paged_ids(pages[i + 1:])
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_member_and_book_history_page_from_storage(tmp_path, monkeypatch, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(12)]
+    members = [service.add_member(f"Member {i}", "m@example.com", "555-0100") for i in range(3)]
+    lend(service, books, members, monkeypatch)
+    service.close()
+
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    service.return_book(next(t.book_id for t in service.get_all_transactions() if t.status == 'Issued'))
+    everything = list(service.iter_transactions())
+    for member in members:
+        want = newest_first(service, [t for t in everything if t.member_id == member.id])
+        assert paged_ids(service.member_history(member.id, 5)) == want
+        assert_resumes(lambda size, cursor=None: service.member_history(member.id, size, cursor), 4)
+    want = newest_first(service, [t for t in everything if t.book_id == books[0].id])
+    assert want and paged_ids(service.book_history(books[0].id, 3)) == want
+    assert_resumes(lambda size, cursor=None: service.book_history(books[0].id, size, cursor), 3)
+    assert paged_ids(service.member_history('M999')) == []
+    service.close()
+
+
+def test_member_history_merges_branches(tmp_path, monkeypatch):
+    monkeypatch.setattr(lms, 'BRANCH_DIR', str(tmp_path))
+    for code in ('CEN', 'EAST'):
+        lms.branch_dir(code, create=True)
+    router = lms.BranchRouter.open(['CEN', 'EAST'], 'journal')
+    books = [router.shards[code].add_book(f"Book {i}", "Author", f"isbn-{i}")
+             for code in ('CEN', 'EAST') for i in range(6)]
+    members = [router.add_member(f"Member {i}", "m@example.com", "555-0100") for i in range(2)]
+    lend(router, books, members, monkeypatch)
+    router.close()
+
+    router = lms.BranchRouter.open(['CEN', 'EAST'], 'journal')
+    everything = list(router.iter_transactions())
+    home = router.shards['CEN']
+    for member in members:
+        loans = [t for t in everything if t.member_id == member.id]
+        assert {lms.branch_of(t.book_id) for t in loans} == {'CEN', 'EAST'}
+        assert paged_ids(router.member_history(member.id, 4)) == newest_first(home, loans)
+        assert_resumes(lambda size, cursor=None: router.member_history(member.id, size, cursor), 4)
+    east_book = books[-1]
+    want = newest_first(home, [t for t in everything if t.book_id == east_book.id])
+    assert paged_ids(router.book_history(east_book.id, 2)) == want
+    router.close()
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_a_page_reads_one_page_of_history(tmp_path, monkeypatch, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(12)]
+    members = [service.add_member(f"Member {i}", "m@example.com", "555-0100") for i in range(3)]
+    lend(service, books, members, monkeypatch, steps=400)
+    service.close()
+
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    want = newest_first(service, [t for t in service.iter_transactions() if t.member_id == members[0].id])
+    limits = []
+    real_loan_page = service.storage.loan_page
+
+    def loan_page(sort, descending, filters, cursor, limit):
+        limits.append(limit)
+        return real_loan_page(sort, descending, filters, cursor, limit)
+
+    def scan():
+        raise AssertionError("the whole history was read")
+
+    monkeypatch.setattr(service.storage, 'loan_page', loan_page)
+    monkeypatch.setattr(service.storage, 'iter_transactions', scan)
+    pages = service.member_history(members[0].id, 5)
+    # Pages are read as they are asked for, a page of rows at a time.
+    assert limits == []
+    page, _ = next(pages)
+    assert [t.id for t in page] == want[:5] and len(limits) == 1 and limits[0] <= 6
+    page, _ = next(pages)
+    assert [t.id for t in page] == want[5:10] and len(limits) == 2 and limits[1] <= 6
+    assert len(want) > 20
+    service.close()
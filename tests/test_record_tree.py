@@ -0,0 +1,96 @@
+import lms
+
+
+class FakeTree:
+    """The part of ttk.Treeview that RecordTree uses, counting row writes."""
+
+    def __init__(self):
+        self.rows, self.order, self.writes, self.made = {}, [], 0, 0
+
+    def bind(self, sequence, handler):
+        pass
+
+    def configure(self, **options):
+        pass
+
+    def yview(self, *args):
+        pass
+
+    def get_children(self):
+        return tuple(self.order)
+
+    def exists(self, iid):
+        return iid in self.rows
+
+    def insert(self, parent, index, iid=None, values=()):
+        if iid is None:
+            self.made += 1
+            iid = f"I{self.made:03d}"
+        self.order.insert(0 if index == 0 else len(self.order), iid)
+        self.item(iid, values)
+        return iid
+
+    def item(self, iid, values):
+        self.rows[iid] = values
+        self.writes += 1
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.rows[iid]
+            self.order.remove(iid)
+            self.writes += 1
+
+    def shown(self):
+        return [self.rows[iid] for iid in self.order]
+
+
+class FakeScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+def record_tree(titles, ids):
+    tree = FakeTree()
+    view = lms.RecordTree(tree, FakeScrollbar(), lambda: ids, titles.get, lambda title: (title,))
+    view.refresh()
+    return tree, view
+
+
+def test_changes_touch_only_their_rows():
+    titles = {f"B{n:03d}": f"Book {n}" for n in range(1, 101)}
+    ids = list(titles)
+    tree, view = record_tree(titles, ids)
+    assert tree.shown() == [(titles[i],) for i in ids] and tree.writes == 100
+
+    tree.writes = 0
+    titles['B050'] = "Renamed"
+    titles['B101'] = "New"
+    ids.append('B101')
+    del titles['B007']
+    ids.remove('B007')
+    for record_id in ('B050', 'B101', 'B007'):
+        view.note(record_id)
+    view.refresh()
+    assert tree.writes == 3
+    assert tree.shown() == [(titles[i],) for i in ids]
+
+
+def test_long_lists_keep_only_a_window(monkeypatch):
+    monkeypatch.setattr(lms, 'VIRTUAL_ROW_THRESHOLD', 50)
+    monkeypatch.setattr(lms.RecordTree, 'visible_rows', lambda self: 10)
+    titles = {f"B{n:03d}": f"Book {n}" for n in range(1, 501)}
+    ids = list(titles)
+    tree, view = record_tree(titles, ids)
+    assert tree.shown() == [(titles[i],) for i in ids[:10 + lms.VIRTUAL_BUFFER_ROWS]]
+
+    view.on_scroll('moveto', 0.5)
+    assert tree.shown()[0] == ("Book 251",) and len(tree.shown()) == 10 + lms.VIRTUAL_BUFFER_ROWS
+    view.on_scroll('scroll', 1, 'pages')
+    assert tree.shown()[0] == ("Book 261",)
+    # Scrolling past the end stops at the last full window.
+    view.on_scroll('moveto', 1.0)
+    assert tree.shown()[:10] == [(titles[i],) for i in ids[-10:]]
+    assert view.scrollbar.position == (0.98, 1.0)
@@ -0,0 +1,49 @@
+import json
+import sys
+
+import pytest
+
+import lms
+
+STORED = {
+    'books': {'id': 'B001', 'title': "Dune", 'author': "Frank Herbert", 'isbn': "9780441013593", 'status': 'Issued'},
+    'members': {'id': 'M001', 'name': "Ada", 'email': "ada@example.com", 'phone': "555-0100", 'join_date': '2024-01-02'},
+    'transactions': {'id': 'T001', 'book_id': 'B001', 'member_id': 'M001', 'issue_date': '2024-02-28',
+                     'due_date': '2024-03-13', 'return_date': None, 'status': 'Issued'},
+    'holds': {'id': 'H001', 'book_id': 'B001', 'member_id': 'M002', 'priority': 1, 'request_time': 1709251200.5,
+              'expire_date': '2024-03-20', 'status': 'Waiting'},
+}
+
+
+@pytest.mark.parametrize('collection', sorted(STORED))
+def test_records_round_trip_to_their_stored_form(collection):
+    stored = STORED[collection]
+    record = lms.RECORD_TYPES[collection].from_dict(json.loads(json.dumps(stored)))
+    assert record.to_dict() == stored
+    assert json.loads(json.dumps(record, default=lms.encode_record)) == stored
+    assert {field: record[field] for field in record.keys()} == stored
+    assert not hasattr(record, '__dict__')
+    assert record.id is sys.intern(stored['id'])
+
+
+def test_dates_are_held_as_day_ordinals():
+    loan = lms.Transaction.from_dict(STORED['transactions'])
+    assert (loan.issue_day, loan.due_day, loan.return_day) == (738944, 738958, None)
+    loan['return_date'] = '2024-03-01'
+    assert loan.return_day == 738946 and loan.get('return_date') == '2024-03-01'
+    assert lms.Member.from_dict({**STORED['members'], 'join_date': None}).join_date is None
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_storage_keeps_the_stored_form(tmp_path, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    book = service.add_book("Dune", "Frank Herbert", "9780441013593")
+    service.issue_book(book.id, member.id)
+    service.close()
+
+    data = lms.open_storage(mode, str(tmp_path)).read()
+    assert data['books'] == [book.to_dict()] and data['members'] == [member.to_dict()]
+    loan, = data['transactions']
+    assert loan['book_id'] == book.id and loan['status'] == 'Issued'
+    assert lms.day_ordinal(loan['due_date']) - lms.day_ordinal(loan['issue_date']) == lms.DEFAULT_LOAN_DAYS
@@ -0,0 +1,103 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import lms
+import server
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_snapshot_stays_at_its_seq(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)
+    service = lms.LibraryService(lms.open_storage(mode))
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(4)]
+    for book in books:
+        service.issue_book(book.id, member.id)
+    service.return_book(books[0].id)
+    service.close()
+
+    service = lms.LibraryService(lms.open_storage(mode))
+    library = server.LibraryServer(('127.0.0.1', 0), service)
+    head, loans = library.snapshot()
+    want = {t.id: t.to_dict() for t in service.iter_transactions()}
+    # Desks carry on before the stored history is read.
+    service.return_book(books[1].id)
+    service.issue_book(books[0].id, member.id)
+    service.flush()
+
+    assert head['seq'] == 0 and [b['id'] for b in head['books']] == [b.id for b in books]
+    assert {t['id']: t for t in loans} == want
+    library.server_close()
+    service.close()
+
+
+def test_snapshot_reply_is_streamed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(server, 'SNAPSHOT_CHUNK_ROWS', 2)
+    service = lms.LibraryService(lms.open_storage('journal'))
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    for i in range(5):
+        book = service.add_book(f"Book {i}", "Author", f"isbn-{i}")
+        service.issue_book(book.id, member.id)
+    library = server.LibraryServer(('127.0.0.1', 0), service)
+    threading.Thread(target=library.serve_forever, daemon=True).start()
+
+    remote = lms.RemoteLibraryService(f"http://127.0.0.1:{library.server_port}")
+    snapshot = remote.request('GET', '/snapshot')
+    assert snapshot['seq'] == library.seq
+    assert [t['id'] for t in snapshot['transactions']] == [t.id for t in service.get_all_transactions()]
+    assert json.loads(json.dumps(snapshot['members'])) == [member.to_dict()]
+    library.shutdown()
+    library.server_close()
+    service.close()
+
+
+def test_failed_hold_sweep_is_retried(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(server, 'HOLD_SWEEP_MS', 1)
+    service = lms.LibraryService(lms.open_storage('journal'))
+    library = server.LibraryServer(('127.0.0.1', 0), service)
+    sweeps, stop = [], threading.Event()
+
+    def expire_holds():
+        sweeps.append(time.time())
+        if len(sweeps) == 1:
+            raise OSError("disk full")
+        if len(sweeps) >= 3:
+            stop.wait()  # parks the sweeper until the server is closed
+        return []
+
+    monkeypatch.setattr(service, 'expire_holds', expire_holds)
+    sweeper = threading.Thread(target=library.sweep_holds, daemon=True)
+    sweeper.start()
+    deadline = time.time() + 5
+    while len(sweeps) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(sweeps) >= 3
+    assert "disk full" in capsys.readouterr().err
+    library.server_close()
+    stop.set()
+    sweeper.join(timeout=5)
+    assert not sweeper.is_alive()
+    service.close()
+
+
+def test_body_that_is_not_an_object_is_a_bad_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = lms.LibraryService(lms.open_storage('journal'))
+    library = server.LibraryServer(('127.0.0.1', 0), service)
+    threading.Thread(target=library.serve_forever, daemon=True).start()
+
+    for body in (b'[1, 2]', b'"B001"', b'null'):
+        conn = http.client.HTTPConnection('127.0.0.1', library.server_port)
+        conn.request('POST', '/issue', body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        assert (response.status, json.loads(response.read())) == (400, {'error': "Bad request: expected a JSON object"})
+        conn.close()
+    library.shutdown()
+    library.server_close()
+    service.close()
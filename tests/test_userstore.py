@@ -0,0 +1,55 @@
+import hashlib
+import json
+
+import pytest
+
+import userstore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Cheap hashes; the format and checks are the same.
+    monkeypatch.setattr(userstore, 'SCRYPT_N', 2 ** 4)
+    monkeypatch.setattr(userstore, 'PBKDF2_ITERATIONS', 1000)
+    return userstore.UserStore(str(tmp_path / "accounts.jsonl"), str(tmp_path / "users.txt"))
+
+
+def test_accounts_are_appended_and_salted(store):
+    assert store.register("ada", "secret")[0]
+    assert store.register("grace", "secret")[0]
+    assert store.register("ada", "other") == (False, "Username already exists.")
+    with open(store.path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [entry['username'] for entry in lines] == ["ada", "grace"]
+    assert lines[0]['hash'] != lines[1]['hash']  # same password, different salts
+
+    reopened = userstore.UserStore(store.path, store.legacy_path)
+    assert reopened.verify("ada", "secret") == (True, "Login successful.")
+    assert reopened.verify("ada", "wrong") == (False, "Invalid username or password.")
+    assert reopened.verify("nobody", "secret") == (False, "Invalid username or password.")
+
+
+def test_legacy_account_is_rehashed_on_login(store):
+    with open(store.legacy_path, 'w') as f:
+        json.dump({"ada": hashlib.sha256(b"secret").hexdigest()}, f)
+    assert store.verify("ada", "secret")[0]
+    assert not userstore.is_legacy_hash(store.accounts["ada"])
+
+    reopened = userstore.UserStore(store.path, store.legacy_path)
+    assert reopened.verify("ada", "secret")[0]
+    assert reopened.accounts["ada"] == store.accounts["ada"]
+
+
+def test_repeated_failures_lock_the_username_out(store, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(userstore.time, 'monotonic', lambda: now[0])
+    store.register("ada", "secret")
+    for _ in range(userstore.MAX_FAILED_LOGINS):
+        assert store.verify("ada", "wrong") == (False, "Invalid username or password.")
+    success, message = store.verify("ada", "secret")
+    assert not success and message.startswith("Too many failed attempts.")
+    assert store.verify("grace", "secret") == (False, "Invalid username or password.")
+
+    now[0] += userstore.LOCKOUT_SECONDS
+    assert store.verify("ada", "secret") == (True, "Login successful.")
+    assert "ada" not in store.failures
@@ -0,0 +1,81 @@
+import random
+from datetime import date
+
+import pytest
+
+import lms
+
+
+def library(tmp_path, monkeypatch, mode, steps=300):
+    """A library with a few hundred loans over many days, reopened so the
+    returned ones are only on disk."""
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    rng = random.Random(5)
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(30)]
+    members = [service.add_member(f"Member {i}", "m@example.com", "555-0100") for i in range(6)]
+    first_day = date(2024, 1, 1).toordinal()
+    for step in range(steps):
+        monkeypatch.setattr(lms, 'today_ordinal', lambda day=first_day + step // 5: day)
+        book = rng.choice(books)
+        if book.status == 'Issued':
+            service.return_book(book.id)
+        else:
+            service.issue_book(book.id, rng.choice(members).id)
+    service.close()
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    # Some returned this session, still in memory.
+    for loan in list(service.data['transactions'])[:3]:
+        service.return_book(loan.book_id)
+    return service
+
+
+def loan_ids(pages):
+    return [loan.id for page, _ in pages for loan in page]
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_loan_pages_match_a_full_sort(tmp_path, monkeypatch, mode):
+    service = library(tmp_path, monkeypatch, mode)
+    everything = list(service.iter_transactions())
+    for sort in ('issue_date', 'id', 'return_date', 'member_id'):
+        for filters in ({}, {'member_id': 'M003'}, {'status': 'Returned'}):
+            tests = service.record_filters(filters)
+            want = [t.id for t in sorted(everything, key=service.sort_key(sort), reverse=True)
+                    if all(test(t) for test in tests)]
+            assert loan_ids(service.loan_pages(sort, True, filters, 7)) == want
+
+            pages = list(service.loan_pages(sort, True, filters, 11))
+            for i, (_, cursor) in enumerate(pages):
+                rest = service.loan_pages(sort, True, filters, 11, cursor)
+                assert loan_ids(rest) == loan_ids(pages[i + 1:])
+    service.close()
+
+
+def test_sort_orders_follow_changes(tmp_path, monkeypatch):
+    service = library(tmp_path, monkeypatch, 'journal', steps=40)
+    by_title = service.sorted_records('books', 'title')
+    by_status = service.sorted_records('books', 'status')
+    service.add_book("Aardvarks", "Author", "isbn-a")
+    service.delete_book(next(b for b in by_title if b.status == 'Available').id)
+    book = next(b for b in service.get_all_books() if b.status == 'Available')
+    service.issue_book(book.id, 'M001')
+    for field, order in (('title', by_title), ('status', by_status)):
+        assert order == sorted(service.get_all_books(), key=service.sort_key(field))
+    service.close()
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sqlite'])
+def test_one_commit_moving_several_records(tmp_path, mode):
+    service = lms.LibraryService(lms.open_storage(mode, str(tmp_path)))
+    member = service.add_member("Ada", "ada@example.com", "555-0100")
+    books = [service.add_book(f"Book {i}", "Author", f"isbn-{i}") for i in range(6)]
+    by_status = service.sorted_records('books', 'status')
+    by_due = service.sorted_records('transactions', 'due_date')
+
+    results = service.issue_books([(books[1].id, member.id), (books[3].id, member.id)])
+    assert [success for success, _ in results] == [True, True]
+    assert by_status == sorted(service.get_all_books(), key=service.sort_key('status'))
+    service.return_books([books[1].id, books[3].id])
+    assert by_status == sorted(service.get_all_books(), key=service.sort_key('status'))
+    assert by_due == sorted(service.data['transactions'], key=service.sort_key('due_date'))
+    service.close()
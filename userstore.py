@@ -0,0 +1,165 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# --- 1. CONFIGURATION ---
+
+ACCOUNTS_FILE = "accounts.jsonl"
+# Accounts from before the store: {username: unsalted sha256}. Read once;
+# each one is rehashed into ACCOUNTS_FILE on its first successful login.
+LEGACY_USERS_FILE = "users.txt"
+
+# scrypt when the interpreter's OpenSSL has it, PBKDF2-SHA256 otherwise.
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+PBKDF2_ITERATIONS = 600000
+SALT_BYTES = 16
+
+# After MAX_FAILED_LOGINS failures within LOCKOUT_SECONDS a username is
+# refused without checking the password until the oldest failure expires.
+MAX_FAILED_LOGINS = 5
+LOCKOUT_SECONDS = 300
+
+# --- 2. PASSWORD HASHING ---
+
+def hash_password(password, salt=None):
+    """Returns a self-describing salted hash string for password."""
+    salt = salt or os.urandom(SALT_BYTES)
+    if hasattr(hashlib, 'scrypt'):
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def check_password(password, stored):
+    """Checks password against any hash format the store has written."""
+    scheme = stored.split('$', 1)[0]
+    if scheme == 'scrypt':
+        _, n, r, p, salt, digest = stored.split('$')
+        candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p))
+    elif scheme == 'pbkdf2_sha256':
+        _, iterations, salt, digest = stored.split('$')
+        candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), int(iterations))
+    else:
+        digest, candidate = stored, hashlib.sha256(password.encode()).digest()
+    return hmac.compare_digest(candidate.hex(), digest)
+
+def is_legacy_hash(stored):
+    return '$' not in stored
+
+# --- 3. ACCOUNT STORE ---
+
+class UserStore:
+    """Staff/patron accounts, loaded once and kept in memory.
+
+    New accounts and rehashed legacy ones are appended to ACCOUNTS_FILE, one
+    JSON line each, and later lines win. Password hashing is deliberately
+    slow, so verify() and register() belong on a worker thread. The store is
+    safe to share between threads.
+    """
+
+    def __init__(self, path=ACCOUNTS_FILE, legacy_path=LEGACY_USERS_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.accounts = None
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.dummy_hash = None
+
+    def load(self):
+        """Reads the account files, once; later calls return immediately."""
+        with self.lock:
+            if self.accounts is not None:
+                return
+            accounts = {}
+            try:
+                with open(self.legacy_path, 'r') as f:
+                    content = f.read()
+                    accounts.update(json.loads(content) if content else {})
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+            try:
+                with open(self.path, 'r') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # torn final line from a crash
+                        accounts[entry['username']] = entry['hash']
+            except FileNotFoundError:
+                pass
+            self.accounts = accounts
+
+    def append(self, username, stored):
+        # Called with self.lock held.
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'username': username, 'hash': stored}) + '\n')
+        self.accounts[username] = stored
+
+    def locked_out(self, username, now):
+        """Seconds until username may try again; 0 if it may now."""
+        failures = self.failures.get(username)
+        if failures is None:
+            return 0
+        while failures and failures[0] <= now - LOCKOUT_SECONDS:
+            failures.popleft()
+        if not failures:
+            del self.failures[username]
+            return 0
+        if len(failures) < MAX_FAILED_LOGINS:
+            return 0
+        return failures[0] + LOCKOUT_SECONDS - now
+
+    def record_failure(self, username, now):
+        # Called with self.lock held. Guessing at many usernames must not
+        # grow the table without bound, so expired entries are swept.
+        if len(self.failures) >= 10000:
+            for name in list(self.failures):
+                self.locked_out(name, now)
+        self.failures.setdefault(username, deque()).append(now)
+
+    def verify(self, username, password):
+        """Checks a login. Returns (success, message)."""
+        self.load()
+        now = time.monotonic()
+        with self.lock:
+            wait = self.locked_out(username, now)
+            stored = self.accounts.get(username)
+        if wait:
+            return False, f"Too many failed attempts. Try again in {int(wait // 60) + 1} minutes."
+
+        if stored is None:
+            # Spend the same time as a real check so usernames can't be probed.
+            self.dummy_hash = self.dummy_hash or hash_password("")
+            check_password(password, self.dummy_hash)
+            valid = False
+        else:
+            valid = check_password(password, stored)
+
+        with self.lock:
+            if not valid:
+                self.record_failure(username, now)
+                return False, "Invalid username or password."
+            self.failures.pop(username, None)
+        if is_legacy_hash(stored):
+            upgraded = hash_password(password)
+            with self.lock:
+                if self.accounts.get(username) == stored:
+                    self.append(username, upgraded)
+        return True, "Login successful."
+
+    def register(self, username, password):
+        """Creates an account. Returns (success, message)."""
+        self.load()
+        with self.lock:
+            if username in self.accounts:
+                return False, "Username already exists."
+        stored = hash_password(password)
+        with self.lock:
+            if username in self.accounts:
+                return False, "Username already exists."
+            self.append(username, stored)
+        return True, "Account created successfully! You can now log in."